@@ -0,0 +1,62 @@
+"""measurement_partitions_and_rollups
+
+Revision ID: 35692369cf20
+Revises: 156bf13101ba
+Create Date: 2026-10-18 22:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '35692369cf20'
+down_revision: Union[str, Sequence[str], None] = '156bf13101ba'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'measurement_partitions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('table_name', sa.String(), nullable=False),
+        sa.Column('range_start', sa.DateTime(), nullable=False),
+        sa.Column('range_end', sa.DateTime(), nullable=False),
+        sa.Column('row_count', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('table_name')
+    )
+    op.create_index(op.f('ix_measurement_partitions_id'), 'measurement_partitions', ['id'], unique=False)
+    op.create_index(op.f('ix_measurement_partitions_range_start'), 'measurement_partitions', ['range_start'], unique=False)
+
+    op.create_table(
+        'measurement_rollups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sensor_id', sa.Integer(), nullable=True),
+        sa.Column('location_id', sa.Integer(), nullable=True),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('sample_count', sa.Integer(), nullable=False),
+        sa.Column('value_sum', sa.Float(), nullable=False),
+        sa.Column('value_min', sa.Float(), nullable=False),
+        sa.Column('value_max', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['location_id'], ['locations.id'], ),
+        sa.ForeignKeyConstraint(['sensor_id'], ['sensors.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_measurement_rollups_id'), 'measurement_rollups', ['id'], unique=False)
+    op.create_index('ix_measurement_rollups_sensor_bucket', 'measurement_rollups', ['sensor_id', 'bucket_start'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_measurement_rollups_sensor_bucket', table_name='measurement_rollups')
+    op.drop_index(op.f('ix_measurement_rollups_id'), table_name='measurement_rollups')
+    op.drop_table('measurement_rollups')
+    op.drop_index(op.f('ix_measurement_partitions_range_start'), table_name='measurement_partitions')
+    op.drop_index(op.f('ix_measurement_partitions_id'), table_name='measurement_partitions')
+    op.drop_table('measurement_partitions')
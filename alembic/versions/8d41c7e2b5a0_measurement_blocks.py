@@ -0,0 +1,49 @@
+"""measurement_blocks
+
+Revision ID: 8d41c7e2b5a0
+Revises: 35692369cf20
+Create Date: 2026-10-18 23:55:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d41c7e2b5a0'
+down_revision: Union[str, Sequence[str], None] = '35692369cf20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'measurement_blocks',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sensor_id', sa.Integer(), nullable=True),
+        sa.Column('location_id', sa.Integer(), nullable=True),
+        sa.Column('start_ts', sa.DateTime(), nullable=False),
+        sa.Column('end_ts', sa.DateTime(), nullable=False),
+        sa.Column('sample_count', sa.Integer(), nullable=False),
+        sa.Column('value_sum', sa.Float(), nullable=False),
+        sa.Column('value_min', sa.Float(), nullable=False),
+        sa.Column('value_max', sa.Float(), nullable=False),
+        sa.Column('codec', sa.String(), nullable=False),
+        sa.Column('timestamps', sa.LargeBinary(), nullable=False),
+        sa.Column('values', sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(['location_id'], ['locations.id'], ),
+        sa.ForeignKeyConstraint(['sensor_id'], ['sensors.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_measurement_blocks_id'), 'measurement_blocks', ['id'], unique=False)
+    op.create_index('ix_measurement_blocks_sensor_start', 'measurement_blocks', ['sensor_id', 'start_ts'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_measurement_blocks_sensor_start', table_name='measurement_blocks')
+    op.drop_index(op.f('ix_measurement_blocks_id'), table_name='measurement_blocks')
+    op.drop_table('measurement_blocks')
@@ -0,0 +1,35 @@
+"""list page indexes
+
+Revision ID: a7c2e9f4b1d6
+Revises: f3b9d2a6c8e4
+Create Date: 2026-10-19 05:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c2e9f4b1d6'
+down_revision: Union[str, Sequence[str], None] = 'f3b9d2a6c8e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_measurements_sensor_timestamp', 'measurements',
+                    ['sensor_id', 'timestamp'], unique=False)
+    op.create_index('ix_action_logs_timestamp_id', 'action_logs', ['timestamp', 'id'], unique=False)
+    op.create_index('ix_anomaly_analyses_created_id', 'anomaly_analyses', ['created_at', 'id'], unique=False)
+    op.create_index('ix_voice_notification_commands_created_id', 'voice_notification_commands',
+                    ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_voice_notification_commands_created_id', table_name='voice_notification_commands')
+    op.drop_index('ix_anomaly_analyses_created_id', table_name='anomaly_analyses')
+    op.drop_index('ix_action_logs_timestamp_id', table_name='action_logs')
+    op.drop_index('ix_measurements_sensor_timestamp', table_name='measurements')
@@ -0,0 +1,58 @@
+"""sensor_response_models
+
+Revision ID: c4e8a1f0d2b7
+Revises: 8d41c7e2b5a0
+Create Date: 2026-10-19 02:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a1f0d2b7'
+down_revision: Union[str, Sequence[str], None] = '8d41c7e2b5a0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'sensor_target_changes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sensor_id', sa.Integer(), nullable=False),
+        sa.Column('action_log_id', sa.Integer(), nullable=True),
+        sa.Column('old_target', sa.Float(), nullable=True),
+        sa.Column('new_target', sa.Float(), nullable=False),
+        sa.Column('changed_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['action_log_id'], ['action_logs.id'], ),
+        sa.ForeignKeyConstraint(['sensor_id'], ['sensors.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_sensor_target_changes_id'), 'sensor_target_changes', ['id'], unique=False)
+    op.create_index('ix_sensor_target_changes_sensor_changed', 'sensor_target_changes',
+                    ['sensor_id', 'changed_at'], unique=False)
+    op.create_table(
+        'sensor_response_models',
+        sa.Column('sensor_id', sa.Integer(), nullable=False),
+        sa.Column('time_constant', sa.Float(), nullable=True),
+        sa.Column('sum_t_log', sa.Float(), nullable=False),
+        sa.Column('sum_t2', sa.Float(), nullable=False),
+        sa.Column('samples', sa.Integer(), nullable=False),
+        sa.Column('events', sa.Integer(), nullable=False),
+        sa.Column('fitted_through', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['sensor_id'], ['sensors.id'], ),
+        sa.PrimaryKeyConstraint('sensor_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('sensor_response_models')
+    op.drop_index('ix_sensor_target_changes_sensor_changed', table_name='sensor_target_changes')
+    op.drop_index(op.f('ix_sensor_target_changes_id'), table_name='sensor_target_changes')
+    op.drop_table('sensor_target_changes')
@@ -0,0 +1,46 @@
+"""comfort_ranges
+
+Revision ID: e1a7b3c5d9f2
+Revises: c4e8a1f0d2b7
+Create Date: 2026-10-19 03:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1a7b3c5d9f2'
+down_revision: Union[str, Sequence[str], None] = 'c4e8a1f0d2b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'comfort_ranges',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('location_id', sa.Integer(), nullable=True),
+        sa.Column('room_type', sa.String(), nullable=True),
+        sa.Column('sensor_type_id', sa.Integer(), nullable=False),
+        sa.Column('min_value', sa.Float(), nullable=False),
+        sa.Column('max_value', sa.Float(), nullable=False),
+        sa.Column('target_value', sa.Float(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['location_id'], ['locations.id'], ),
+        sa.ForeignKeyConstraint(['sensor_type_id'], ['sensor_types.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_comfort_ranges_id'), 'comfort_ranges', ['id'], unique=False)
+    op.create_index('ix_comfort_ranges_scope', 'comfort_ranges',
+                    ['location_id', 'room_type', 'sensor_type_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_comfort_ranges_scope', table_name='comfort_ranges')
+    op.drop_index(op.f('ix_comfort_ranges_id'), table_name='comfort_ranges')
+    op.drop_table('comfort_ranges')
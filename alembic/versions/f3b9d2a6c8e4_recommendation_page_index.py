@@ -0,0 +1,41 @@
+"""recommendation page index
+
+Revision ID: f3b9d2a6c8e4
+Revises: e1a7b3c5d9f2
+Create Date: 2026-10-19 04:10:00.000000
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b9d2a6c8e4'
+down_revision: Union[str, Sequence[str], None] = 'e1a7b3c5d9f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Ключ страниц (priority, created_at, id): NULL выпал бы из сравнений курсора
+    recommendations = sa.table('intelligent_recommendations',
+                               sa.column('priority', sa.Integer()), sa.column('created_at', sa.DateTime()))
+    op.execute(recommendations.update().where(recommendations.c.priority.is_(None)).values(priority=1))
+    op.execute(recommendations.update().where(recommendations.c.created_at.is_(None)).values(created_at=datetime.utcnow()))
+    with op.batch_alter_table('intelligent_recommendations') as batch_op:
+        batch_op.alter_column('priority', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+    op.create_index('ix_recommendations_priority_created', 'intelligent_recommendations',
+                    ['priority', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_recommendations_priority_created', table_name='intelligent_recommendations')
+    with op.batch_alter_table('intelligent_recommendations') as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=True)
+        batch_op.alter_column('priority', existing_type=sa.Integer(), nullable=True)
@@ -0,0 +1,226 @@
+"""
+Нагрузочный тест: синхронные эндпоинты (пул потоков) против async (AsyncSession).
+
+Синхронный обработчик FastAPI занимает поток из пула anyio (40 потоков),
+пока ждёт ответ БД, поэтому одновременно в БД уходит не больше 40 запросов,
+а остальные стоят в очереди за потоком. Async-обработчик отдаёт управление
+циклу событий на время ожидания - число одновременных запросов ограничено
+только пулом соединений.
+
+Чтобы ожидание было похоже на сетевую БД, а не на локальный SQLite,
+к каждому SQL-запросу добавляется искусственная задержка (--latency).
+Задержка выполняется в потоке драйвера, как настоящее сетевое ожидание.
+
+Запуск:
+    python bench_async_load.py [--clients 200] [--requests 600] [--latency 2.0]
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+POOL_SIZE = 300
+
+
+class QueryLatency:
+    """Искусственная задержка SQL-запросов и счётчик одновременных запросов"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+
+    def __call__(self, statement):
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(self.latency)
+        with self._lock:
+            self.in_flight -= 1
+
+    def reset(self):
+        with self._lock:
+            self.peak = self.in_flight
+
+
+def serve(port: int, latency: float):
+    """Сервер приложения с задержкой БД и синхронными эталонными маршрутами"""
+    import uvicorn
+    from fastapi import Depends
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+    from sqlalchemy.orm import Session, sessionmaker
+    from sqlalchemy.util import await_only
+
+    import database
+    import main
+    import models
+
+    tracer = QueryLatency(latency)
+
+    # Пулы соединений одинакового размера, больше пула потоков,
+    # чтобы ограничением был способ ожидания, а не число соединений
+    sync_engine = create_engine(
+        database.SQLALCHEMY_DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        pool_size=POOL_SIZE, max_overflow=0
+    )
+    async_engine = create_async_engine(database.ASYNC_DATABASE_URL, pool_size=POOL_SIZE, max_overflow=0)
+
+    @event.listens_for(sync_engine, "connect")
+    def _sync_latency(dbapi_connection, connection_record):
+        dbapi_connection.set_trace_callback(tracer)
+
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _async_latency(dbapi_connection, connection_record):
+        # Колбэк выполняется в потоке aiosqlite, а не в цикле событий
+        await_only(dbapi_connection.driver_connection.set_trace_callback(tracer))
+
+    SyncSession = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
+    AsyncSessionBench = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+    def get_db():
+        db = SyncSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def get_async_db():
+        async with AsyncSessionBench() as db:
+            yield db
+
+    main.app.dependency_overrides[main.get_db] = get_db
+    main.app.dependency_overrides[database.get_async_db] = get_async_db
+
+    # Эталон: прежние синхронные версии тех же эндпоинтов
+    @main.app.get("/bench/sync/history")
+    def sync_history(db: Session = Depends(get_db)):
+        rows = db.query(models.Measurement).order_by(models.Measurement.timestamp.desc()).limit(100).all()
+        return [{"id": m.id, "value": m.value, "timestamp": m.timestamp, "sensor_id": m.sensor_id} for m in rows]
+
+    @main.app.get("/bench/sync/notifications")
+    def sync_notifications(db: Session = Depends(get_db)):
+        rows = db.query(models.Notification).filter(models.Notification.is_completed == False).all()
+        return [{"id": n.id, "title": n.title} for n in rows]
+
+    @main.app.get("/bench/stats")
+    def bench_stats():
+        return {"peak": tracer.peak}
+
+    @main.app.post("/bench/reset")
+    def bench_reset():
+        tracer.reset()
+        return {"peak": tracer.peak}
+
+    # Данные создаются через обычный движок, без искусственной задержки
+    models.Base.metadata.create_all(bind=database.engine)
+    seed_db = database.SessionLocal()
+    try:
+        main.seed_database(seed_db)
+    finally:
+        seed_db.close()
+
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning", timeout_keep_alive=60)
+
+
+async def run_load(base_url: str, path: str, clients: int, total: int):
+    """Отправляет total запросов с clients одновременными клиентами"""
+    import httpx
+
+    latencies = []
+    counter = iter(range(total))
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120,
+                                 limits=httpx.Limits(max_connections=clients)) as client:
+        await client.post("/bench/reset")
+
+        async def worker():
+            for _ in counter:
+                started = time.perf_counter()
+                response = await client.get(path)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(clients)))
+        elapsed = time.perf_counter() - started
+        peak = (await client.get("/bench/stats")).json()["peak"]
+
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50": latencies[len(latencies) // 2] * 1000,
+        "p95": latencies[int(len(latencies) * 0.95)] * 1000,
+        "peak": peak,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync vs async endpoints under concurrent load")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--latency", type=float, default=2.0, help="Simulated DB latency per query, seconds")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port, args.latency)
+        return
+
+    import httpx
+
+    work_dir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(work_dir, "reports"), exist_ok=True)
+    env = dict(os.environ, DATABASE_FILE=os.path.join(work_dir, "bench.db"))
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve",
+         "--port", str(args.port), "--latency", str(args.latency)],
+        cwd=work_dir, env=env, stdout=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        for _ in range(100):
+            try:
+                httpx.get(f"{base_url}/health")
+                break
+            except httpx.TransportError:
+                time.sleep(0.2)
+
+        print("=" * 80)
+        print(f"ASYNC LOAD TEST: {args.clients} clients, {args.requests} requests, "
+              f"{args.latency * 1000:.0f} ms DB latency")
+        print("=" * 80)
+        print(f"{'endpoint':<28}{'mode':<8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'peak DB':>10}")
+
+        pairs = [
+            ("/api/history", "/bench/sync/history"),
+            ("/api/notifications", "/bench/sync/notifications"),
+        ]
+        for async_path, sync_path in pairs:
+            for mode, path in (("sync", sync_path), ("async", async_path)):
+                # Прогрев: соединения пула и кэши
+                asyncio.run(run_load(base_url, path, args.clients, args.clients))
+                result = asyncio.run(run_load(base_url, path, args.clients, args.requests))
+                print(f"{async_path:<28}{mode:<8}{result['rps']:>10.0f}{result['p50']:>10.1f}"
+                      f"{result['p95']:>10.1f}{result['peak']:>10}")
+
+        print("\npeak DB - максимум одновременных SQL-запросов; у sync он упирается в пул потоков (40),")
+        print("поэтому пропускная способность sync не выше 40 / latency запросов в секунду.")
+        print("aiosqlite держит поток на соединение, так что на малом числе ядер async упирается в CPU/GIL;")
+        print("с asyncpg (PostgreSQL) потоков драйвера нет.")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Бенчмарк колоночного хранилища холодной истории (block_store.py).
+
+Одна и та же история измерений хранится двумя способами: строками в
+measurements и суточными блоками в measurement_blocks (после
+MeasurementRetention.compact). Выводится размер файла БД после VACUUM,
+байты на измерение и время полного чтения истории одного датчика:
+select строк против block_store.read_blocks.
+
+Запуск:
+    python bench_block_store.py [--sensors 10] [--days 30] [--step 60]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Глобальный движок database.py не должен открывать рабочую БД
+os.environ.setdefault("DATABASE_FILE", os.path.join(tempfile.mkdtemp(), "unused.db"))
+
+from sqlalchemy import insert, select, text
+from sqlalchemy.orm import sessionmaker
+
+import block_store
+import models
+from database import create_sqlite_engine
+from measurement_storage import MeasurementRetention, day_floor
+
+
+def prepare(db_engine, args, now: datetime) -> int:
+    """Создаёт схему и заполняет историю: random walk с округлением до 0.01"""
+    models.Base.metadata.create_all(bind=db_engine)
+    points = args.days * 86400 // args.step
+    with db_engine.begin() as conn:
+        conn.execute(insert(models.Location), [{"id": 1, "name": "Bench", "room_type": "office"}])
+        conn.execute(insert(models.SensorType), [{"id": 1, "name": "Temperature", "unit": "°C"}])
+        conn.execute(insert(models.Sensor), [
+            {"id": i, "name": f"S{i}", "location_id": 1, "sensor_type_id": 1} for i in range(1, args.sensors + 1)
+        ])
+        start = now - timedelta(days=args.days)
+        for sensor_id in range(1, args.sensors + 1):
+            value = 21.0
+            rows = []
+            for i in range(points):
+                value += random.gauss(0, 0.05)
+                rows.append({
+                    "sensor_id": sensor_id,
+                    "location_id": 1,
+                    "value": round(value, 2),
+                    "timestamp": start + timedelta(seconds=i * args.step + random.randint(0, 2))
+                })
+            conn.execute(insert(models.Measurement), rows)
+    return points * args.sensors
+
+
+def file_size(db_engine, path: str) -> int:
+    # В WAL-режиме VACUUM пишет в журнал: файл уменьшается после checkpoint
+    with db_engine.connect() as conn:
+        conn.execute(text("VACUUM"))
+        conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+    return os.path.getsize(path)
+
+
+def scan_rows(db_engine) -> float:
+    m = models.Measurement
+    started = time.perf_counter()
+    with db_engine.connect() as conn:
+        rows = conn.execute(select(m.timestamp, m.value).where(m.sensor_id == 1).order_by(m.timestamp)).all()
+    assert rows
+    return time.perf_counter() - started
+
+
+def scan_blocks(session_factory) -> float:
+    started = time.perf_counter()
+    with session_factory() as db:
+        ts, values = block_store.read_blocks(db, 1)
+    assert len(ts)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Row storage vs compressed columnar blocks")
+    parser.add_argument("--sensors", type=int, default=10)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--step", type=int, default=60, help="Seconds between measurements")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "blocks.db")
+    db_engine = create_sqlite_engine(f"sqlite:///{path}")
+    session_factory = sessionmaker(bind=db_engine)
+    now = day_floor(datetime.utcnow())
+    total = prepare(db_engine, args, now)
+
+    print("=" * 80)
+    print(f"BLOCK STORE BENCHMARK: {args.sensors} sensors, {args.days} days, "
+          f"step {args.step} s, {total} measurements")
+    print("=" * 80)
+
+    raw_size = file_size(db_engine, path)
+    raw_scan = min(scan_rows(db_engine) for _ in range(3))
+
+    started = time.perf_counter()
+    retention = MeasurementRetention(session_factory, block_days=1, hot_days=args.days + 31, raw_days=args.days + 31)
+    compacted = retention.compact(session_factory(), now)
+    compact_time = time.perf_counter() - started
+
+    block_size = file_size(db_engine, path)
+    block_scan = min(scan_blocks(session_factory) for _ in range(3))
+    db_engine.dispose()
+
+    print(f"{'storage':<10}{'file, MB':>12}{'bytes/pt':>12}{'scan 1 sensor, ms':>20}")
+    print(f"{'rows':<10}{raw_size / 1e6:>12.2f}{raw_size / total:>12.1f}{raw_scan * 1000:>20.1f}")
+    print(f"{'blocks':<10}{block_size / 1e6:>12.2f}{block_size / total:>12.1f}{block_scan * 1000:>20.1f}")
+    print(f"\nCompacted {compacted} rows in {compact_time:.1f} s; "
+          f"size x{raw_size / block_size:.1f} smaller, scan x{raw_scan / block_scan:.1f} faster")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Микро-бенчмарк массовой генерации рекомендаций.
+
+Сравнивает bulk_generate_recommendations (цикл по словарям, текст для
+каждого датчика) и bulk_generate_from_arrays (нормы, серьёзность и
+приоритет по столбцам NumPy, текст только для нарушений) на парке
+датчиков, где за нормы выходит небольшая доля.
+
+Запуск:
+    python bench_recommendations.py [количество датчиков]
+"""
+
+import random
+import sys
+import time
+
+import numpy as np
+
+from intelligent_recommendation_engine import RecommendationGenerator
+
+
+def make_fleet(count: int, violation_share: float = 0.05):
+    """Парк датчиков: большинство в норме, violation_share - за пределами"""
+    random.seed(42)
+    room_types, sensor_types, values, scores = [], [], [], []
+    for _ in range(count):
+        room_type = random.choice(RecommendationGenerator.ROOM_TYPES)
+        sensor_type = random.choice(['Temperature', 'Humidity'])
+        low, high = RecommendationGenerator.NORMAL_RANGES[room_type][sensor_type.lower()]
+        if random.random() < violation_share:
+            value = random.choice([low - random.uniform(0.5, 10), high + random.uniform(0.5, 10)])
+        else:
+            value = random.uniform(low, high)
+        room_types.append(room_type)
+        sensor_types.append(sensor_type)
+        values.append(round(value, 1))
+        scores.append(round(random.uniform(0.6, 0.95), 3))
+    return room_types, sensor_types, values, scores
+
+
+def run(label, func, count):
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<38} {elapsed * 1000:9.1f} ms  {elapsed / count * 1e6:7.2f} µs/sensor  "
+          f"{len(result)} rows")
+    return result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    room_types, sensor_types, values, scores = make_fleet(count)
+    print(f"Fleet: {count} sensors")
+
+    def legacy():
+        # Прежний путь: генератор на тип помещения, словарь на датчик
+        recommendations = []
+        for room_type, sensor_type, value, score in zip(room_types, sensor_types, values, scores):
+            recommendations += RecommendationGenerator(room_type).bulk_generate_recommendations([{
+                'sensor_name': 'sensor',
+                'sensor_type': sensor_type,
+                'current_value': value,
+                'anomaly_analysis': {'is_anomaly': True, 'score': score},
+            }])
+        return recommendations
+
+    room_codes = RecommendationGenerator.room_type_codes(room_types)
+    sensor_codes = RecommendationGenerator.sensor_type_codes(sensor_types)
+    value_array = np.array(values)
+    score_array = np.array(scores)
+    generator = RecommendationGenerator()
+
+    run("bulk_generate_recommendations (dicts)", legacy, count)
+    run("bulk_generate_from_arrays", lambda: generator.bulk_generate_from_arrays(
+        value_array, sensor_codes, room_codes, score_array), count)
+    run("evaluate_arrays (no text)", lambda: generator.evaluate_arrays(
+        value_array, sensor_codes, room_codes, score_array)['priority'], count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Бенчмарк сериализации страниц /api/history и /api/analysis/results.
+
+"pydantic" - прежний путь: строки или ORM-объекты проходят через
+response_model=List[...] (модель на строку с from_attributes, проверка
+полей, JSON из моделей). "fast_json" - текущий: Core-запрос с полями
+схемы, dict на строку и FastJSONResponse (orjson, без orjson - json).
+Выводится время на строку: только сериализация и запрос + сериализация.
+
+Запуск:
+    python bench_serialization.py [--rows 500] [--repeat 20]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+# Глобальный движок database.py не должен открывать рабочую БД
+os.environ.setdefault("DATABASE_FILE", os.path.join(tempfile.mkdtemp(), "unused.db"))
+
+from pydantic import TypeAdapter
+from sqlalchemy import insert, select
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import fast_json
+import models
+import schemas
+from database import create_sqlite_engine
+
+
+def prepare(db_engine, rows: int, now: datetime):
+    """Схема, rows измерений одного датчика и rows результатов анализа"""
+    models.Base.metadata.create_all(bind=db_engine)
+    with db_engine.begin() as conn:
+        conn.execute(insert(models.Location), [{"id": 1, "name": "Bench", "room_type": "office"}])
+        conn.execute(insert(models.SensorType), [{"id": 1, "name": "Temperature", "unit": "°C"}])
+        conn.execute(insert(models.Sensor), [{"id": 1, "name": "S1", "location_id": 1, "sensor_type_id": 1}])
+        conn.execute(insert(models.Measurement), [{
+            "sensor_id": 1, "location_id": 1, "value": round(random.uniform(18, 26), 2),
+            "timestamp": now - timedelta(seconds=60 * i)
+        } for i in range(rows)])
+        conn.execute(insert(models.AnomalyAnalysis), [{
+            "sensor_id": 1, "location_id": 1,
+            "classical_method": "STD_DEV", "classical_anomaly_score": random.random(),
+            "classical_is_anomaly": random.random() < 0.1, "classical_description": "bench",
+            "transformer_model": "BERT-TS", "transformer_anomaly_score": random.random(),
+            "transformer_is_anomaly": random.random() < 0.1, "transformer_description": "bench",
+            "models_agreement": True, "confidence": random.random(),
+            "created_at": now - timedelta(minutes=i)
+        } for i in range(rows)])
+
+
+def measure(func, repeat: int) -> float:
+    """Лучшее время из repeat запусков (после прогревочного)"""
+    func()
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def pydantic_json(schema):
+    """Путь response_model: проверка строк по схеме и JSON из моделей"""
+    adapter = TypeAdapter(List[schema])
+    return lambda rows: adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+
+
+def fast_path(fields, columns=None):
+    return lambda rows: fast_json.dumps(fast_json.rows_to_dicts(rows, fields, columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pydantic response_model vs fast_json serialization")
+    parser.add_argument("--rows", type=int, default=500, help="Rows per page")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    db_engine = create_sqlite_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'serialization.db')}")
+    session_factory = sessionmaker(bind=db_engine)
+    prepare(db_engine, args.rows, datetime.utcnow())
+    db = session_factory()
+
+    m = models.Measurement
+    history_query = select(m.id, m.sensor_id, m.location_id, m.value, m.timestamp) \
+        .where(m.sensor_id == 1).order_by(m.timestamp.desc(), m.id.desc()).limit(args.rows)
+    history = db.execute(history_query).all()
+
+    def legacy_analyses():
+        # Прежний get_anomaly_analyses: ORM-объекты целиком
+        a = models.AnomalyAnalysis
+        db.expunge_all()
+        return db.execute(select(a).order_by(a.created_at.desc(), a.id.desc()).limit(args.rows)).scalars().all()
+
+    def analyses():
+        return crud.get_anomaly_analyses(db, limit=args.rows)
+
+    cases = [
+        ("/api/history", "pydantic", pydantic_json(schemas.MeasurementRead),
+         lambda: db.execute(history_query).all(), history),
+        ("/api/history", "fast_json", fast_path(fast_json.schema_fields(schemas.MeasurementRead),
+                                                crud.HISTORY_COLUMNS),
+         lambda: db.execute(history_query).all(), history),
+        ("/api/analysis/results", "pydantic", pydantic_json(schemas.AnomalyAnalysisRead),
+         legacy_analyses, legacy_analyses()),
+        ("/api/analysis/results", "fast_json", fast_path(fast_json.schema_fields(schemas.AnomalyAnalysisRead)),
+         analyses, analyses()),
+    ]
+
+    print("=" * 80)
+    print(f"SERIALIZATION BENCHMARK: {args.rows} rows per page, "
+          f"{'orjson' if fast_json.orjson is not None else 'json (orjson not installed)'}")
+    print("=" * 80)
+    print(f"{'endpoint':<24}{'path':<12}{'serialize, µs/row':>20}{'query+serialize, µs/row':>26}")
+    baseline = {}
+    for endpoint, label, serialize, load, rows in cases:
+        serialize_time = measure(lambda: serialize(rows), args.repeat)
+        total_time = measure(lambda: serialize(load()), args.repeat)
+        print(f"{endpoint:<24}{label:<12}{serialize_time / len(rows) * 1e6:>20.2f}"
+              f"{total_time / len(rows) * 1e6:>26.2f}", end="")
+        if endpoint in baseline:
+            print(f"   x{baseline[endpoint][0] / serialize_time:.1f} / x{baseline[endpoint][1] / total_time:.1f}")
+        else:
+            baseline[endpoint] = (serialize_time, total_time)
+            print()
+
+    db.close()
+    db_engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
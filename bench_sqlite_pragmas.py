@@ -0,0 +1,162 @@
+"""
+Бенчмарк профилей PRAGMA SQLite: default (rollback journal, synchronous=FULL)
+против production (WAL, synchronous=NORMAL, mmap, cache_size, temp_store, busy_timeout).
+
+Одновременно работают писатели (одно измерение на транзакцию, как
+POST /api/measurements) и читатели (история датчика и дневная аналитика,
+как /api/history и /analytics). Для каждого профиля выводится число
+операций в секунду и число ошибок "database is locked".
+
+Запуск:
+    python bench_sqlite_pragmas.py [--writers 4] [--readers 8] [--duration 5]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Глобальный движок database.py не должен открывать рабочую БД
+os.environ.setdefault("DATABASE_FILE", os.path.join(tempfile.mkdtemp(), "unused.db"))
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import OperationalError
+
+import crud
+import models
+from database import SQLITE_PROFILES, create_sqlite_engine
+
+SENSORS = 6
+
+
+def prepare(db_engine, rows: int):
+    """Создаёт схему и заполняет историю измерений"""
+    models.Base.metadata.create_all(bind=db_engine)
+    now = datetime.utcnow()
+    with db_engine.begin() as conn:
+        conn.execute(insert(models.Location), [{"id": 1, "name": "Bench", "room_type": "office"}])
+        conn.execute(insert(models.SensorType), [{"id": 1, "name": "Temperature", "unit": "°C"}])
+        conn.execute(insert(models.Sensor), [
+            {"id": i, "name": f"S{i}", "location_id": 1, "sensor_type_id": 1} for i in range(1, SENSORS + 1)
+        ])
+        conn.execute(insert(models.Measurement), [
+            {
+                "sensor_id": i % SENSORS + 1,
+                "location_id": 1,
+                "value": 20 + random.random() * 5,
+                "timestamp": now - timedelta(seconds=(rows - i) * 30)
+            }
+            for i in range(rows)
+        ])
+
+
+class Counter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ops = 0
+        self.errors = 0
+
+    def add(self, ok: bool):
+        with self.lock:
+            if ok:
+                self.ops += 1
+            else:
+                self.errors += 1
+
+
+def writer(db_engine, stop: threading.Event, counter: Counter):
+    while not stop.is_set():
+        try:
+            with db_engine.begin() as conn:
+                conn.execute(insert(models.Measurement), {
+                    "sensor_id": random.randint(1, SENSORS),
+                    "location_id": 1,
+                    "value": 20 + random.random() * 5,
+                    "timestamp": datetime.utcnow()
+                })
+            counter.add(True)
+        except OperationalError:
+            counter.add(False)
+
+
+def reader(db_engine, stop: threading.Event, counter: Counter):
+    while not stop.is_set():
+        sensor_id = random.randint(1, SENSORS)
+        try:
+            with db_engine.connect() as conn:
+                if random.random() < 0.5:
+                    conn.execute(
+                        select(models.Measurement)
+                        .where(models.Measurement.sensor_id == sensor_id)
+                        .order_by(models.Measurement.timestamp.desc())
+                        .limit(100)
+                    ).all()
+                else:
+                    conn.execute(crud._analytics_daily_query(sensor_id, datetime.utcnow() - timedelta(days=7))).all()
+            counter.add(True)
+        except OperationalError:
+            counter.add(False)
+
+
+def run_profile(profile: str, args) -> dict:
+    db_path = os.path.join(tempfile.mkdtemp(), f"{profile}.db")
+    db_engine = create_sqlite_engine(
+        f"sqlite:///{db_path}", profile,
+        pool_size=args.writers + args.readers, max_overflow=0
+    )
+    prepare(db_engine, args.rows)
+
+    writes, reads = Counter(), Counter()
+    stop = threading.Event()
+    threads = [threading.Thread(target=writer, args=(db_engine, stop, writes)) for _ in range(args.writers)]
+    threads += [threading.Thread(target=reader, args=(db_engine, stop, reads)) for _ in range(args.readers)]
+
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    db_engine.dispose()
+
+    return {
+        "writes": writes.ops / elapsed,
+        "write_errors": writes.errors,
+        "reads": reads.ops / elapsed,
+        "read_errors": reads.errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite pragma profiles under concurrent load")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--rows", type=int, default=50000, help="Measurements seeded before the run")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print(f"SQLITE PRAGMA BENCHMARK: {args.writers} writers, {args.readers} readers, "
+          f"{args.duration:.0f} s, {args.rows} seeded rows")
+    print("=" * 80)
+    print(f"{'profile':<14}{'writes/s':>12}{'write err':>12}{'reads/s':>12}{'read err':>12}")
+
+    results = {}
+    for profile in SQLITE_PROFILES:
+        results[profile] = run_profile(profile, args)
+        r = results[profile]
+        print(f"{profile:<14}{r['writes']:>12.0f}{r['write_errors']:>12}{r['reads']:>12.0f}{r['read_errors']:>12}")
+
+    base, tuned = results["default"], results["production"]
+    if base["writes"] and base["reads"]:
+        print(f"\nproduction vs default: writes x{tuned['writes'] / base['writes']:.1f}, "
+              f"reads x{tuned['reads'] / base['reads']:.1f}")
+
+
+if __name__ == "__main__":
+    main()
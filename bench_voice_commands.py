@@ -0,0 +1,106 @@
+"""
+Микро-бенчмарк парсеров голосовых команд.
+
+Сравнивает прежний перебор "команда × язык × фраза" с подстрочным поиском
+и скомпилированный KeywordMatcher на 100k транскриптов, а также полный
+parse_command с нормализацией и LRU-кэшем результатов разбора.
+
+Запуск:
+    python bench_voice_commands.py [количество транскриптов]
+"""
+
+import random
+import sys
+import time
+
+from voice_notification_commands import NotificationVoiceCommandParser
+from speech_recognition import VoiceCommandParser
+
+
+TRANSCRIPTS = [
+    ("да", "ru"),
+    ("да, согласен", "ru"),
+    ("нет, не нужно", "ru"),
+    ("измени на 23", "ru"),
+    ("объясни почему температура выросла", "ru"),
+    ("покажи статистику за неделю", "ru"),
+    ("yes", "en"),
+    ("yeah, ok go ahead", "en"),
+    ("no, not now", "en"),
+    ("set to 22.5 degrees please", "en"),
+    ("tell me more about this anomaly", "en"),
+    ("show data for the last week", "en"),
+    ("increase temperature by 2 degrees", "en"),
+    ("сделай прохладнее в серверной", "ru"),
+    ("what is temperature in the lab", "en"),
+    ("hmm let me think about it", "en"),
+]
+
+
+def legacy_match(commands, text, language, merge_fallback=False):
+    """Прежний алгоритм: перебор всех фраз с подстрочной проверкой `in`"""
+    best = None
+    best_confidence = 0.0
+    for command, lang_dict in commands.items():
+        if merge_fallback:
+            phrases = lang_dict.get(language, []) + lang_dict.get('en', [])
+        else:
+            phrases = lang_dict.get(language, []) or lang_dict.get('en', [])
+        for phrase in phrases:
+            if phrase in text:
+                confidence = len(phrase) / len(text)
+                if confidence > best_confidence:
+                    best = (command, phrase)
+                    best_confidence = confidence
+    return best
+
+
+def run(label, func, workload):
+    started = time.perf_counter()
+    for transcript, language in workload:
+        func(transcript, language)
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<40} {elapsed:7.3f} s  {len(workload) / elapsed:>12,.0f} transcripts/s")
+    return elapsed
+
+
+def main(count: int = 100_000):
+    random.seed(42)
+    workload = [(t.lower().strip(), l) for t, l in (random.choice(TRANSCRIPTS) for _ in range(count))]
+
+    notification_parser = NotificationVoiceCommandParser()
+    climate_parser = VoiceCommandParser()
+
+    print(f"=== Voice command parser benchmark ({count:,} transcripts) ===")
+    print("\nNotification commands (NotificationVoiceCommandParser):")
+    legacy = run(
+        "legacy substring scan",
+        lambda t, l: legacy_match(notification_parser.confirmation_commands, t, l),
+        workload
+    )
+    compiled = run("compiled matcher", notification_parser.matcher.match, workload)
+    print(f"  speedup: {legacy / compiled:.1f}x")
+    run("parse_command (end-to-end, LRU cache)", notification_parser.parse_command, workload)
+    print(f"  cache: {notification_parser.cache_stats()}")
+
+    print("\nClimate commands (VoiceCommandParser):")
+    legacy = run(
+        "legacy substring scan",
+        lambda t, l: legacy_match(climate_parser.commands, t, l, merge_fallback=True),
+        workload
+    )
+    compiled = run("compiled matcher", climate_parser.matcher.match, workload)
+    print(f"  speedup: {legacy / compiled:.1f}x")
+    run("parse_command (end-to-end, LRU cache)", climate_parser.parse_command, workload)
+    print(f"  cache: {climate_parser.cache_stats()}")
+
+    print("\nNumeric extraction:")
+    run(
+        "precompiled pattern",
+        lambda t, l: notification_parser.extract_numeric_value(t),
+        workload
+    )
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
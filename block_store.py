@@ -0,0 +1,541 @@
+"""
+Колоночное сжатое хранилище холодной истории измерений.
+
+Измерения старше суток перестают быть строками (id, sensor_id,
+location_id, value, timestamp) и сворачиваются в суточные блоки по
+датчику (таблица measurement_blocks):
+- timestamps: микросекунды эпохи, delta-of-delta + zigzag - при
+  регулярном опросе почти все значения нулевые или малые
+- values: если все значения - десятичные дроби с k <= 6 знаками (датчики
+  округляют показания), хранятся целые value * 10^k дельтами + zigzag;
+  иначе float64 XOR с предыдущим значением (идея Gorilla) - у медленно
+  меняющихся величин совпадают знак, порядок и старшие биты мантиссы
+- обе колонки проходят byte shuffle (байты одного разряда подряд)
+  и сжимаются zstd (или zlib, если zstandard не установлен)
+
+Кодирование и декодирование полностью векторизованы в NumPy. Читатель
+отдаёт массивы (timestamps int64 мкс, values float64) без ORM-объектов.
+В строке блока лежат count/sum/min/max, поэтому отчёты и графики
+агрегируют блоки в SQL без распаковки.
+"""
+
+import zlib
+from collections import namedtuple
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import and_, delete, func, insert, or_, select, tuple_
+from sqlalchemy.orm import Session
+
+import models
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+    print("[WARNING] zstandard not installed. Measurement blocks will use zlib")
+    print("   Install with: pip install zstandard")
+
+EPOCH = datetime(1970, 1, 1)
+HOUR_US = 3600 * 1_000_000
+DAY_US = 24 * HOUR_US
+
+DEFAULT_COMPRESSOR = "zstd" if zstandard is not None else "zlib"
+DEFAULT_CODEC = f"dod-xor/{DEFAULT_COMPRESSOR}"
+MAX_DECIMALS = 6
+
+# Точка истории из блока: те же поля, что у строк crud.iter_measurements
+MeasurementPoint = namedtuple("MeasurementPoint", "id sensor_id location_id value timestamp")
+# Синтетический id точки блока: -(id блока << POINT_ID_BITS + номер точки).
+# Отрицательный (не пересекается с id строк), уникальный и стабильный, пока
+# блок существует - поэтому точки блоков участвуют в keyset-пагинации по (timestamp, id)
+POINT_ID_BITS = 24
+# Сколько блоков читать одним запросом, перебирая их от новых к старым
+# (страница истории обычно укладывается в один-два суточных блока)
+LATEST_BLOCKS_BATCH = 4
+
+
+# --- ПРЕОБРАЗОВАНИЕ ВРЕМЕНИ ---
+
+def to_epoch_us(timestamps) -> np.ndarray:
+    """datetime (naive UTC) -> int64 микросекунды эпохи"""
+    return np.array(timestamps, dtype="datetime64[us]").astype(np.int64)
+
+
+def from_epoch_us(value: int) -> datetime:
+    """int64 микросекунды эпохи -> datetime"""
+    return EPOCH + timedelta(microseconds=int(value))
+
+
+# --- КОДЕК ---
+
+def _shuffle(words: np.ndarray) -> bytes:
+    """Byte shuffle: сначала все младшие байты, затем следующие и т.д."""
+    return words.view(np.uint8).reshape(-1, 8).T.tobytes()
+
+
+def _unshuffle(payload: bytes, count: int) -> np.ndarray:
+    return np.frombuffer(payload, dtype=np.uint8).reshape(8, count).T.copy().view(np.uint64).reshape(count)
+
+
+def _compress(payload: bytes, codec: str) -> bytes:
+    if codec.endswith("/zstd"):
+        return zstandard.ZstdCompressor(level=3).compress(payload)
+    return zlib.compress(payload, 6)
+
+
+def _decompress(payload: bytes, codec: str) -> bytes:
+    if codec.endswith("/zstd"):
+        if zstandard is None:
+            raise RuntimeError("Block is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    return zlib.decompress(payload)
+
+
+def encode_timestamps(timestamps_us: np.ndarray, codec: str = DEFAULT_CODEC) -> bytes:
+    """[t0, d0, dod1, dod2, ...] -> zigzag -> shuffle -> сжатие"""
+    ts = np.asarray(timestamps_us, dtype=np.int64)
+    encoded = np.empty_like(ts)
+    encoded[:1] = ts[:1]
+    if len(ts) > 1:
+        deltas = np.diff(ts)
+        encoded[1] = deltas[0]
+        encoded[2:] = np.diff(deltas)
+    return _compress(_shuffle(_zigzag(encoded)), codec)
+
+
+def decode_timestamps(payload: bytes, count: int, codec: str = DEFAULT_CODEC) -> np.ndarray:
+    encoded = _unzigzag(_unshuffle(_decompress(payload, codec), count))
+    ts = np.empty(count, dtype=np.int64)
+    ts[:1] = encoded[:1]
+    if count > 1:
+        ts[1:] = encoded[0] + np.cumsum(np.cumsum(encoded[1:]))
+    return ts
+
+
+def _zigzag(words: np.ndarray) -> np.ndarray:
+    return ((words << 1) ^ (words >> 63)).view(np.uint64)
+
+
+def _unzigzag(words: np.ndarray) -> np.ndarray:
+    return ((words >> np.uint64(1)) ^ (np.uint64(0) - (words & np.uint64(1)))).view(np.int64)
+
+
+def decimal_places(values: np.ndarray) -> Optional[int]:
+    """Минимальное k <= MAX_DECIMALS, при котором value * 10^k - целые без потерь"""
+    for k in range(MAX_DECIMALS + 1):
+        scaled = np.round(values * 10 ** k)
+        if np.abs(scaled).max(initial=0) >= 2 ** 52:
+            return None
+        if np.array_equal(scaled / 10 ** k, values):
+            return k
+    return None
+
+
+def values_codec(values: np.ndarray, compressor: str = DEFAULT_COMPRESSOR) -> str:
+    """Выбирает схему значений: dod-decK (десятичные) или dod-xor"""
+    k = decimal_places(values)
+    scheme = "xor" if k is None else f"dec{k}"
+    return f"dod-{scheme}/{compressor}"
+
+
+def encode_values(values: np.ndarray, codec: str = DEFAULT_CODEC) -> bytes:
+    """decK: дельты целых value * 10^k; xor: XOR с предыдущим float64"""
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    scheme = codec.split("/")[0]
+    if scheme.startswith("dod-dec"):
+        scaled = np.round(values * 10 ** int(scheme[len("dod-dec"):])).astype(np.int64)
+        words = _zigzag(np.diff(scaled, prepend=np.int64(0)))
+    else:
+        bits = values.view(np.uint64)
+        words = bits.copy()
+        words[1:] ^= bits[:-1]
+    return _compress(_shuffle(words), codec)
+
+
+def decode_values(payload: bytes, count: int, codec: str = DEFAULT_CODEC) -> np.ndarray:
+    words = _unshuffle(_decompress(payload, codec), count)
+    scheme = codec.split("/")[0]
+    if scheme.startswith("dod-dec"):
+        return np.cumsum(_unzigzag(words)) / 10 ** int(scheme[len("dod-dec"):])
+    return np.bitwise_xor.accumulate(words).view(np.float64)
+
+
+def encode_block(timestamps_us: np.ndarray, values: np.ndarray, compressor: str = DEFAULT_COMPRESSOR) -> Dict:
+    """
+    Кодирует отсортированный по времени ряд одного датчика.
+
+    Returns:
+        Поля models.MeasurementBlock (без sensor_id/location_id)
+    """
+    codec = values_codec(values, compressor)
+    return {
+        "start_ts": from_epoch_us(timestamps_us[0]),
+        "end_ts": from_epoch_us(timestamps_us[-1]),
+        "sample_count": len(values),
+        "value_sum": float(values.sum()),
+        "value_min": float(values.min()),
+        "value_max": float(values.max()),
+        "codec": codec,
+        "timestamps": encode_timestamps(timestamps_us, codec),
+        "values": encode_values(values, codec),
+    }
+
+
+def decode_block(block) -> Tuple[np.ndarray, np.ndarray]:
+    """Строка measurement_blocks -> (timestamps int64 мкс, values float64)"""
+    return (
+        decode_timestamps(block.timestamps, block.sample_count, block.codec),
+        decode_values(block.values, block.sample_count, block.codec),
+    )
+
+
+# --- ЧТЕНИЕ ---
+
+def _blocks_query(sensor_id: Optional[int] = None,
+                  location_id: Optional[int] = None,
+                  start: Optional[datetime] = None,
+                  end: Optional[datetime] = None):
+    b = models.MeasurementBlock
+    query = select(b.sensor_id, b.location_id, b.start_ts, b.sample_count, b.codec, b.timestamps, b.values)
+    if sensor_id is not None:
+        query = query.where(b.sensor_id == sensor_id)
+    if location_id is not None:
+        query = query.where(b.location_id == location_id)
+    if start is not None:
+        query = query.where(b.end_ts >= start)
+    if end is not None:
+        query = query.where(b.start_ts < end)
+    return query.order_by(b.start_ts)
+
+
+def _window_mask(ts: np.ndarray, start: Optional[datetime], end: Optional[datetime]) -> Optional[np.ndarray]:
+    mask = None
+    if start is not None:
+        mask = ts >= to_epoch_us([start])[0]
+    if end is not None:
+        upper = ts < to_epoch_us([end])[0]
+        mask = upper if mask is None else mask & upper
+    return mask
+
+
+def read_blocks(db: Session, sensor_id: int,
+                start: Optional[datetime] = None,
+                end: Optional[datetime] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Декодирует историю датчика из блоков в NumPy.
+
+    Returns:
+        (timestamps int64 мкс эпохи, values float64), по возрастанию времени
+    """
+    parts = [decode_block(block) for block in db.execute(_blocks_query(sensor_id, start=start, end=end))]
+    if not parts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+    ts = np.concatenate([p[0] for p in parts])
+    values = np.concatenate([p[1] for p in parts])
+    if len(parts) > 1 and np.any(np.diff(ts) < 0):
+        # Блоки опоздавших данных пересекаются с основными
+        order = np.argsort(ts, kind="stable")
+        ts, values = ts[order], values[order]
+
+    mask = _window_mask(ts, start, end)
+    if mask is not None:
+        ts, values = ts[mask], values[mask]
+    return ts, values
+
+
+def iter_block_points(db: Session,
+                      sensor_id: Optional[int] = None,
+                      location_id: Optional[int] = None,
+                      start: Optional[datetime] = None,
+                      end: Optional[datetime] = None) -> Iterator[MeasurementPoint]:
+    """
+    Точки из блоков в порядке времени (для слияния с сырыми строками).
+
+    Блоки суточные, поэтому декодируется по одним суткам за раз:
+    память ограничена объёмом суток, а не всей истории.
+    """
+    def flush(group: List) -> Iterator[MeasurementPoint]:
+        ts = np.concatenate([g[0] for g in group])
+        values = np.concatenate([g[1] for g in group])
+        sensors = np.concatenate([np.full(len(g[0]), g[2]) for g in group])
+        locations = [g[3] for g in group]
+        location_of = np.concatenate([np.full(len(g[0]), i) for i, g in enumerate(group)])
+        order = np.argsort(ts, kind="stable")
+        mask = _window_mask(ts[order], start, end)
+        if mask is not None:
+            order = order[mask]
+        for i in order:
+            yield MeasurementPoint(None, int(sensors[i]), locations[location_of[i]],
+                                   float(values[i]), from_epoch_us(ts[i]))
+
+    group = []
+    group_day = None
+    for block in db.execute(_blocks_query(sensor_id, location_id, start, end)):
+        day = block.start_ts.date()
+        if group and day != group_day:
+            yield from flush(group)
+            group = []
+        group_day = day
+        ts, values = decode_block(block)
+        group.append((ts, values, block.sensor_id, block.location_id))
+    if group:
+        yield from flush(group)
+
+
+def block_point_ids(block_id: int, count: int) -> np.ndarray:
+    """Синтетические id точек блока (см. POINT_ID_BITS)"""
+    return -((block_id << POINT_ID_BITS) + np.arange(1, count + 1, dtype=np.int64))
+
+
+def _blocks_newest_first(db: Session, query, batch: int = LATEST_BLOCKS_BATCH) -> Iterator:
+    """
+    Строки query (колонки блока + id, end_ts) по убыванию (end_ts, id)
+    пачками по batch: следующая пачка - keyset после последнего блока
+    предыдущей, так что прерванный перебор не читает остальные блоки.
+    """
+    b = models.MeasurementBlock
+    query = query.order_by(b.end_ts.desc(), b.id.desc()).limit(batch)
+    after = None
+    while True:
+        page = query
+        if after is not None:
+            page = page.where(or_(b.end_ts < after.end_ts, and_(b.end_ts == after.end_ts, b.id < after.id)))
+        rows = db.execute(page).all()
+        yield from rows
+        if len(rows) < batch:
+            return
+        after = rows[-1]
+
+
+def latest_block_points(db: Session,
+                        sensor_id: Optional[int] = None,
+                        start: Optional[datetime] = None,
+                        end: Optional[datetime] = None,
+                        before: Optional[Tuple[datetime, int]] = None,
+                        limit: int = 100) -> List[MeasurementPoint]:
+    """
+    До limit последних точек блоков по убыванию (timestamp, id) - для страниц истории.
+
+    before - ключ (timestamp, id): только точки раньше него. Блоки
+    перебираются от новых к старым по end_ts пачками вместе с данными
+    (_blocks_newest_first) и декодируются, пока следующий блок ещё может
+    содержать точки новее limit-й найденной - стоимость страницы -
+    одна-две пачки блоков, а не вся история.
+    """
+    b = models.MeasurementBlock
+    meta = select(b.id, b.end_ts, b.sensor_id, b.location_id, b.sample_count, b.codec, b.timestamps, b.values)
+    if sensor_id is not None:
+        meta = meta.where(b.sensor_id == sensor_id)
+    if start is not None:
+        meta = meta.where(b.end_ts >= start)
+    if end is not None:
+        meta = meta.where(b.start_ts < end)
+    if before is not None:
+        meta = meta.where(b.start_ts <= before[0])
+    before_us = to_epoch_us([before[0]])[0] if before is not None else None
+
+    ts = np.empty(0, dtype=np.int64)
+    ids = np.empty(0, dtype=np.int64)
+    values = np.empty(0, dtype=np.float64)
+    owners = np.empty(0, dtype=np.int64)           # индекс блока в blocks
+    blocks = []
+    for block in _blocks_newest_first(db, meta):
+        if len(ts) >= limit and to_epoch_us([block.end_ts])[0] < ts[-1]:
+            break
+        block_ts, block_values = decode_block(block)
+        block_ids = block_point_ids(block.id, len(block_ts))
+        mask = _window_mask(block_ts, start, end)
+        if before_us is not None:
+            keyset = (block_ts < before_us) | ((block_ts == before_us) & (block_ids < before[1]))
+            mask = keyset if mask is None else mask & keyset
+        if mask is not None:
+            block_ts, block_values, block_ids = block_ts[mask], block_values[mask], block_ids[mask]
+        if not len(block_ts):
+            continue
+
+        ts = np.concatenate([ts, block_ts])
+        ids = np.concatenate([ids, block_ids])
+        values = np.concatenate([values, block_values])
+        owners = np.concatenate([owners, np.full(len(block_ts), len(blocks))])
+        blocks.append(block)
+        order = np.lexsort((ids, ts))[::-1][:limit]
+        ts, ids, values, owners = ts[order], ids[order], values[order], owners[order]
+
+    return [
+        MeasurementPoint(int(ids[i]), blocks[owners[i]].sensor_id, blocks[owners[i]].location_id,
+                         float(values[i]), from_epoch_us(ts[i]))
+        for i in range(len(ts))
+    ]
+
+
+def iter_sensor_arrays(db: Session,
+                       start: Optional[datetime] = None,
+                       end: Optional[datetime] = None) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+    """
+    Ряды всех датчиков из блоков за [start, end) по возрастанию sensor_id:
+    (sensor_id, timestamps int64 мкс, values float64). Блоки читаются
+    потоково, в памяти - блоки одного датчика.
+    """
+    def flush(sensor_id: int, parts: List) -> Tuple[int, np.ndarray, np.ndarray]:
+        ts = np.concatenate([p[0] for p in parts])
+        values = np.concatenate([p[1] for p in parts])
+        if len(parts) > 1 and np.any(np.diff(ts) < 0):
+            order = np.argsort(ts, kind="stable")
+            ts, values = ts[order], values[order]
+        mask = _window_mask(ts, start, end)
+        if mask is not None:
+            ts, values = ts[mask], values[mask]
+        return sensor_id, ts, values
+
+    b = models.MeasurementBlock
+    query = _blocks_query(start=start, end=end).order_by(None).order_by(b.sensor_id, b.start_ts)
+    result = db.execute(query.execution_options(stream_results=True, yield_per=100))
+    try:
+        current, parts = None, []
+        for block in result:
+            if parts and block.sensor_id != current:
+                yield flush(current, parts)
+                parts = []
+            current = block.sensor_id
+            parts.append(decode_block(block))
+        if parts:
+            yield flush(current, parts)
+    finally:
+        result.close()
+
+
+# --- ЗАПИСЬ ---
+
+def newest_row_keys(db: Session, table, before: datetime) -> List[Tuple[int, datetime]]:
+    """
+    (sensor_id, timestamp) последних строк датчиков, замолчавших раньше before.
+
+    Последнее показание датчика не уходит из горячей таблицы ни в блоки,
+    ни в партиции: по нему get_last_measurement(s) и симуляция
+    /api/sensors находят текущее значение датчика, который давно молчит.
+    Ключи читаются один раз до переноса - новое показание, пришедшее между
+    выборкой и удалением, не приведёт к удалению несохранённой строки.
+    """
+    newest = func.max(table.c.timestamp)
+    rows = db.execute(select(table.c.sensor_id, newest).group_by(table.c.sensor_id).having(newest < before)).all()
+    return [tuple(row) for row in rows]
+
+
+def except_rows(table, keys: List[Tuple[int, datetime]],
+                start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """
+    Условие "строка не из keys" (None, если исключать нечего).
+    start/end - окно переноса: ключи вне [start, end) в условие не попадают.
+    """
+    keys = [key for key in keys if (start is None or key[1] >= start) and (end is None or key[1] < end)]
+    if not keys:
+        return None
+    return tuple_(table.c.sensor_id, table.c.timestamp).not_in(keys)
+
+
+def compact_range(db: Session, start: datetime, end: datetime,
+                  newest_keys: Optional[List[Tuple[int, datetime]]] = None) -> int:
+    """
+    Сворачивает сырые измерения горячей таблицы из [start, end) в блоки
+    (один блок на датчик) и удаляет строки. Одна транзакция.
+    Последняя строка каждого датчика остаётся в горячей таблице (newest_row_keys).
+
+    Args:
+        newest_keys: Ключи newest_row_keys, прочитанные один раз на весь
+                     прогон (None - читаются для этого вызова)
+
+    Returns:
+        Количество свёрнутых измерений
+    """
+    m = models.Measurement.__table__
+    in_range = (m.c.timestamp >= start) & (m.c.timestamp < end)
+    if newest_keys is None:
+        newest_keys = newest_row_keys(db, m, end)
+    keep = except_rows(m, newest_keys, start, end)
+    if keep is not None:
+        in_range = in_range & keep
+    rows = db.execute(
+        select(m.c.sensor_id, m.c.location_id, m.c.timestamp, m.c.value)
+        .where(in_range)
+        .order_by(m.c.sensor_id, m.c.timestamp, m.c.id)
+    ).all()
+    if not rows:
+        return 0
+
+    sensor_ids = np.fromiter((r.sensor_id for r in rows), dtype=np.int64, count=len(rows))
+    ts = to_epoch_us([r.timestamp for r in rows])
+    values = np.fromiter((r.value for r in rows), dtype=np.float64, count=len(rows))
+
+    # Границы групп по датчику (строки отсортированы по sensor_id)
+    bounds = np.flatnonzero(np.diff(sensor_ids)) + 1
+    starts = np.concatenate(([0], bounds))
+    stops = np.concatenate((bounds, [len(rows)]))
+
+    blocks = []
+    for lo, hi in zip(starts, stops):
+        block = encode_block(ts[lo:hi], values[lo:hi])
+        block["sensor_id"] = int(sensor_ids[lo])
+        block["location_id"] = rows[lo].location_id
+        blocks.append(block)
+
+    db.execute(insert(models.MeasurementBlock), blocks)
+    db.execute(delete(m).where(in_range))
+    db.commit()
+    return len(rows)
+
+
+def hourly_rollups(ts: np.ndarray, values: np.ndarray) -> List[Dict]:
+    """Почасовые count/sum/min/max по отсортированному ряду"""
+    if len(ts) == 0:
+        return []
+    hours = ts // HOUR_US
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(hours)) + 1))
+    counts = np.diff(np.concatenate((starts, [len(ts)])))
+    sums = np.add.reduceat(values, starts)
+    mins = np.minimum.reduceat(values, starts)
+    maxs = np.maximum.reduceat(values, starts)
+    return [
+        {
+            "bucket_start": from_epoch_us(hours[i] * HOUR_US),
+            "sample_count": int(counts[k]),
+            "value_sum": float(sums[k]),
+            "value_min": float(mins[k]),
+            "value_max": float(maxs[k]),
+        }
+        for k, i in enumerate(starts)
+    ]
+
+
+def roll_up_blocks(db: Session, cutoff: datetime, batch_size: int = 200) -> int:
+    """
+    Заменяет блоки, целиком старше cutoff, почасовыми агрегатами.
+
+    Returns:
+        Количество свёрнутых измерений
+    """
+    b = models.MeasurementBlock
+    rolled_up = 0
+    while True:
+        blocks = db.execute(
+            select(b.id, b.sensor_id, b.location_id, b.sample_count, b.codec, b.timestamps, b.values)
+            .where(b.end_ts < cutoff)
+            .order_by(b.id)
+            .limit(batch_size)
+        ).all()
+        if not blocks:
+            return rolled_up
+
+        rollups = []
+        for block in blocks:
+            for rollup in hourly_rollups(*decode_block(block)):
+                rollup["sensor_id"] = block.sensor_id
+                rollup["location_id"] = block.location_id
+                rollups.append(rollup)
+            rolled_up += block.sample_count
+
+        db.execute(insert(models.MeasurementRollup), rollups)
+        db.execute(delete(b).where(b.id.in_([block.id for block in blocks])))
+        db.commit()
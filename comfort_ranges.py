@@ -0,0 +1,227 @@
+"""
+Настраиваемые нормальные диапазоны (comfort_ranges), скомпилированные по sensor_id.
+
+Диапазон и цель задаются в БД на локацию или на тип помещения для типа
+датчика (в том числе давления); без записи действуют константы
+RecommendationGenerator.NORMAL_RANGES / TARGET_VALUES. Правила
+разрешаются один раз - в плоские массивы lower / upper / target,
+индексированные sensor_id (NaN - нормы нет). Проверка показания - это
+индексация массива, без словарей и сравнения строк в горячем пути:
+события порогов живого потока, время вне нормы в отчётах и векторные
+рекомендации (RecommendationGenerator.evaluate_arrays(bounds=...)).
+
+Чтение снимка (get, bounds) не обращается к БД - его можно звать из
+async-обработчиков и живого потока. Компиляция - при старте (refresh),
+сразу после изменений через API (invalidate) и, для изменений из других
+процессов, в фоновом потоке (start): раз в check_interval секунд он
+сверяет сигнатуру - число и время изменения правил и привязку датчиков
+(локация, тип, room_type локации, имя типа).
+"""
+
+import threading
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+from intelligent_recommendation_engine import RecommendationGenerator
+
+
+class CompiledRanges:
+    """Неизменяемый снимок норм: массивы по sensor_id"""
+
+    def __init__(self, lower: np.ndarray, upper: np.ndarray, target: np.ndarray,
+                 kinds: np.ndarray, signature: Tuple = ()):
+        self.lower = lower
+        self.upper = upper
+        self.target = target
+        self.kinds = kinds           # код RecommendationGenerator.SENSOR_KINDS или GENERIC_KIND
+        self.signature = signature
+
+    def __len__(self) -> int:
+        return len(self.lower)
+
+    def bounds(self, sensor_id: int) -> Optional[Tuple[float, float]]:
+        """(min, max) датчика или None"""
+        if not 0 <= sensor_id < len(self.lower) or np.isnan(self.lower[sensor_id]):
+            return None
+        return float(self.lower[sensor_id]), float(self.upper[sensor_id])
+
+    def target_value(self, sensor_id: int) -> Optional[float]:
+        """Целевое значение датчика или None"""
+        if not 0 <= sensor_id < len(self.target) or np.isnan(self.target[sensor_id]):
+            return None
+        return float(self.target[sensor_id])
+
+    def columns(self, sensor_ids) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """(lower, upper, target, kinds) для массива sensor_id; неизвестные датчики - без нормы"""
+        sensor_ids = np.asarray(sensor_ids, dtype=np.intp)
+        inside = (sensor_ids >= 0) & (sensor_ids < len(self.lower))
+        index = np.where(inside, sensor_ids, 0)
+        nan = np.full(len(sensor_ids), np.nan)
+        return (np.where(inside, self.lower[index], nan),
+                np.where(inside, self.upper[index], nan),
+                np.where(inside, self.target[index], nan),
+                np.where(inside, self.kinds[index], RecommendationGenerator.GENERIC_KIND))
+
+    def out_of_range(self, sensor_ids, values) -> np.ndarray:
+        """Маска показаний вне нормы"""
+        lower, upper, _, _ = self.columns(sensor_ids)
+        values = np.asarray(values, dtype=np.float64)
+        return (values < lower) | (values > upper)
+
+    def recommend(self, sensor_ids, values, scores=None, is_anomaly=None,
+                  sensor_names: Optional[Sequence[str]] = None) -> list:
+        """Векторные рекомендации по нормам из БД (RecommendationGenerator.bulk_generate_from_arrays)"""
+        lower, upper, target, kinds = self.columns(sensor_ids)
+        return RecommendationGenerator().bulk_generate_from_arrays(
+            values, kinds, scores=scores, is_anomaly=is_anomaly,
+            sensor_names=sensor_names, bounds=(lower, upper, target)
+        )
+
+
+class ComfortRangeTable:
+    """Текущий снимок норм; проверка изменений - вне пути запроса"""
+
+    def __init__(self, session_factory=SessionLocal, check_interval: float = 30.0):
+        """
+        Args:
+            session_factory: Фабрика сессий БД
+            check_interval: Как часто фоновый поток сверяет сигнатуру таблиц (секунды)
+        """
+        self.session_factory = session_factory
+        self.check_interval = check_interval
+        self._compiled: Optional[CompiledRanges] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.compilations = 0
+        self.failed = 0
+
+    def start(self):
+        """Запускает фоновую проверку сигнатуры"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="comfort-ranges", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def get(self, db: Optional[Session] = None) -> CompiledRanges:
+        """Текущий снимок; БД читается, только если снимка ещё нет (до первой компиляции)"""
+        compiled = self._compiled
+        if compiled is None:
+            compiled = self.refresh(db)
+        return compiled
+
+    def bounds(self, sensor_id: int) -> Optional[Tuple[float, float]]:
+        """(min, max) датчика по текущему снимку; без обращения к БД (None, если снимка нет)"""
+        compiled = self._compiled
+        return compiled.bounds(sensor_id) if compiled is not None else None
+
+    def refresh(self, db: Optional[Session] = None, force: bool = False) -> CompiledRanges:
+        """Сверяет сигнатуру и при изменениях (или force) перекомпилирует снимок"""
+        with self._lock:
+            own_session = db is None
+            db = db or self.session_factory()
+            try:
+                signature = self._signature(db)
+                if force or self._compiled is None or self._compiled.signature != signature:
+                    self._compiled = self.compile(db, signature)
+                    self.compilations += 1
+            finally:
+                if own_session:
+                    db.close()
+            return self._compiled
+
+    def invalidate(self, db: Optional[Session] = None) -> CompiledRanges:
+        """Сразу перекомпилирует снимок (после изменения норм, датчиков или локаций)"""
+        return self.refresh(db, force=True)
+
+    def _run(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                self.failed += 1
+                print(f"❌ ERROR: Comfort range refresh failed: {e}")
+
+    @staticmethod
+    def _signature(db: Session) -> Tuple:
+        rules = db.execute(select(func.count(), func.max(models.ComfortRange.updated_at))).one()
+        # Привязка датчиков целиком: перенос в другую локацию, смена типа или room_type
+        # не меняют ни число, ни максимальный id датчиков
+        assignments = db.execute(
+            select(models.Sensor.id, models.Sensor.location_id, models.Sensor.sensor_type_id,
+                   models.Location.room_type, models.SensorType.name)
+            .outerjoin(models.Location, models.Location.id == models.Sensor.location_id)
+            .outerjoin(models.SensorType, models.SensorType.id == models.Sensor.sensor_type_id)
+            .order_by(models.Sensor.id)
+        ).all()
+        return tuple(rules) + (len(assignments), hash(tuple(tuple(row) for row in assignments)))
+
+    @staticmethod
+    def compile(db: Session, signature: Tuple = ()) -> CompiledRanges:
+        """Разрешает правила для всех датчиков в массивы по sensor_id"""
+        by_location: Dict[Tuple, models.ComfortRange] = {}
+        by_room: Dict[Tuple, models.ComfortRange] = {}
+        for rule in db.query(models.ComfortRange).all():
+            if rule.location_id is not None:
+                by_location[(rule.location_id, rule.sensor_type_id)] = rule
+            elif rule.room_type is not None:
+                by_room[(rule.room_type, rule.sensor_type_id)] = rule
+
+        sensors = db.execute(
+            select(models.Sensor.id, models.Sensor.location_id, models.Sensor.sensor_type_id,
+                   models.Location.room_type, models.SensorType.name)
+            .outerjoin(models.Location, models.Location.id == models.Sensor.location_id)
+            .outerjoin(models.SensorType, models.SensorType.id == models.Sensor.sensor_type_id)
+        ).all()
+
+        size = max((row.id for row in sensors), default=-1) + 1
+        lower = np.full(size, np.nan)
+        upper = np.full(size, np.nan)
+        target = np.full(size, np.nan)
+        type_names = [row.name or '' for row in sensors]
+        kinds = np.full(size, RecommendationGenerator.GENERIC_KIND, dtype=np.intp)
+        if sensors:
+            kinds[[row.id for row in sensors]] = RecommendationGenerator.sensor_type_codes(type_names)
+
+        for row in sensors:
+            rule = by_location.get((row.location_id, row.sensor_type_id)) \
+                or by_room.get((row.room_type, row.sensor_type_id))
+            if rule is not None:
+                lower[row.id], upper[row.id] = rule.min_value, rule.max_value
+                target[row.id] = rule.target_value if rule.target_value is not None \
+                    else (rule.min_value + rule.max_value) / 2
+                continue
+            # Значения по умолчанию - константы генератора рекомендаций
+            room_type = row.room_type if row.room_type in RecommendationGenerator.NORMAL_RANGES else 'office'
+            kind = (row.name or '').lower()
+            default = RecommendationGenerator.NORMAL_RANGES[room_type].get(kind)
+            if default is not None:
+                lower[row.id], upper[row.id] = default
+                target[row.id] = RecommendationGenerator.TARGET_VALUES[room_type][kind]
+
+        return CompiledRanges(lower, upper, target, kinds, signature)
+
+    def stats(self) -> Dict:
+        compiled = self._compiled
+        return {
+            'sensors': int(np.count_nonzero(~np.isnan(compiled.lower))) if compiled is not None else None,
+            'compilations': self.compilations,
+            'failed': self.failed
+        }
+
+
+# Глобальная таблица норм для использования в приложении
+comfort_ranges = ComfortRangeTable()
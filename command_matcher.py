@@ -0,0 +1,218 @@
+"""
+Скомпилированный поиск ключевых фраз для парсеров голосовых команд.
+
+Словари команд вида {команда: {язык: [фразы]}} компилируются один раз
+в регулярное выражение на язык - одну альтернативу из всех фраз, более
+длинные первыми. Поиск идёт в C-движке re: транскрипт сканируется один раз,
+а повторный поиск запускается только со следующей позиции после найденной
+фразы, чтобы не потерять перекрывающиеся совпадения. Фразы совпадают только
+целыми словами ("да" не находится внутри "данные").
+"""
+
+import re
+from functools import lru_cache
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+
+# Числа для команд изменения: "23", "23.5", "23,5"
+NUMBER_PATTERN = re.compile(r'\d+[.,]?\d*')
+# Целые числа для параметров команд управления климатом
+INTEGER_PATTERN = re.compile(r'\d+')
+
+# Пунктуация и символы; точка/запятая между цифрами (23,5) сохраняются
+PUNCTUATION_PATTERN = re.compile(r'(?!(?<=\d)[.,](?=\d))[^\w\s]|_')
+
+# Числительные (ru/en) для перевода "двадцать три" -> "23"
+NUMBER_UNITS = {
+    'ноль': 0, 'один': 1, 'одна': 1, 'одно': 1, 'два': 2, 'две': 2, 'три': 3,
+    'четыре': 4, 'пять': 5, 'шесть': 6, 'семь': 7, 'восемь': 8, 'девять': 9,
+    'десять': 10, 'одиннадцать': 11, 'двенадцать': 12, 'тринадцать': 13,
+    'четырнадцать': 14, 'пятнадцать': 15, 'шестнадцать': 16, 'семнадцать': 17,
+    'восемнадцать': 18, 'девятнадцать': 19,
+    'zero': 0, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6,
+    'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12,
+    'thirteen': 13, 'fourteen': 14, 'fifteen': 15, 'sixteen': 16,
+    'seventeen': 17, 'eighteen': 18, 'nineteen': 19,
+}
+NUMBER_TENS = {
+    'двадцать': 20, 'тридцать': 30, 'сорок': 40, 'пятьдесят': 50,
+    'шестьдесят': 60, 'семьдесят': 70, 'восемьдесят': 80, 'девяносто': 90,
+    'twenty': 20, 'thirty': 30, 'forty': 40, 'fifty': 50, 'sixty': 60,
+    'seventy': 70, 'eighty': 80, 'ninety': 90,
+}
+
+
+def _number_words_to_digits(words: List[str]) -> List[str]:
+    """Заменяет числительные цифрами: ['на', 'двадцать', 'три'] -> ['на', '23']"""
+    if NUMBER_UNITS.keys().isdisjoint(words) and NUMBER_TENS.keys().isdisjoint(words):
+        return words
+    result = []
+    index = 0
+    while index < len(words):
+        word = words[index]
+        if word in NUMBER_TENS:
+            value = NUMBER_TENS[word]
+            following = words[index + 1] if index + 1 < len(words) else None
+            if following in NUMBER_UNITS and 0 < NUMBER_UNITS[following] < 10:
+                value += NUMBER_UNITS[following]
+                index += 1
+            result.append(str(value))
+        elif word in NUMBER_UNITS:
+            result.append(str(NUMBER_UNITS[word]))
+        else:
+            result.append(word)
+        index += 1
+    return result
+
+
+@lru_cache(maxsize=4096)
+def normalize_transcript(transcript: str) -> str:
+    """
+    Приводит транскрипт к канонической форме для поиска команд и кэширования.
+
+    Шаги: casefold, ё -> е, удаление пунктуации, схлопывание пробелов,
+    числительные -> цифры ("Да!" и "да" дают одну и ту же строку).
+    Сами транскрипты тоже повторяются, поэтому результат кэшируется.
+
+    Args:
+        transcript: Распознанный текст
+
+    Returns:
+        Нормализованный текст
+    """
+    text = transcript.casefold().replace('ё', 'е')
+    text = PUNCTUATION_PATTERN.sub(' ', text)
+    return ' '.join(_number_words_to_digits(text.split()))
+
+
+class KeywordMatcher:
+    """
+    Мультишаблонный матчер ключевых фраз.
+
+    Повторяет семантику перебора "команда × язык × фраза": побеждает самая
+    длинная фраза, а при равной длине - та, что раньше объявлена в словаре.
+    """
+
+    def __init__(self,
+                 commands: Dict[Hashable, Dict[str, List[str]]],
+                 fallback_language: str = 'en',
+                 merge_fallback: bool = False):
+        """
+        Args:
+            commands: Словарь {команда: {язык: [фразы]}}
+            fallback_language: Язык, фразы которого используются, если для
+                               команды нет фраз на запрошенном языке
+            merge_fallback: Всегда добавлять фразы fallback-языка к фразам
+                            запрошенного языка (а не только при их отсутствии)
+        """
+        self.commands = commands
+        self.fallback_language = fallback_language
+        self.merge_fallback = merge_fallback
+        self._compiled: Dict[str, Tuple[Optional[re.Pattern], Dict[str, Tuple]]] = {}
+
+        languages = {lang for lang_dict in commands.values() for lang in lang_dict}
+        for language in languages:
+            self._compiled[language] = self._compile(language)
+
+    def _phrases_for(self, lang_dict: Dict[str, List[str]], language: str) -> List[str]:
+        """Фразы команды для языка с учётом fallback-языка"""
+        phrases = list(lang_dict.get(language, []))
+        if self.merge_fallback:
+            phrases += lang_dict.get(self.fallback_language, [])
+        elif not phrases:
+            phrases = list(lang_dict.get(self.fallback_language, []))
+        return phrases
+
+    def _compile(self, language: str):
+        """Собирает регулярное выражение и таблицу фраза -> ((-длина, порядок), команда)"""
+        table: Dict[str, Tuple] = {}
+        order = 0
+        for command, lang_dict in self.commands.items():
+            for phrase in self._phrases_for(lang_dict, language):
+                phrase = phrase.casefold().replace('ё', 'е')
+                # Дубликаты фраз: выигрывает первое объявление, как при переборе
+                if phrase and phrase not in table:
+                    table[phrase] = ((-len(phrase), order), command)
+                order += 1
+
+        if not table:
+            return None, table
+
+        # В каждой позиции альтернатива отдаёт самую длинную фразу
+        alternatives = sorted(table, key=lambda phrase: table[phrase][0])
+        pattern = re.compile(r'\b(?:' + '|'.join(map(re.escape, alternatives)) + r')\b')
+        return pattern, table
+
+    def match(self, text: str, language: str = 'en') -> Optional[Tuple[Hashable, str]]:
+        """
+        Находит лучшую фразу в тексте.
+
+        Args:
+            text: Текст в нижнем регистре
+            language: Язык ('ru' или 'en')
+
+        Returns:
+            (команда, совпавшая фраза) или None
+        """
+        compiled = self._compiled.get(language)
+        if compiled is None:
+            compiled = self._compiled.setdefault(language, self._compile(language))
+        pattern, table = compiled
+        if pattern is None:
+            return None
+
+        best_rank = None
+        best_phrase = None
+        search = pattern.search
+        found = search(text)
+        while found is not None:
+            phrase = found.group()
+            rank = table[phrase][0]
+            if best_rank is None or rank < best_rank:
+                best_rank = rank
+                best_phrase = phrase
+            found = search(text, found.start() + 1)
+
+        if best_phrase is None:
+            return None
+        return table[best_phrase][1], best_phrase
+
+
+def cache_stats(cached: Callable) -> Dict:
+    """
+    Метрики LRU-кэша результатов разбора (functools.lru_cache).
+
+    Returns:
+        {
+            'hits': int,
+            'misses': int,
+            'size': int,
+            'maxsize': int,
+            'hit_rate': float (0-1)
+        }
+    """
+    info = cached.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'maxsize': info.maxsize,
+        'hit_rate': round(info.hits / lookups, 3) if lookups else 0.0
+    }
+
+
+def extract_number(text: str) -> Optional[float]:
+    """
+    Извлекает первое число из текста ("измени на 23,5" -> 23.5).
+
+    Returns:
+        float (или None если не найдено)
+    """
+    found = NUMBER_PATTERN.search(text)
+    if not found:
+        return None
+    try:
+        return float(found.group(0).replace(',', '.'))
+    except ValueError:
+        return None
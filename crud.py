@@ -1,12 +1,25 @@
 # crud.py
-from typing import Optional
+from typing import Iterator, Optional
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import desc
-from sqlalchemy import func, cast, Date
+from sqlalchemy import bindparam, desc, insert, select, union_all, update
+from sqlalchemy import func, cast, type_coerce, BigInteger, Date, String
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
+import csv
+import io
 import models
 import schemas
 import os
+from measurement_storage import day_floor, partition_table
+import block_store
+import heapq
+import math
+from itertools import chain, groupby
+import numpy as np
+import report_stats
+import pagination
+import fast_json
+from comfort_ranges import ComfortRangeTable
 
 
 # --- ФУНКЦИИ ДЛЯ ЭКРАНА "ДАТЧИКИ" ---
@@ -15,6 +28,33 @@ def get_all_locations(db: Session) -> list[models.Location]:
     """Возвращает все локации для выпадающего списка кабинетов."""
     return db.query(models.Location).order_by(models.Location.name).all()
 
+def get_comfort_ranges(db: Session) -> list[models.ComfortRange]:
+    return db.query(models.ComfortRange).order_by(models.ComfortRange.id).all()
+
+def upsert_comfort_range(db: Session, data: schemas.ComfortRangeBase) -> models.ComfortRange:
+    """Создаёт или обновляет норму для области (локация или тип помещения, тип датчика)"""
+    rule = db.query(models.ComfortRange).filter(
+        models.ComfortRange.location_id.is_(None) if data.location_id is None
+        else models.ComfortRange.location_id == data.location_id,
+        models.ComfortRange.room_type.is_(None) if data.room_type is None
+        else models.ComfortRange.room_type == data.room_type,
+        models.ComfortRange.sensor_type_id == data.sensor_type_id
+    ).first()
+    if rule is None:
+        rule = models.ComfortRange(location_id=data.location_id, room_type=data.room_type,
+                                   sensor_type_id=data.sensor_type_id)
+        db.add(rule)
+    rule.min_value, rule.max_value, rule.target_value = data.min_value, data.max_value, data.target_value
+    rule.updated_at = datetime.utcnow()
+    db.commit()
+    db.refresh(rule)
+    return rule
+
+def delete_comfort_range(db: Session, range_id: int) -> bool:
+    deleted = db.query(models.ComfortRange).filter(models.ComfortRange.id == range_id).delete()
+    db.commit()
+    return deleted > 0
+
 def get_sensors_by_location(db: Session, location_id: int) -> list[models.Sensor]:
     """
     Возвращает все датчики, привязанные к конкретной локации, 
@@ -29,28 +69,117 @@ def get_sensors_by_location(db: Session, location_id: int) -> list[models.Sensor
     return sensors
 
 def get_last_measurement(db: Session, sensor_id: int) -> Optional[models.Measurement]:
-    """Получает последнее измерение для одного датчика."""
+    """
+    Получает последнее измерение для одного датчика.
+    Горячей таблицы достаточно: последняя строка датчика не сжимается и не
+    архивируется (block_store.newest_row_keys).
+    """
     return db.query(models.Measurement)\
         .filter(models.Measurement.sensor_id == sensor_id)\
         .order_by(models.Measurement.timestamp.desc())\
         .first()
 
+def get_measurement_at(db: Session, sensor_id: int, moment: datetime):
+    """
+    Последнее измерение датчика не позже moment (строка или точка блока).
+    Через сутки строки сжимаются в блоки, поэтому читаются обе части.
+    """
+    m = models.Measurement
+    row = db.query(m)\
+        .filter(m.sensor_id == sensor_id, m.timestamp <= moment)\
+        .order_by(m.timestamp.desc())\
+        .first()
+    points = block_store.latest_block_points(db, sensor_id=sensor_id,
+                                             end=moment + timedelta(microseconds=1), limit=1)
+    candidates = ([row] if row is not None else []) + points
+    return max(candidates, key=lambda point: point.timestamp, default=None)
+
+# --- ПАРТИЦИИ ИЗМЕРЕНИЙ (PARTITION PRUNING) ---
+def _partition_names_query(start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """Имена месячных партиций, пересекающих интервал [start, end)"""
+    p = models.MeasurementPartition
+    query = select(p.table_name)
+    if start is not None:
+        query = query.where(p.range_end > start)
+    if end is not None:
+        query = query.where(p.range_start < end)
+    return query.order_by(p.range_start)
+
+def _measurement_sources(partition_names) -> list:
+    """Таблицы для чтения: нужные партиции + горячая measurements"""
+    return [partition_table(name) for name in partition_names] + [models.Measurement.__table__]
+
+def measurement_sources(db: Session, start: Optional[datetime] = None,
+                        end: Optional[datetime] = None) -> list:
+    """Таблицы измерений, в которых могут быть строки интервала [start, end)"""
+    return _measurement_sources(db.execute(_partition_names_query(start, end)).scalars().all())
+
+def _measurements_union(sources: list,
+                        sensor_id: Optional[int] = None,
+                        location_id: Optional[int] = None,
+                        start: Optional[datetime] = None,
+                        end: Optional[datetime] = None,
+                        before: Optional[tuple] = None):
+    """
+    Подзапрос (id, sensor_id, location_id, value, timestamp) по всем источникам.
+    Фильтры ставятся в каждую ветку UNION ALL, чтобы работали индексы партиций.
+    before - ключ (timestamp, id): только строки раньше него (keyset-пагинация).
+    """
+    branches = []
+    for table in sources:
+        query = select(table.c.id, table.c.sensor_id, table.c.location_id, table.c.value, table.c.timestamp)
+        if sensor_id is not None:
+            query = query.where(table.c.sensor_id == sensor_id)
+        if location_id is not None:
+            query = query.where(table.c.location_id == location_id)
+        if start is not None:
+            query = query.where(table.c.timestamp >= start)
+        if end is not None:
+            query = query.where(table.c.timestamp < end)
+        if before is not None:
+            query = query.where(pagination.after((table.c.timestamp, table.c.id), before))
+        branches.append(query)
+    if len(branches) == 1:
+        return branches[0].subquery()
+    return union_all(*branches).subquery()
+
 # --- АНАЛИТИКА (ГРАФИКИ) ---
-def get_analytics_daily(db: Session, sensor_id: int, days: int = 7):
-    start_date = datetime.utcnow() - timedelta(days=days)
-    results = (
-        db.query(
-            cast(models.Measurement.timestamp, Date).label("date"), 
-            func.avg(models.Measurement.value).label("avg_value")
-        )
-        .filter(
-            models.Measurement.sensor_id == sensor_id,
-            models.Measurement.timestamp >= start_date
-        )
-        .group_by(cast(models.Measurement.timestamp, Date))
-        .order_by(cast(models.Measurement.timestamp, Date))
-        .all()
+def _analytics_daily_query(sensor_id: int, start_date: datetime, partition_names=()):
+    """
+    Средние значения датчика по дням (общий запрос для sync и async).
+    Сырые строки, сжатые блоки и почасовые агрегаты сводятся через
+    сумму и количество, поэтому среднее по дню точное. start_date -
+    начало суток: суточные блоки и часовые агрегаты не режутся внутри
+    дня, поэтому первый день берётся целиком из любого источника.
+    """
+    start_date = day_floor(start_date)
+    m = _measurements_union(_measurement_sources(partition_names), sensor_id=sensor_id, start=start_date)
+    # date() работает и в SQLite, и в PostgreSQL (CAST AS DATE в SQLite даёт число)
+    raw_day = func.date(m.c.timestamp, type_=Date)
+    raw_parts = select(
+        raw_day.label("date"), func.sum(m.c.value).label("total"), func.count().label("samples")
+    ).group_by(raw_day)
+
+    b = models.MeasurementBlock
+    block_day = func.date(b.start_ts, type_=Date)
+    block_parts = select(block_day, func.sum(b.value_sum), func.sum(b.sample_count)).where(
+        b.sensor_id == sensor_id, b.start_ts >= start_date
+    ).group_by(block_day)
+
+    r = models.MeasurementRollup
+    rollup_day = func.date(r.bucket_start, type_=Date)
+    rollup_parts = select(rollup_day, func.sum(r.value_sum), func.sum(r.sample_count)).where(
+        r.sensor_id == sensor_id, r.bucket_start >= start_date
+    ).group_by(rollup_day)
+
+    parts = union_all(raw_parts, block_parts, rollup_parts).subquery()
+    return (
+        select(parts.c.date, (func.sum(parts.c.total) / func.sum(parts.c.samples)).label("avg_value"))
+        .group_by(parts.c.date)
+        .order_by(parts.c.date)
     )
+
+def _format_daily(results) -> list[dict]:
     data = []
     for row in results:
         data.append({
@@ -59,6 +188,12 @@ def get_analytics_daily(db: Session, sensor_id: int, days: int = 7):
         })
     return data
 
+def get_analytics_daily(db: Session, sensor_id: int, days: int = 7, now: Optional[datetime] = None):
+    start_date = day_floor((now or datetime.utcnow()) - timedelta(days=days))
+    partition_names = db.execute(_partition_names_query(start_date)).scalars().all()
+    results = db.execute(_analytics_daily_query(sensor_id, start_date, partition_names)).all()
+    return _format_daily(results)
+
 # --- ПОЛЬЗОВАТЕЛИ (ДЛЯ UI) ---
 def get_users_for_ui(db: Session) -> list[schemas.UserListDTO]:
     users = db.query(models.User).all()
@@ -75,74 +210,286 @@ def get_users_for_ui(db: Session) -> list[schemas.UserListDTO]:
     return result
 
 # --- ИСТОРИЯ ДЕЙСТВИЙ (ДЛЯ UI) ---
-def get_logs_for_ui(db: Session, limit: int = 20) -> list[schemas.ActionLogDTO]:
-    logs = (
-        db.query(models.ActionLog)
-        .options(joinedload(models.ActionLog.user))
-        .order_by(desc(models.ActionLog.timestamp))
-        .limit(limit)
-        .all()
+def _log_to_dto(log: models.ActionLog) -> schemas.ActionLogDTO:
+    time_str = log.timestamp.strftime("%H:%M:%S")
+    
+    user_name = log.user.full_name if log.user else "Unknown"
+    user_role = log.user.role if log.user else "Unknown"
+
+    return schemas.ActionLogDTO(
+        id=f"h{log.id}", 
+        user=user_name,
+        role=user_role,
+        action=log.action,
+        time=time_str
     )
 
-    result = []
-    for log in logs:
-        time_str = log.timestamp.strftime("%H:%M:%S")
-        
-        user_name = log.user.full_name if log.user else "Unknown"
-        user_role = log.user.role if log.user else "Unknown"
-
-        result.append(schemas.ActionLogDTO(
-            id=f"h{log.id}", 
-            user=user_name,
-            role=user_role,
-            action=log.action,
-            time=time_str
-        ))
-    return result
+def get_logs_for_ui(db: Session, limit: int = 20,
+                    start: Optional[datetime] = None,
+                    end: Optional[datetime] = None,
+                    after: Optional[tuple] = None) -> list[schemas.ActionLogDTO]:
+    """Действия, новые первыми; after - ключ (timestamp, id) для следующей страницы"""
+    log = models.ActionLog
+    query = pagination.time_window(select(log).options(joinedload(log.user)), log.timestamp, start, end)
+    logs = db.execute(pagination.page_query(query, (log.timestamp, log.id), after, limit)).scalars().all()
+    return [_log_to_dto(row) for row in logs]
+
+
+# --- АСИНХРОННОЕ ЧТЕНИЕ (AsyncSession) ---
+# Связи подгружаются сразу: ленивая загрузка в async-сессии невозможна.
+
+async def get_sensors_by_location_async(db: AsyncSession, location_id: int) -> list[models.Sensor]:
+    """Датчики локации вместе с типом и локацией."""
+    result = await db.execute(
+        select(models.Sensor)
+        .options(joinedload(models.Sensor.sensor_type), joinedload(models.Sensor.location))
+        .where(models.Sensor.location_id == location_id)
+    )
+    return list(result.scalars().all())
+
+async def get_last_measurements_async(db: AsyncSession, sensor_ids: list[int]) -> dict[int, models.Measurement]:
+    """Последние измерения сразу для нескольких датчиков (один запрос вместо N)."""
+    if not sensor_ids:
+        return {}
+    latest = (
+        select(
+            models.Measurement.sensor_id,
+            func.max(models.Measurement.timestamp).label("max_ts")
+        )
+        .where(models.Measurement.sensor_id.in_(sensor_ids))
+        .group_by(models.Measurement.sensor_id)
+        .subquery()
+    )
+    result = await db.execute(
+        select(models.Measurement).join(
+            latest,
+            (models.Measurement.sensor_id == latest.c.sensor_id)
+            & (models.Measurement.timestamp == latest.c.max_ts)
+        )
+    )
+    return {m.sensor_id: m for m in result.scalars().all()}
+
+# Колонки строк истории (горячая таблица, партиции и точки блоков)
+HISTORY_COLUMNS = block_store.MeasurementPoint._fields
+
+async def get_measurement_history_async(db: AsyncSession, sensor_id: Optional[int] = None,
+                                        limit: int = 100,
+                                        start: Optional[datetime] = None,
+                                        end: Optional[datetime] = None,
+                                        after: Optional[tuple] = None) -> list:
+    """
+    Измерения, новые первыми: горячая таблица, партиции интервала и сжатые блоки.
+
+    after - ключ (timestamp, id) последней строки предыдущей страницы.
+    Условие ставится в каждую ветку UNION ALL (индекс sensor_id, timestamp),
+    партиции новее курсора не читаются, а из блоков декодируются только
+    самые новые (block_store.latest_block_points). У точек блоков id
+    синтетический и отрицательный.
+    """
+    newest = after[0] + timedelta(microseconds=1) if after is not None else None
+    partition_end = min(end, newest) if end is not None and newest is not None else end or newest
+    partition_names = (await db.execute(_partition_names_query(start, partition_end))).scalars().all()
+    m = _measurements_union(_measurement_sources(partition_names), sensor_id=sensor_id,
+                            start=start, end=end, before=after)
+    raw = (await db.execute(pagination.page_query(select(m), (m.c.timestamp, m.c.id), None, limit))).all()
+    blocks = await db.run_sync(lambda session: block_store.latest_block_points(
+        session, sensor_id=sensor_id, start=start, end=end, before=after, limit=limit
+    ))
+    if not blocks:
+        return list(raw)
+    return heapq.nlargest(limit, chain(raw, blocks), key=lambda row: (row.timestamp, row.id))
+
+async def get_analytics_daily_async(db: AsyncSession, sensor_id: int, days: int = 7):
+    start_date = day_floor(datetime.utcnow() - timedelta(days=days))
+    partition_names = (await db.execute(_partition_names_query(start_date))).scalars().all()
+    result = await db.execute(_analytics_daily_query(sensor_id, start_date, partition_names))
+    return _format_daily(result.all())
+
+async def get_logs_page_async(db: AsyncSession, limit: int = 20,
+                              start: Optional[datetime] = None,
+                              end: Optional[datetime] = None,
+                              after: Optional[tuple] = None) -> tuple[list[schemas.ActionLogDTO], Optional[str]]:
+    """
+    Страница действий, новые первыми.
+
+    Returns:
+        (DTO страницы, курсор следующей страницы по (timestamp, id) или None)
+    """
+    log = models.ActionLog
+    query = pagination.time_window(select(log).options(joinedload(log.user)), log.timestamp, start, end)
+    result = await db.execute(pagination.page_query(query, (log.timestamp, log.id), after, limit + 1))
+    logs, next_cursor = pagination.split_page(list(result.scalars().all()), limit, lambda row: (row.timestamp, row.id))
+    return [_log_to_dto(row) for row in logs], next_cursor
+
+async def get_active_notifications_async(db: AsyncSession) -> list[models.Notification]:
+    """Невыполненные уведомления."""
+    result = await db.execute(
+        select(models.Notification).where(models.Notification.is_completed == False)
+    )
+    return list(result.scalars().all())
 
 
 # --- ФУНКЦИЯ ДЛЯ ГЕНЕРАЦИИ ОТЧЕТА ---
 
+def _iter_raw_sensor_arrays(db: Session, start_time: datetime, end_time: datetime,
+                            chunk_size: int = 50000) -> Iterator[tuple]:
+    """
+    Сырые измерения периода одним запросом, упорядоченные по (sensor_id, timestamp):
+    (sensor_id, timestamps int64 мкс, values float64) на датчик. Строки идут
+    пачками серверного курсора, в памяти - ряд одного датчика.
+    """
+    dialect_name = db.get_bind().dialect.name
+    partition_names = db.execute(_partition_names_query(start_time, end_time)).scalars().all()
+    m = _measurements_union(_measurement_sources(partition_names), start=start_time, end=end_time)
+    query = select(m.c.sensor_id, _epoch_us_column(m.c.timestamp, dialect_name), m.c.value)\
+        .order_by(m.c.sensor_id, m.c.timestamp)
+    result = db.execute(query.execution_options(stream_results=True, yield_per=chunk_size))
+    try:
+        current, ts_parts, value_parts = None, [], []
+        for rows in result.partitions():
+            sensor_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+            ts = _epoch_us_array([row[1] for row in rows], dialect_name)
+            values = np.fromiter((row[2] for row in rows), dtype=np.float64, count=len(rows))
+            # Границы датчиков внутри пачки
+            bounds = np.flatnonzero(np.diff(sensor_ids)) + 1
+            for lo, hi in zip(np.r_[0, bounds], np.r_[bounds, len(rows)]):
+                sensor_id = int(sensor_ids[lo])
+                if ts_parts and sensor_id != current:
+                    yield current, np.concatenate(ts_parts), np.concatenate(value_parts)
+                    ts_parts, value_parts = [], []
+                current = sensor_id
+                ts_parts.append(ts[lo:hi])
+                value_parts.append(values[lo:hi])
+        if ts_parts:
+            yield current, np.concatenate(ts_parts), np.concatenate(value_parts)
+    finally:
+        result.close()
+
+def _iter_sensor_series(db: Session, start_time: datetime, end_time: datetime) -> Iterator[tuple]:
+    """Ряды датчиков за период: сырые строки и сжатые блоки, слитые по sensor_id"""
+    merged = heapq.merge(
+        block_store.iter_sensor_arrays(db, start_time, end_time),
+        _iter_raw_sensor_arrays(db, start_time, end_time),
+        key=lambda item: item[0]
+    )
+    for sensor_id, parts in groupby(merged, key=lambda item: item[0]):
+        parts = list(parts)
+        ts = np.concatenate([p[1] for p in parts])
+        values = np.concatenate([p[2] for p in parts])
+        if len(parts) > 1 and np.any(np.diff(ts) < 0):
+            order = np.argsort(ts, kind="stable")
+            ts, values = ts[order], values[order]
+        if len(ts):
+            yield sensor_id, ts, values
+
+def _report_rollups_query(start_time: datetime, end_time: datetime):
+    """count/sum/min/max почасовых агрегатов периода по датчикам"""
+    r = models.MeasurementRollup
+    return select(
+        r.sensor_id,
+        func.sum(r.sample_count),
+        func.sum(r.value_sum),
+        func.min(r.value_min),
+        func.max(r.value_max)
+    ).where(
+        r.bucket_start >= start_time,
+        r.bucket_start < end_time
+    ).group_by(r.sensor_id)
+
+def _report_event_counts(db: Session, start_time: datetime, end_time: datetime):
+    """Число аномалий и рекомендаций за период по датчикам (два сгруппированных запроса)"""
+    a = models.AnomalyAnalysis
+    anomalies = dict(db.execute(
+        select(a.sensor_id, func.count()).where(
+            a.created_at >= start_time,
+            a.created_at < end_time,
+            (a.transformer_is_anomaly == True) | (a.classical_is_anomaly == True)  # noqa: E712
+        ).group_by(a.sensor_id)
+    ).all())
+    rec = models.IntelligentRecommendation
+    recommendations = dict(db.execute(
+        select(rec.sensor_id, func.count()).where(
+            rec.created_at >= start_time,
+            rec.created_at < end_time
+        ).group_by(rec.sensor_id)
+    ).all())
+    return anomalies, recommendations
+
+def iter_report_rows(db: Session, start_time: datetime, end_time: datetime) -> Iterator[dict]:
+    """
+    Строки отчета за период, по датчику, в порядке (локация, датчик).
+
+    История периода читается одним проходом (сырые строки из партиций
+    периода + декодированные блоки), агрегаты каждого ряда считаются
+    векторно (report_stats.series_stats): среднее, мин/макс, СКО,
+    p5/p50/p95, минуты вне нормы датчика (comfort_ranges: снимок норм
+    компилируется из сессии отчёта). Почасовые агрегаты
+    прореженной истории входят в среднее, минимум и максимум.
+    В памяти - ряд одного датчика и сводки по датчикам.
+    """
+    sensors = {
+        row.id: row for row in db.execute(
+            select(
+                models.Sensor.id,
+                models.Sensor.name.label("sensor_name"),
+                models.Location.name.label("location_name"),
+                models.SensorType.name.label("sensor_type")
+            ).join(
+                models.Location, models.Location.id == models.Sensor.location_id
+            ).join(
+                models.SensorType, models.SensorType.id == models.Sensor.sensor_type_id
+            )
+        )
+    }
+
+    ranges = ComfortRangeTable.compile(db)
+    summaries = {}
+    for sensor_id, ts, values in _iter_sensor_series(db, start_time, end_time):
+        if sensor_id in sensors:
+            summaries[sensor_id] = report_stats.series_stats(ts, values, ranges.bounds(sensor_id))
+
+    for sensor_id, count, total, low, high in db.execute(_report_rollups_query(start_time, end_time)):
+        if sensor_id not in sensors:
+            continue
+        summary = summaries.setdefault(sensor_id, {
+            'count': 0, 'sum': 0.0, 'min': low, 'max': high, 'std': None,
+            'p5': None, 'p50': None, 'p95': None, 'minutes_out_of_range': None
+        })
+        summary['count'] += count
+        summary['sum'] += total
+        summary['min'] = min(summary['min'], low)
+        summary['max'] = max(summary['max'], high)
+
+    anomalies, recommendations = _report_event_counts(db, start_time, end_time)
+
+    def rounded(value, digits=2):
+        return None if value is None else round(value, digits)
+
+    order = sorted(summaries, key=lambda sid: (sensors[sid].location_name, sensors[sid].sensor_name, sid))
+    for sensor_id in order:
+        sensor, summary = sensors[sensor_id], summaries[sensor_id]
+        yield {
+            "location": sensor.location_name,
+            "sensor": sensor.sensor_name,
+            "type": sensor.sensor_type,
+            "avg": round(summary['sum'] / summary['count'], 2),
+            "min": round(summary['min'], 2),
+            "max": round(summary['max'], 2),
+            "std": rounded(summary['std']),
+            "p5": rounded(summary['p5']),
+            "p50": rounded(summary['p50']),
+            "p95": rounded(summary['p95']),
+            "minutes_out_of_range": rounded(summary['minutes_out_of_range'], 1),
+            "anomalies": anomalies.get(sensor_id, 0),
+            "recommendations": recommendations.get(sensor_id, 0),
+        }
+
 def calculate_report_data(db: Session, start_time: datetime, end_time: datetime):
     """
     Рассчитывает агрегированные данные для отчета по всем датчикам за период.
     Возвращает список словарей с агрегатами.
     """
-    
-    stats = db.query(
-        models.Location.name.label("location_name"),
-        models.Sensor.name.label("sensor_name"),
-        models.SensorType.name.label("sensor_type"),
-        func.avg(models.Measurement.value).label("avg_value"),
-        func.min(models.Measurement.value).label("min_value"),
-        func.max(models.Measurement.value).label("max_value")
-    ).join(
-        models.Measurement, models.Measurement.sensor_id == models.Sensor.id
-    ).join(
-        models.Location, models.Location.id == models.Sensor.location_id
-    ).join(
-        models.SensorType, models.SensorType.id == models.Sensor.sensor_type_id
-    ).filter(
-        models.Measurement.timestamp >= start_time,
-        models.Measurement.timestamp < end_time
-    ).group_by(
-        models.Location.name,
-        models.Sensor.name,
-        models.SensorType.name
-    ).all()
-    
-    report_data = []
-    for row in stats:
-        report_data.append({
-            "location": row.location_name,
-            "sensor": row.sensor_name,
-            "type": row.sensor_type,
-            "avg": round(row.avg_value, 2),
-            "min": round(row.min_value, 2),
-            "max": round(row.max_value, 2),
-        })
-        
-    return report_data
+    return list(iter_report_rows(db, start_time, end_time))
 
 def save_report_locally(file_path: str, content: str):
     """
@@ -190,11 +537,107 @@ def execute_voice_command(db: Session, command_id: int,
     return command
 
 
+# --- ИЗМЕРЕНИЯ: ПАКЕТНАЯ ЗАПИСЬ И ПОТОКОВОЕ ЧТЕНИЕ ---
+MEASUREMENT_FIELDS = ("sensor_id", "location_id", "value", "timestamp")
+
+def _copy_measurements(db: Session, rows: list[dict]):
+    """COPY FROM STDIN (PostgreSQL): один поток CSV вместо INSERT на строку"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row["sensor_id"], row["location_id"], repr(float(row["value"])),
+                         row["timestamp"].isoformat(sep=" ")])
+    buffer.seek(0)
+
+    sql = (f"COPY {models.Measurement.__tablename__} ({', '.join(MEASUREMENT_FIELDS)}) "
+           "FROM STDIN WITH (FORMAT csv)")
+    cursor = db.connection().connection.cursor()
+    try:
+        if hasattr(cursor, "copy_expert"):
+            cursor.copy_expert(sql, buffer)   # psycopg2
+        else:
+            with cursor.copy(sql) as copy:    # psycopg 3
+                copy.write(buffer.getvalue())
+    finally:
+        cursor.close()
+
+def bulk_insert_measurements(db: Session, rows: list[dict]) -> int:
+    """
+    Записывает пачку измерений одной транзакцией.
+
+    На PostgreSQL используется COPY, на остальных СУБД -
+    executemany INSERT.
+
+    Args:
+        db: Сессия БД
+        rows: Словари с полями MEASUREMENT_FIELDS (timestamp по умолчанию - сейчас)
+
+    Returns:
+        Количество записанных измерений
+    """
+    if not rows:
+        return 0
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            "sensor_id": row["sensor_id"],
+            "location_id": row.get("location_id"),
+            "value": row["value"],
+            "timestamp": row.get("timestamp") or now,
+        }
+        for row in rows
+    ]
+
+    dialect = db.get_bind().dialect
+    if dialect.name == "postgresql" and dialect.driver in ("psycopg2", "psycopg"):
+        _copy_measurements(db, rows)
+    else:
+        db.execute(insert(models.Measurement), rows)
+    db.commit()
+    return len(rows)
+
+def iter_measurements(db: Session,
+                      sensor_id: Optional[int] = None,
+                      location_id: Optional[int] = None,
+                      start: Optional[datetime] = None,
+                      end: Optional[datetime] = None,
+                      chunk_size: int = 5000) -> Iterator:
+    """
+    Потоково читает историю измерений в порядке времени.
+
+    Строки приходят пачками по chunk_size через серверный курсор
+    (stream_results: именованный курсор в psycopg2), поэтому память не
+    зависит от длины истории. Читаются только партиции интервала, а
+    сжатые блоки декодируются по суткам и сливаются по времени.
+    Возвращаются кортежи (id, sensor_id, location_id, value, timestamp)
+    без ORM-объектов; у точек из блоков id = None.
+    """
+    m = _measurements_union(
+        measurement_sources(db, start, end),
+        sensor_id=sensor_id, location_id=location_id, start=start, end=end
+    )
+    query = select(m).order_by(m.c.timestamp, m.c.id)
+
+    blocks = block_store.iter_block_points(db, sensor_id, location_id, start, end)
+    blocks_first = next(blocks, None)
+
+    result = db.execute(query.execution_options(stream_results=True, yield_per=chunk_size))
+    try:
+        raw = (row for partition in result.partitions() for row in partition)
+        if blocks_first is None:
+            yield from raw
+        else:
+            yield from heapq.merge(chain([blocks_first], blocks), raw, key=lambda row: row.timestamp)
+    finally:
+        result.close()
+
+
 # -------------------------------------------------------------------
 # 🔬 DIPLOMA CRITERIA CRUD FUNCTIONS
 # -------------------------------------------------------------------
 
-def get_sensor_measurements(db: Session, sensor_id: int, days: int = 7) -> list[models.Measurement]:
+def get_sensor_measurements(db: Session, sensor_id: int, days: int = 7) -> list:
     """
     Получает все измерения датчика за последние N дней.
     Используется для анализа аномалий и генерации рекомендаций.
@@ -205,19 +648,50 @@ def get_sensor_measurements(db: Session, sensor_id: int, days: int = 7) -> list[
         days: Глубина анализа в днях
     
     Returns:
-        Список измерений отсортированных по времени
+        Список измерений (id, sensor_id, location_id, value, timestamp),
+        отсортированных по времени
     """
     start_date = datetime.utcnow() - timedelta(days=days)
-    measurements = (
-        db.query(models.Measurement)
-        .filter(
-            models.Measurement.sensor_id == sensor_id,
-            models.Measurement.timestamp >= start_date
-        )
-        .order_by(models.Measurement.timestamp.asc())
-        .all()
-    )
-    return measurements
+    return list(iter_measurements(db, sensor_id=sensor_id, start=start_date))
+
+def _epoch_us_column(column, dialect_name: str):
+    """timestamp в виде, который NumPy переводит в int64 без datetime-объектов"""
+    if dialect_name == "postgresql":
+        return cast(func.extract("epoch", column) * 1000000, BigInteger)
+    if dialect_name == "sqlite":
+        return type_coerce(column, String)   # ISO-строка "YYYY-MM-DD HH:MM:SS.ffffff"
+    return column
+
+def _epoch_us_array(raw: list, dialect_name: str) -> np.ndarray:
+    if dialect_name == "postgresql":
+        return np.array(raw, dtype=np.int64)
+    return np.array(raw, dtype="datetime64[us]").astype(np.int64)
+
+def get_sensor_series(db: Session, sensor_id: int,
+                      start: Optional[datetime] = None,
+                      end: Optional[datetime] = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    История датчика за [start, end) в виде NumPy-массивов для детекторов и графиков.
+    Сырые строки читаются Core select (только timestamp и value, без ORM),
+    сжатые блоки декодируются block_store.read_blocks.
+
+    Returns:
+        (timestamps int64 мкс эпохи, values float64), по возрастанию времени
+    """
+    dialect_name = db.get_bind().dialect.name
+    m = _measurements_union(measurement_sources(db, start, end), sensor_id=sensor_id, start=start, end=end)
+    rows = db.execute(select(_epoch_us_column(m.c.timestamp, dialect_name), m.c.value).order_by(m.c.timestamp)).all()
+    ts = _epoch_us_array([row[0] for row in rows], dialect_name)
+    values = np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows))
+
+    block_ts, block_values = block_store.read_blocks(db, sensor_id, start, end)
+    if len(block_ts):
+        ts = np.concatenate([block_ts, ts])
+        values = np.concatenate([block_values, values])
+        if np.any(np.diff(ts) < 0):
+            order = np.argsort(ts, kind="stable")
+            ts, values = ts[order], values[order]
+    return ts, values
 
 
 def create_anomaly_analysis(db: Session, 
@@ -271,26 +745,34 @@ def create_anomaly_analysis(db: Session,
 
 def get_anomaly_analyses(db: Session, 
                         location_id: int = None,
-                        limit: int = 50) -> list[models.AnomalyAnalysis]:
+                        limit: int = 50,
+                        start: Optional[datetime] = None,
+                        end: Optional[datetime] = None,
+                        after: Optional[tuple] = None) -> list:
     """
     Получает результаты анализа аномалий (DIPLOMA CRITERION 2&3).
+    Core-запрос: строки только с полями schemas.AnomalyAnalysisRead, без ORM-объектов.
     
     Args:
         db: Сессия БД
         location_id: Фильтр по локации (опционально)
         limit: Максимум результатов
+        start, end: Интервал created_at [start, end) (опционально)
+        after: Ключ (created_at, id) последней строки предыдущей страницы
     
     Returns:
-        Список анализов отсортированных по времени (новые первыми)
+        Список строк анализов отсортированных по времени (новые первыми)
     """
-    query = db.query(models.AnomalyAnalysis)
+    analysis = models.AnomalyAnalysis
+    columns = fast_json.schema_columns(analysis, schemas.AnomalyAnalysisRead)
+    query = pagination.time_window(select(*columns), analysis.created_at, start, end)
     
     if location_id:
-        query = query.filter(models.AnomalyAnalysis.location_id == location_id)
+        query = query.where(analysis.location_id == location_id)
     
-    # Сортировка по полю created_at
-    analyses = query.order_by(models.AnomalyAnalysis.created_at.desc()).limit(limit).all()
-    return analyses
+    # Сортировка по (created_at, id): одинаковое время не ломает страницы
+    query = pagination.page_query(query, (analysis.created_at, analysis.id), after, limit)
+    return list(db.execute(query).all())
 
 
 def create_intelligent_recommendation(db: Session,
@@ -343,6 +825,150 @@ def create_intelligent_recommendation(db: Session,
     return recommendation
 
 
+# Поля рекомендации, которые принимает пакетная запись
+RECOMMENDATION_FIELDS = (
+    'sensor_id', 'location_id', 'problem_description', 'recommended_action', 'target_value',
+    'reasoning', 'confidence', 'severity', 'priority', 'anomaly_analysis_id'
+)
+# Обновляются у уже открытой рекомендации при повторном обнаружении
+RECOMMENDATION_REFRESH_FIELDS = (
+    'problem_description', 'reasoning', 'confidence', 'severity', 'priority', 'anomaly_analysis_id'
+)
+
+
+# Цели в пределах допуска - одна и та же рекомендация: без нормы датчика цель
+# считается от скользящего среднего и немного сдвигается при каждом анализе
+RECOMMENDATION_TARGET_TOLERANCE = float(os.environ.get("RECOMMENDATION_TARGET_TOLERANCE", 0.02))
+
+
+def recommendation_key(sensor_id: int, recommended_action: str) -> tuple:
+    """Ключ дедупликации рекомендаций: (датчик, действие); цели сравниваются с допуском"""
+    return sensor_id, recommended_action
+
+
+def same_target(a: Optional[float], b: Optional[float], tolerance: float = RECOMMENDATION_TARGET_TOLERANCE) -> bool:
+    """Цели совпадают с относительным допуском tolerance (None совпадает только с None)"""
+    if a is None or b is None:
+        return a is None and b is None
+    return math.isclose(a, b, rel_tol=tolerance, abs_tol=1e-3)
+
+
+def _recommendation_notification(recommendation: models.IntelligentRecommendation) -> models.Notification:
+    return models.Notification(
+        title=f"Рекомендация: {recommendation.recommended_action}",
+        description=recommendation.problem_description,
+        location_id=recommendation.location_id,
+        sensor_id=recommendation.sensor_id,
+        required_target_value=recommendation.target_value
+    )
+
+
+def save_recommendations(db: Session, recommendations: list[dict]) -> list[tuple[int, bool]]:
+    """
+    Пакетная запись рекомендаций с дедупликацией (одна транзакция).
+
+    Пока у датчика есть невыполненная рекомендация с тем же действием и
+    целью в пределах RECOMMENDATION_TARGET_TOLERANCE, новая не создаётся:
+    у существующей обновляются оценка, описание и ссылка на анализ (цель
+    остаётся прежней - по ней идёт проверка выполнения). Каждой новой рекомендации в той же транзакции
+    создаётся уведомление (notification_id).
+
+    Args:
+        db: Сессия БД
+        recommendations: Словари с полями RECOMMENDATION_FIELDS
+
+    Returns:
+        [(id рекомендации, True если создана)] в порядке входного списка
+    """
+    if not recommendations:
+        return []
+    rec = models.IntelligentRecommendation
+    keys = [recommendation_key(r['sensor_id'], r['recommended_action']) for r in recommendations]
+
+    # Открытые рекомендации тех же датчиков - одним запросом; при старых дублях первой проверяется последняя
+    open_by_key = {}
+    existing = db.query(rec).filter(
+        rec.sensor_id.in_({key[0] for key in keys}),
+        rec.is_implemented.isnot(True)
+    ).order_by(rec.created_at.desc(), rec.id.desc()).all()
+    for recommendation in existing:
+        open_by_key.setdefault(recommendation_key(recommendation.sensor_id, recommendation.recommended_action),
+                               []).append(recommendation)
+
+    now = datetime.utcnow()
+    created = []
+    saved = []
+    for key, data in zip(keys, recommendations):
+        fields = {field: data.get(field) for field in RECOMMENDATION_FIELDS}
+        candidates = open_by_key.setdefault(key, [])
+        recommendation = next((r for r in candidates if same_target(r.target_value, fields['target_value'])), None)
+        if recommendation is None:
+            # Незаданные поля - значения по умолчанию модели (priority NOT NULL)
+            recommendation = rec(**{field: value for field, value in fields.items() if value is not None}, created_at=now)
+            candidates.insert(0, recommendation)
+            db.add(recommendation)
+            created.append(True)
+        else:
+            created.append(False)
+            for field in RECOMMENDATION_REFRESH_FIELDS:
+                if fields[field] is not None:
+                    setattr(recommendation, field, fields[field])
+        if recommendation.notification_id is None and recommendation.notification is None:
+            recommendation.notification = _recommendation_notification(recommendation)
+        saved.append(recommendation)
+
+    # INSERT уведомлений и рекомендаций пачками при flush; id читаются до commit (после него объекты истекают)
+    db.flush()
+    ids = [recommendation.id for recommendation in saved]
+    db.commit()
+    return list(zip(ids, created))
+
+
+def get_open_recommendation_targets(db: Session) -> list:
+    """(id, sensor_id, target_value, created_at) невыполненных рекомендаций с целевым значением"""
+    rec = models.IntelligentRecommendation
+    return db.execute(
+        select(rec.id, rec.sensor_id, rec.target_value, rec.created_at).where(
+            rec.is_implemented.isnot(True),
+            rec.target_value.isnot(None)
+        )
+    ).all()
+
+
+def complete_recommendations(db: Session, completions: list[tuple[int, datetime]]) -> int:
+    """
+    Отмечает рекомендации выполненными и закрывает их уведомления (одна транзакция).
+
+    Args:
+        db: Сессия БД
+        completions: [(id рекомендации, время достижения цели)]
+
+    Returns:
+        Сколько рекомендаций отмечено (уже выполненные не трогаются)
+    """
+    if not completions:
+        return 0
+    rec = models.IntelligentRecommendation.__table__
+    open_ids = set(db.execute(
+        select(rec.c.id).where(rec.c.id.in_([rec_id for rec_id, _ in completions]), rec.c.is_implemented.isnot(True))
+    ).scalars())
+    if not open_ids:
+        return 0
+    db.execute(
+        update(rec)
+        .where(rec.c.id == bindparam('recommendation_id'))
+        .values(is_implemented=True, implemented_at=bindparam('implemented_at')),
+        [{'recommendation_id': rec_id, 'implemented_at': at} for rec_id, at in completions if rec_id in open_ids]
+    )
+    db.execute(
+        update(models.Notification.__table__)
+        .where(models.Notification.id.in_(select(rec.c.notification_id).where(rec.c.id.in_(open_ids))))
+        .values(is_completed=True)
+    )
+    db.commit()
+    return len(open_ids)
+
+
 def get_intelligent_recommendations(db: Session,
                                    location_id: int = None,
                                    sensor_id: int = None,
@@ -374,14 +1000,78 @@ def get_intelligent_recommendations(db: Session,
     
     return recommendations
 
+# Ключ сортировки списка рекомендаций (по убыванию) и типы его частей в курсоре
+RECOMMENDATION_PAGE_KEY = (
+    models.IntelligentRecommendation.priority,
+    models.IntelligentRecommendation.created_at,
+    models.IntelligentRecommendation.id
+)
+RECOMMENDATION_CURSOR_TYPES = (int, datetime, int)
+
+def get_recommendations_page(db: Session,
+                             location_id: Optional[int] = None,
+                             after: Optional[tuple] = None,
+                             limit: int = 50) -> tuple[list[tuple], Optional[str]]:
+    """
+    Страница рекомендаций с именами датчика, типа и локации - один запрос.
+
+    Args:
+        after: Ключ (priority, created_at, id) последней строки предыдущей страницы
+        limit: Размер страницы
+
+    Returns:
+        ([(рекомендация, sensor_name, sensor_type, location_name)], курсор следующей страницы или None)
+    """
+    rec = models.IntelligentRecommendation
+    query = select(
+        rec, models.Sensor.name, models.SensorType.name, models.Location.name
+    ).outerjoin(
+        models.Sensor, models.Sensor.id == rec.sensor_id
+    ).outerjoin(
+        models.SensorType, models.SensorType.id == models.Sensor.sensor_type_id
+    ).outerjoin(
+        models.Location, models.Location.id == rec.location_id
+    )
+    if location_id:
+        query = query.where(rec.location_id == location_id)
+
+    rows = db.execute(pagination.page_query(query, RECOMMENDATION_PAGE_KEY, after, limit + 1)).all()
+    return pagination.split_page(rows, limit, lambda row: (row[0].priority, row[0].created_at, row[0].id))
+
+
+# Поля голосовой команды, которые принимает пакетная запись
+VOICE_COMMAND_FIELDS = (
+    'notification_id', 'user_id', 'transcript', 'detected_language', 'speech_confidence',
+    'command', 'command_confidence', 'execution_status', 'executed_at', 'created_at'
+)
+
+
+def _voice_command_row(event: dict) -> dict:
+    """Приводит событие голосовой команды к строке таблицы voice_notification_commands."""
+    now = datetime.utcnow()
+    row = {field: event.get(field) for field in VOICE_COMMAND_FIELDS}
+    row['detected_language'] = row['detected_language'] or 'en'
+    row['execution_status'] = row['execution_status'] or 'received'
+    row['created_at'] = row['created_at'] or now
+    # Команда, выполненная сразу при приёме, получает время выполнения
+    if row['executed_at'] is None and row['execution_status'] in ('success', 'failed'):
+        row['executed_at'] = row['created_at']
+    return row
+
 
 def create_voice_notification_command(db: Session,
                                       notification_id: int,
                                       transcript: str,
                                       command: str,
-                                      execution_status: str = 'received') -> models.VoiceNotificationCommand:
+                                      execution_status: str = 'received',
+                                      speech_confidence: Optional[float] = None,
+                                      command_confidence: Optional[float] = None,
+                                      detected_language: str = 'en',
+                                      user_id: Optional[int] = None,
+                                      complete_notification: bool = False) -> models.VoiceNotificationCommand:
     """
     Сохраняет голосовую команду для управления уведомлением (DIPLOMA CRITERION 4).
+    Закрытие уведомления и запись команды выполняются в одной транзакции.
     
     Args:
         db: Сессия БД
@@ -389,26 +1079,71 @@ def create_voice_notification_command(db: Session,
         transcript: Распознанный текст
         command: Тип команды (confirm, reject, modify, request_info, request_report, unknown)
         execution_status: Статус выполнения команды
+        speech_confidence: Уверенность распознавания речи (0-1)
+        command_confidence: Уверенность парсера команды (0-1)
+        detected_language: Язык команды ('ru' или 'en')
+        user_id: ID пользователя (опционально)
+        complete_notification: Отметить уведомление выполненным
     
     Returns:
         Созданный объект VoiceNotificationCommand
     """
-    voice_cmd = models.VoiceNotificationCommand(
-        notification_id=notification_id,
-        transcript=transcript,
-        command=command,
-        execution_status=execution_status,
-        # execution_timestamp=datetime.utcnow() - Этого поля нет в models.VoiceNotificationCommand, используем created_at
-    )
+    voice_cmd = models.VoiceNotificationCommand(**_voice_command_row({
+        'notification_id': notification_id,
+        'user_id': user_id,
+        'transcript': transcript,
+        'detected_language': detected_language,
+        'speech_confidence': speech_confidence,
+        'command': command,
+        'command_confidence': command_confidence,
+        'execution_status': execution_status,
+    }))
     db.add(voice_cmd)
+    
+    if complete_notification:
+        db.query(models.Notification)\
+            .filter(models.Notification.id == notification_id)\
+            .update({models.Notification.is_completed: True})
+    
     db.commit()
     db.refresh(voice_cmd)
     return voice_cmd
 
 
+def bulk_create_voice_notification_commands(db: Session, events: list[dict]) -> int:
+    """
+    Пакетно сохраняет голосовые команды одним INSERT (executemany) и
+    закрывает уведомления подтверждённых команд в той же транзакции.
+    
+    Args:
+        db: Сессия БД
+        events: Список событий с полями VOICE_COMMAND_FIELDS и
+                необязательным флагом complete_notification
+    
+    Returns:
+        Количество сохранённых команд
+    """
+    if not events:
+        return 0
+    
+    db.execute(insert(models.VoiceNotificationCommand), [_voice_command_row(e) for e in events])
+    
+    completed_ids = {e['notification_id'] for e in events if e.get('complete_notification')}
+    if completed_ids:
+        db.query(models.Notification)\
+            .filter(models.Notification.id.in_(completed_ids))\
+            .update({models.Notification.is_completed: True}, synchronize_session=False)
+    
+    db.commit()
+    return len(events)
+
+
 def get_voice_notification_commands(db: Session,
                                     notification_id: int = None,
-                                    limit: int = 50) -> list[models.VoiceNotificationCommand]:
+                                    limit: int = 50,
+                                    start: Optional[datetime] = None,
+                                    end: Optional[datetime] = None,
+                                    after: Optional[tuple] = None) -> list[models.VoiceNotificationCommand]:
     """
     Получает голосовые команды для уведомлений (DIPLOMA CRITERION 4).
     
@@ -416,15 +1151,18 @@ def get_voice_notification_commands(db: Session,
         db: Сессия БД
         notification_id: Фильтр по уведомлению (опционально)
         limit: Максимум результатов
+        start, end: Интервал created_at [start, end) (опционально)
+        after: Ключ (created_at, id) последней строки предыдущей страницы
     
     Returns:
         Список команд отсортированных по времени (новые первыми)
     """
-    query = db.query(models.VoiceNotificationCommand)
+    command = models.VoiceNotificationCommand
+    query = pagination.time_window(select(command), command.created_at, start, end)
     
     if notification_id:
-        query = query.filter(models.VoiceNotificationCommand.notification_id == notification_id)
+        query = query.where(command.notification_id == notification_id)
     
-    # Сортировка по полю created_at
-    commands = query.order_by(models.VoiceNotificationCommand.created_at.desc()).limit(limit).all()
-    return commands
\ No newline at end of file
+    # Сортировка по (created_at, id): одинаковое время не ломает страницы
+    query = pagination.page_query(query, (command.created_at, command.id), after, limit)
+    return list(db.execute(query).scalars().all())
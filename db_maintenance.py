@@ -0,0 +1,100 @@
+"""
+Периодическое обслуживание SQLite.
+
+В режиме WAL изменения копятся в файле -wal, пока не выполнен checkpoint.
+Автоматический checkpoint SQLite срабатывает только когда нет читателей,
+поэтому под постоянной нагрузкой -wal растёт, а чтения становятся медленнее.
+Фоновый поток раз в interval секунд:
+- переносит WAL в основной файл и обрезает его (wal_checkpoint(TRUNCATE))
+- обновляет статистику планировщика запросов (PRAGMA optimize)
+"""
+
+import threading
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import text
+
+from database import engine
+
+
+class SQLiteMaintenance:
+    """Фоновый поток WAL checkpoint + PRAGMA optimize"""
+
+    def __init__(self, db_engine=engine, interval: float = 300.0):
+        """
+        Args:
+            db_engine: Движок SQLAlchemy (SQLite)
+            interval: Период обслуживания (секунды)
+        """
+        self.engine = db_engine
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.runs = 0
+        self.failed = 0
+        self.last_checkpoint: Optional[Dict] = None
+        self.last_duration_ms = 0.0
+
+    def start(self):
+        """Запускает поток обслуживания (только для SQLite)"""
+        if self.engine.dialect.name != "sqlite":
+            return
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sqlite-maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Останавливает поток и выполняет финальный checkpoint"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+            self.run_once()
+
+    def run_once(self) -> Optional[Dict]:
+        """
+        Выполняет checkpoint и optimize.
+
+        Returns:
+            {'busy': int, 'log_frames': int, 'checkpointed_frames': int}
+            или None при ошибке
+        """
+        started = time.perf_counter()
+        try:
+            with self.engine.connect() as conn:
+                busy, log_frames, checkpointed = conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)")).one()
+                conn.execute(text("PRAGMA optimize"))
+        except Exception as e:
+            self.failed += 1
+            print(f"❌ ERROR: SQLite maintenance failed: {e}")
+            return None
+
+        self.runs += 1
+        self.last_duration_ms = (time.perf_counter() - started) * 1000
+        self.last_checkpoint = {
+            'busy': busy,
+            'log_frames': log_frames,
+            'checkpointed_frames': checkpointed
+        }
+        return self.last_checkpoint
+
+    def stats(self) -> Dict:
+        """Счётчики обслуживания"""
+        return {
+            'runs': self.runs,
+            'failed': self.failed,
+            'last_checkpoint': self.last_checkpoint,
+            'last_duration_ms': round(self.last_duration_ms, 2)
+        }
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+
+# Глобальный обслуживающий поток для использования в приложении
+sqlite_maintenance = SQLiteMaintenance()
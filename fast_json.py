@@ -0,0 +1,84 @@
+"""
+Быстрая сериализация списков API без Pydantic на каждую строку.
+
+С response_model=List[...] FastAPI для каждой строки ответа создаёт
+модель Pydantic (from_attributes), проверяет поля и затем снова
+превращает её в dict для json.dumps - на страницах истории и анализов
+это основная часть времени ответа. Для данных, которые приложение само
+читает из БД, проверка не нужна:
+- Core-запрос выбирает ровно поля схемы (schema_columns)
+- строки превращаются в dict по позиции колонок (rows_to_dicts),
+  уже загруженные ORM-объекты - по атрибутам (objects_to_dicts)
+- FastJSONResponse сериализует их orjson (или json, если orjson нет)
+
+response_model остаётся в декораторе для документации OpenAPI, а
+возвращённый Response FastAPI отдаёт как есть.
+"""
+
+import json
+from datetime import date, datetime
+from operator import attrgetter
+from typing import Any, Iterable, List, Optional, Sequence
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    print("[WARNING] orjson not installed. Fast JSON responses will use json")
+    print("   Install with: pip install orjson")
+
+
+def schema_fields(schema) -> List[str]:
+    """Имена полей схемы Pydantic в порядке объявления"""
+    return list(schema.model_fields)
+
+
+def schema_columns(model, schema) -> list:
+    """Колонки ORM-модели с именами полей схемы - для select(...) без загрузки объектов"""
+    return [getattr(model, name) for name in schema_fields(schema)]
+
+
+def rows_to_dicts(rows: Iterable, fields: Sequence[str], columns: Optional[Sequence[str]] = None) -> List[dict]:
+    """
+    Строки-кортежи (Row, namedtuple) -> dict с полями fields.
+
+    Значения берутся по позиции: доступ к атрибутам Row в разы медленнее.
+    columns - колонки строки, если они не совпадают с fields по составу
+    или порядку (лишние колонки в ответ не попадают).
+    """
+    if columns is None or list(columns) == list(fields):
+        return [dict(zip(fields, row)) for row in rows]
+    positions = [list(columns).index(name) for name in fields]
+    return [dict(zip(fields, [row[i] for i in positions])) for row in rows]
+
+
+def objects_to_dicts(objects: Iterable, fields: Sequence[str]) -> List[dict]:
+    """ORM-объекты -> dict с полями fields (без проверки Pydantic)"""
+    getter = attrgetter(*fields)
+    if len(fields) == 1:
+        return [{fields[0]: getter(obj)} for obj in objects]
+    return [dict(zip(fields, getter(obj))) for obj in objects]
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """JSON-байты: orjson или json с тем же форматом дат (ISO 8601, как у Pydantic)"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """JSON-ответ из готовых dict/list без повторной проверки"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -8,9 +8,13 @@
 - Обоснование с указанием уверенности
 """
 
-from typing import Dict, Optional, List
+import math
+import os
+from typing import Dict, Optional, List, Sequence
 from enum import Enum
 
+import numpy as np
+
 
 class SensorType(Enum):
     """Типы датчиков"""
@@ -19,6 +23,14 @@ class SensorType(Enum):
     PRESSURE = "Pressure"
 
 
+def _lookup_table(table: Dict, rows: Sequence[str], columns: Sequence[str], value) -> np.ndarray:
+    """Вложенный словарь {помещение: {датчик: ...}} -> массив [помещение, датчик] (NaN - нормы нет)"""
+    return np.array([
+        [value(table[row][column]) if column in table[row] else np.nan for column in columns]
+        for row in rows
+    ], dtype=np.float64)
+
+
 class RecommendationGenerator:
     """
     Генерирует интеллектуальные рекомендации на основе аномалий.
@@ -72,6 +84,37 @@ class RecommendationGenerator:
         }
     }
     
+    # Текст рекомендации при выходе за диапазон: (тип, выше нормы) -> (проблема, действие)
+    VIOLATION_TEXT = {
+        ('temperature', True): ("Temperature is too HIGH ({value:.1f}°C, max: {limit:g}°C)",
+                                "Increase cooling/AC power or improve ventilation"),
+        ('temperature', False): ("Temperature is too LOW ({value:.1f}°C, min: {limit:g}°C)",
+                                 "Increase heating power or close air intakes"),
+        ('humidity', True): ("Humidity is too HIGH ({value:.1f}%, max: {limit:g}%)",
+                             "Increase dehumidification or improve ventilation"),
+        ('humidity', False): ("Humidity is too LOW ({value:.1f}%, min: {limit:g}%)",
+                              "Add humidifiers or reduce ventilation"),
+        ('pressure', True): ("Pressure is too HIGH ({value:.1f} hPa, max: {limit:g} hPa)",
+                             "Reduce supply air or check exhaust ventilation"),
+        ('pressure', False): ("Pressure is too LOW ({value:.1f} hPa, min: {limit:g} hPa)",
+                              "Increase supply air or check door and window seals"),
+    }
+
+    # Коды для векторного режима: индексы строк/столбцов таблиц норм
+    ROOM_TYPES = tuple(NORMAL_RANGES)
+    SENSOR_KINDS = ('temperature', 'humidity', 'pressure')
+    GENERIC_KIND = -1                                   # неизвестный тип датчика
+    SEVERITIES = ('low', 'medium', 'high', 'critical')
+    PRIORITIES = np.array([1, 2, 4, 5])                 # по индексу SEVERITIES
+
+    # Допуск вокруг цели для оценки времени выхода (как у верификатора рекомендаций)
+    SETTLE_TOLERANCE = float(os.environ.get("RECOMMENDATION_VERIFY_TOLERANCE", 0.5))
+
+    # Таблицы [тип помещения, тип датчика]
+    _LOWER = _lookup_table(NORMAL_RANGES, ROOM_TYPES, SENSOR_KINDS, lambda bounds: bounds[0])
+    _UPPER = _lookup_table(NORMAL_RANGES, ROOM_TYPES, SENSOR_KINDS, lambda bounds: bounds[1])
+    _TARGET = _lookup_table(TARGET_VALUES, ROOM_TYPES, SENSOR_KINDS, lambda target: target)
+
     def __init__(self, room_type: str = 'office'):
         """
         Args:
@@ -87,7 +130,8 @@ class RecommendationGenerator:
         sensor_type: str,
         current_value: float,
         anomaly_analysis: Dict,
-        measurement_history: Optional[List[float]] = None
+        measurement_history: Optional[List[float]] = None,
+        time_constant: Optional[float] = None
     ) -> Dict:
         """
         Генерирует рекомендацию на основе аномалии.
@@ -98,6 +142,7 @@ class RecommendationGenerator:
             current_value: Текущее значение
             anomaly_analysis: Результаты анализа аномалии
             measurement_history: История измерений (опционально)
+            time_constant: Постоянная времени отклика датчика, с (response_model)
         
         Returns:
             {
@@ -115,11 +160,11 @@ class RecommendationGenerator:
         
         if 'temperature' in sensor_type_lower:
             return self._generate_temperature_recommendation(
-                sensor_name, current_value, anomaly_analysis, measurement_history
+                sensor_name, current_value, anomaly_analysis, measurement_history, time_constant
             )
         elif 'humidity' in sensor_type_lower:
             return self._generate_humidity_recommendation(
-                sensor_name, current_value, anomaly_analysis, measurement_history
+                sensor_name, current_value, anomaly_analysis, measurement_history, time_constant
             )
         else:
             return self._generate_generic_recommendation(
@@ -131,7 +176,8 @@ class RecommendationGenerator:
         sensor_name: str,
         current_value: float,
         anomaly_analysis: Dict,
-        history: Optional[List[float]]
+        history: Optional[List[float]],
+        time_constant: Optional[float] = None
     ) -> Dict:
         """Рекомендация для датчика температуры"""
         
@@ -143,8 +189,7 @@ class RecommendationGenerator:
             deviation = current_value - max_temp
             severity = self._calculate_severity(deviation, max_temp - min_temp)
             
-            problem = f"Temperature is too HIGH ({current_value:.1f}°C, max: {max_temp}°C)"
-            action = f"Increase cooling/AC power or improve ventilation"
+            problem, action = self._violation_text('temperature', True, current_value, max_temp)
             reasoning = self._generate_temperature_reasoning(current_value, max_temp, True)
             
             # Целевое значение = средина нормального диапазона
@@ -154,8 +199,7 @@ class RecommendationGenerator:
             deviation = min_temp - current_value
             severity = self._calculate_severity(deviation, max_temp - min_temp)
             
-            problem = f"Temperature is too LOW ({current_value:.1f}°C, min: {min_temp}°C)"
-            action = f"Increase heating power or close air intakes"
+            problem, action = self._violation_text('temperature', False, current_value, min_temp)
             reasoning = self._generate_temperature_reasoning(current_value, min_temp, False)
             
             recommended_target = target_temp
@@ -180,7 +224,9 @@ class RecommendationGenerator:
             'priority': priority,
             'sensor_name': sensor_name,
             'current_value': current_value,
-            'estimated_time_to_normal': self._estimate_time_to_target(current_value, recommended_target, history)
+            'estimated_time_to_normal': self._estimate_time_to_target(
+                current_value, recommended_target, history, time_constant
+            )
         }
     
     def _generate_humidity_recommendation(
@@ -188,7 +234,8 @@ class RecommendationGenerator:
         sensor_name: str,
         current_value: float,
         anomaly_analysis: Dict,
-        history: Optional[List[float]]
+        history: Optional[List[float]],
+        time_constant: Optional[float] = None
     ) -> Dict:
         """Рекомендация для датчика влажности"""
         
@@ -199,8 +246,7 @@ class RecommendationGenerator:
             deviation = current_value - max_hum
             severity = self._calculate_severity(deviation, max_hum - min_hum)
             
-            problem = f"Humidity is too HIGH ({current_value:.1f}%, max: {max_hum}%)"
-            action = f"Increase dehumidification or improve ventilation"
+            problem, action = self._violation_text('humidity', True, current_value, max_hum)
             reasoning = self._generate_humidity_reasoning(current_value, max_hum, True)
             
             recommended_target = target_hum
@@ -209,8 +255,7 @@ class RecommendationGenerator:
             deviation = min_hum - current_value
             severity = self._calculate_severity(deviation, max_hum - min_hum)
             
-            problem = f"Humidity is too LOW ({current_value:.1f}%, min: {min_hum}%)"
-            action = f"Add humidifiers or reduce ventilation"
+            problem, action = self._violation_text('humidity', False, current_value, min_hum)
             reasoning = self._generate_humidity_reasoning(current_value, min_hum, False)
             
             recommended_target = target_hum
@@ -236,7 +281,9 @@ class RecommendationGenerator:
             'sensor_name': sensor_name,
             'current_value': current_value,
             'risk_of_condensation': self._check_condensation_risk(current_value),
-            'estimated_time_to_normal': self._estimate_time_to_target(current_value, recommended_target, history)
+            'estimated_time_to_normal': self._estimate_time_to_target(
+                current_value, recommended_target, history, time_constant
+            )
         }
     
     def _generate_generic_recommendation(
@@ -270,6 +317,11 @@ class RecommendationGenerator:
             'sensor_name': sensor_name
         }
     
+    def _violation_text(self, kind: str, is_high: bool, value: float, limit: float) -> tuple:
+        """(описание проблемы, действие) при выходе за границу limit"""
+        problem, action = self.VIOLATION_TEXT[(kind, is_high)]
+        return problem.format(value=value, limit=limit), action
+
     def _generate_temperature_reasoning(self, current: float, limit: float, is_high: bool) -> str:
         """Генерирует обоснование для рекомендации по температуре"""
         if is_high:
@@ -308,6 +360,17 @@ class RecommendationGenerator:
             else:
                 return f"Humidity {diff:.0f}% below normal. Monitor humidity levels."
     
+    def _generate_pressure_reasoning(self, current: float, limit: float, is_high: bool) -> str:
+        """Генерирует обоснование для рекомендации по давлению"""
+        diff = current - limit if is_high else limit - current
+        return f"Pressure {diff:.1f} hPa {'above' if is_high else 'below'} normal. Check ventilation balance."
+
+    _REASONING = {
+        'temperature': _generate_temperature_reasoning,
+        'humidity': _generate_humidity_reasoning,
+        'pressure': _generate_pressure_reasoning,
+    }
+
     def _calculate_severity(self, deviation: float, normal_range_width: float) -> str:
         """Определяет серьезность проблемы"""
         relative_deviation = deviation / (normal_range_width / 2)
@@ -340,11 +403,21 @@ class RecommendationGenerator:
         self,
         current: float,
         target: float,
-        history: Optional[List[float]]
+        history: Optional[List[float]],
+        time_constant: Optional[float] = None
     ) -> str:
         """
         Оценивает время достижения целевого значения.
+
+        С моделью отклика датчика (time_constant, секунды) - время выхода
+        экспоненты в допуск SETTLE_TOLERANCE; без неё - по скорости
+        изменения между двумя последними точками истории.
         """
+        if time_constant is not None:
+            return self.format_duration(
+                self.settling_seconds(current, target, time_constant, self.SETTLE_TOLERANCE) / 3600
+            )
+
         if history is None or len(history) < 2:
             return "Unknown (insufficient data)"
         
@@ -358,8 +431,19 @@ class RecommendationGenerator:
             return "Unable to estimate (no change rate)"
         
         distance = abs(current - target)
-        hours_needed = distance / rate
-        
+        return self.format_duration(distance / rate)
+
+    @staticmethod
+    def settling_seconds(current: float, target: float, time_constant: float, tolerance: float) -> float:
+        """Время (с), за которое экспоненциальный отклик подойдёт к цели ближе tolerance"""
+        distance = abs(current - target)
+        if distance <= tolerance:
+            return 0.0
+        return time_constant * math.log(distance / tolerance)
+
+    @staticmethod
+    def format_duration(hours_needed: float) -> str:
+        """Длительность в часах -> '~N minutes/hours/days'"""
         if hours_needed < 1:
             return f"~{int(hours_needed * 60)} minutes"
         elif hours_needed < 24:
@@ -389,7 +473,8 @@ class RecommendationGenerator:
                     sensor_type=item['sensor_type'],
                     current_value=item['current_value'],
                     anomaly_analysis=item['anomaly_analysis'],
-                    measurement_history=item.get('measurement_history')
+                    measurement_history=item.get('measurement_history'),
+                    time_constant=item.get('time_constant')
                 )
                 recommendations.append(rec)
         
@@ -398,6 +483,153 @@ class RecommendationGenerator:
         
         return recommendations
 
+    # --- ВЕКТОРНЫЙ РЕЖИМ ---
+
+    @classmethod
+    def room_type_codes(cls, room_types: Sequence[Optional[str]]) -> np.ndarray:
+        """Коды типов помещений для evaluate_arrays (неизвестный тип -> office)"""
+        index = {name: i for i, name in enumerate(cls.ROOM_TYPES)}
+        office = index['office']
+        return np.array([index.get(room_type, office) for room_type in room_types], dtype=np.intp)
+
+    @classmethod
+    def sensor_type_codes(cls, sensor_types: Sequence[str]) -> np.ndarray:
+        """Коды типов датчиков (как в generate_recommendation - по подстроке), иначе GENERIC_KIND"""
+        codes: Dict[str, int] = {}
+        for name in set(sensor_types):
+            lower = name.lower()
+            codes[name] = next((i for i, kind in enumerate(cls.SENSOR_KINDS) if kind in lower), cls.GENERIC_KIND)
+        return np.array([codes[name] for name in sensor_types], dtype=np.intp)
+
+    def evaluate_arrays(
+        self,
+        values,
+        sensor_codes,
+        room_codes=None,
+        scores=None,
+        bounds=None
+    ) -> Dict[str, np.ndarray]:
+        """
+        Выход за нормы, серьёзность и приоритет для столбцов датчиков без цикла по строкам.
+
+        Args:
+            values: Текущие значения
+            sensor_codes: Коды типов датчиков (sensor_type_codes)
+            room_codes: Коды типов помещений (room_type_codes); по умолчанию тип генератора
+            scores: Оценки аномалий 0-1 (серьёзность датчиков без нормы)
+            bounds: (lower, upper, target) по строкам вместо таблиц класса
+                    (comfort_ranges - диапазоны из БД); NaN - нормы нет
+
+        Returns:
+            {'violation': -1/0/1 (ниже/в норме/выше), 'known': есть норма, 'limit',
+             'target', 'deviation', 'severity': индекс SEVERITIES, 'priority'}
+        """
+        values = np.asarray(values, dtype=np.float64)
+        sensor_codes = np.asarray(sensor_codes, dtype=np.intp)
+        if bounds is None:
+            if room_codes is None:
+                room_codes = np.full(len(values), self.ROOM_TYPES.index(self.room_type), dtype=np.intp)
+            room_codes = np.asarray(room_codes, dtype=np.intp)
+            kinds = np.where(sensor_codes != self.GENERIC_KIND, sensor_codes, 0)
+            lower = self._LOWER[room_codes, kinds]
+            upper = self._UPPER[room_codes, kinds]
+            target = self._TARGET[room_codes, kinds]
+        else:
+            lower, upper, target = (np.asarray(column, dtype=np.float64) for column in bounds)
+
+        known = (sensor_codes != self.GENERIC_KIND) & ~np.isnan(lower) & ~np.isnan(upper)
+        high = known & (values > upper)
+        low = known & (values < lower)
+        deviation = np.where(high, values - upper, np.where(low, lower - values, 0.0))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            relative = deviation / ((upper - lower) / 2)
+        severity = np.select([relative > 2.0, relative > 1.5, relative > 1.0], [3, 2, 1], 0)
+        if scores is not None:
+            scores = np.asarray(scores, dtype=np.float64)
+            severity = np.where(known, severity, np.select([scores > 0.7, scores > 0.5], [2, 1], 0))
+
+        return {
+            'violation': high.astype(np.int8) - low.astype(np.int8),
+            'known': known,
+            'limit': np.where(high, upper, lower),
+            'target': np.where(high | low, target, values),
+            'deviation': deviation,
+            'severity': severity,
+            'priority': self.PRIORITIES[severity],
+        }
+
+    def bulk_generate_from_arrays(
+        self,
+        values,
+        sensor_codes,
+        room_codes=None,
+        scores=None,
+        is_anomaly=None,
+        sensor_names: Optional[Sequence[str]] = None,
+        sensor_types: Optional[Sequence[str]] = None,
+        bounds=None
+    ) -> List[Dict]:
+        """
+        Векторный аналог bulk_generate_recommendations для всего парка датчиков.
+
+        Нормы, серьёзность и приоритет считаются по столбцам (evaluate_arrays);
+        текст формируется только для строк, которые дают рекомендацию:
+        выход за нормальный диапазон или аномалия датчика неизвестного типа.
+        Строки "No action required" не создаются.
+
+        Args:
+            values, sensor_codes, room_codes, scores, bounds: см. evaluate_arrays
+            is_anomaly: Маска аномалий; строки без аномалии пропускаются
+            sensor_names: Названия датчиков (по индексу строки)
+            sensor_types: Названия типов датчиков (для текста по датчикам неизвестного типа)
+
+        Returns:
+            Рекомендации (поля как у generate_recommendation + 'index' строки),
+            отсортированные по приоритету
+        """
+        values = np.asarray(values, dtype=np.float64)
+        sensor_codes = np.asarray(sensor_codes, dtype=np.intp)
+        result = self.evaluate_arrays(values, sensor_codes, room_codes, scores, bounds)
+
+        selected = (result['violation'] != 0) | ~result['known']
+        if is_anomaly is not None:
+            selected &= np.asarray(is_anomaly, dtype=bool)
+        rows = np.flatnonzero(selected)
+        rows = rows[np.argsort(-result['priority'][rows], kind='stable')]
+
+        recommendations = []
+        for i in rows.tolist():
+            name = sensor_names[i] if sensor_names is not None else f"sensor_{i}"
+            value = float(values[i])
+            code = int(sensor_codes[i])
+            if not result['known'][i]:
+                rec = self._generate_generic_recommendation(
+                    name, sensor_types[i] if sensor_types is not None else 'sensor', value, {'score': float(scores[i]) if scores is not None else 0}
+                )
+            else:
+                kind = self.SENSOR_KINDS[code]
+                is_high = bool(result['violation'][i] > 0)
+                limit = float(result['limit'][i])
+                problem, action = self._violation_text(kind, is_high, value, limit)
+                reasoning = self._REASONING[kind](self, value, limit, is_high)
+                rec = {
+                    'problem_description': problem,
+                    'recommended_action': action,
+                    'target_value': round(float(result['target'][i]), 1),
+                    'reasoning': reasoning,
+                    'confidence': float(scores[i]) if scores is not None else 0.5,
+                    'severity': self.SEVERITIES[result['severity'][i]],
+                    'priority': int(result['priority'][i]),
+                    'sensor_name': name,
+                    'current_value': value,
+                }
+                if kind == 'humidity':
+                    rec['risk_of_condensation'] = self._check_condensation_risk(value)
+            rec['index'] = i
+            recommendations.append(rec)
+
+        return recommendations
+
 
 if __name__ == '__main__':
     # Пример использования
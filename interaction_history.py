@@ -0,0 +1,137 @@
+"""
+Ограниченная история голосовых взаимодействий.
+
+Кольцевой буфер фиксированной ёмкости вместо растущего списка:
+- память ограничена независимо от времени работы процесса
+- индекс по notification_id отдаёт историю уведомления без сканирования
+- счётчики и суммы уверенности обновляются при добавлении, поэтому
+  статистика считается за O(1)
+"""
+
+from collections import deque
+from itertools import islice
+from typing import Deque, Dict, Iterator, List, Optional
+
+
+class InteractionHistory:
+    """
+    Кольцевой буфер взаимодействий с индексом по уведомлениям
+    и накопительной статистикой.
+    """
+
+    def __init__(self, capacity: int = 1000):
+        """
+        Args:
+            capacity: Максимум хранимых взаимодействий (старые вытесняются)
+        """
+        self.capacity = capacity
+        self._entries: Deque[Dict] = deque()
+        self._by_notification: Dict[int, Deque[Dict]] = {}
+        self._reset_counters()
+
+    def _reset_counters(self):
+        """Обнуляет накопительные счётчики"""
+        self.total_interactions = 0
+        self.successful_interactions = 0
+        self.commands_distribution: Dict[str, int] = {}
+        self._speech_confidence_sum = 0.0
+        self._command_confidence_sum = 0.0
+
+    def append(self, interaction: Dict):
+        """
+        Добавляет взаимодействие, вытесняя самое старое при переполнении.
+
+        Args:
+            interaction: Словарь взаимодействия (command, confidence_speech,
+                         confidence_command, notification_id, success, ...)
+        """
+        if len(self._entries) >= self.capacity:
+            self._evict_oldest()
+
+        self._entries.append(interaction)
+
+        notification_id = interaction.get('notification_id')
+        if notification_id is not None:
+            self._by_notification.setdefault(notification_id, deque()).append(interaction)
+
+        # Статистика накапливается за всё время работы, а не только по буферу
+        self.total_interactions += 1
+        if interaction.get('success'):         # без ключа success взаимодействие неуспешное
+            command = interaction.get('command', 'unknown')
+            self.commands_distribution[command] = self.commands_distribution.get(command, 0) + 1
+            self._speech_confidence_sum += interaction.get('confidence_speech') or 0
+            self._command_confidence_sum += interaction.get('confidence_command') or 0
+            self.successful_interactions += 1
+
+    def _evict_oldest(self):
+        """Удаляет самое старое взаимодействие из буфера и индекса"""
+        oldest = self._entries.popleft()
+        notification_id = oldest.get('notification_id')
+        if notification_id is None:
+            return
+
+        # Самое старое в буфере - всегда самое старое и в истории уведомления
+        entries = self._by_notification.get(notification_id)
+        if entries and entries[0] is oldest:
+            entries.popleft()
+            if not entries:
+                del self._by_notification[notification_id]
+
+    def recent(self, limit: int = 10, notification_id: Optional[int] = None) -> List[Dict]:
+        """
+        Последние взаимодействия (в хронологическом порядке).
+
+        Args:
+            limit: Максимум результатов
+            notification_id: Фильтр по уведомлению (опционально)
+
+        Returns:
+            List[Dict] с последними взаимодействиями
+        """
+        if notification_id is not None:
+            entries = self._by_notification.get(notification_id, ())
+        else:
+            entries = self._entries
+
+        if limit <= 0:
+            return []
+        newest_first = list(islice(reversed(entries), limit))
+        newest_first.reverse()
+        return newest_first
+
+    def stats(self) -> Dict:
+        """
+        Накопительная статистика за O(1).
+
+        Returns:
+            {
+                'total_interactions': int,
+                'successful_interactions': int,
+                'commands_distribution': Dict[str, int],
+                'avg_speech_confidence': float,
+                'avg_command_confidence': float
+            }
+        """
+        successful = self.successful_interactions
+        avg_speech = self._speech_confidence_sum / successful if successful > 0 else 0
+        avg_cmd = self._command_confidence_sum / successful if successful > 0 else 0
+
+        return {
+            'total_interactions': self.total_interactions,
+            'successful_interactions': successful,
+            'commands_distribution': dict(self.commands_distribution),
+            'avg_speech_confidence': round(avg_speech, 3),
+            'avg_command_confidence': round(avg_cmd, 3)
+        }
+
+    def clear(self):
+        """Очищает буфер, индекс и статистику"""
+        self._entries.clear()
+        self._by_notification.clear()
+        self._reset_counters()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self._entries)
@@ -0,0 +1,187 @@
+"""
+Живой поток показаний датчиков (Server-Sent Events).
+
+Вместо опроса /api/sensors/{location_id} и /api/dashboard/stats клиенты
+подписываются на поток локации. Путь приёма измерений публикует событие
+один раз во внутренний pub/sub хаб, а хаб раздаёт его всем подписчикам
+в памяти - N зрителей стоят одно событие, а не N запросов к БД.
+
+У каждого подписчика своя ограниченная очередь:
+- показания (reading) схлопываются по датчику - медленный клиент получает
+  последнее значение, а не всю накопившуюся историю
+- события порогов и аномалий (threshold, anomaly) хранятся в deque
+  фиксированной длины, при переполнении вытесняются самые старые
+"""
+
+import asyncio
+import json
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Set
+
+from comfort_ranges import comfort_ranges
+
+
+class Subscription:
+    """Подписка одного клиента на события локации"""
+
+    def __init__(self, location_id: int, loop: asyncio.AbstractEventLoop, max_events: int = 100):
+        """
+        Args:
+            location_id: ID локации
+            loop: Цикл событий, в котором клиент ждёт данные
+            max_events: Ёмкость очереди несхлопываемых событий
+        """
+        self.location_id = location_id
+        self._loop = loop
+        self._lock = threading.Lock()
+        self._readings: Dict[int, Dict] = {}
+        self._events: Deque[Dict] = deque(maxlen=max_events)
+        self._ready = asyncio.Event()
+        self.dropped = 0
+
+    def push(self, event: Dict):
+        """Кладёт событие в очередь клиента (потокобезопасно)"""
+        with self._lock:
+            if event['type'] == 'reading':
+                self._readings[event['sensor_id']] = event
+            else:
+                if len(self._events) == self._events.maxlen:
+                    self.dropped += 1
+                self._events.append(event)
+        self._loop.call_soon_threadsafe(self._ready.set)
+
+    async def next_batch(self, timeout: float) -> List[Dict]:
+        """
+        Ждёт новые события не дольше timeout секунд.
+
+        Пробуждение без событий (их уже забрал предыдущий вызов) не
+        заканчивает ожидание - пустой список только по таймауту.
+
+        Returns:
+            Накопленные события (пустой список по таймауту)
+        """
+        deadline = self._loop.time() + timeout
+        while True:
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                return []
+            try:
+                await asyncio.wait_for(self._ready.wait(), remaining)
+            except asyncio.TimeoutError:
+                return []
+
+            self._ready.clear()
+            with self._lock:
+                batch = list(self._events) + list(self._readings.values())
+                self._events.clear()
+                self._readings.clear()
+            if batch:
+                return batch
+
+
+class LiveHub:
+    """Внутрипроцессный pub/sub хаб событий по локациям"""
+
+    def __init__(self, max_events_per_client: int = 100):
+        self.max_events_per_client = max_events_per_client
+        self._lock = threading.Lock()
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self.published = 0
+
+    def subscribe(self, location_id: int) -> Subscription:
+        """Регистрирует клиента (вызывается из цикла событий)"""
+        subscription = Subscription(location_id, asyncio.get_running_loop(), self.max_events_per_client)
+        with self._lock:
+            self._subscribers.setdefault(location_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Удаляет клиента"""
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.location_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.location_id]
+
+    def has_subscribers(self, location_id: int) -> bool:
+        """Есть ли клиенты у локации (чтобы не собирать события впустую)"""
+        return location_id in self._subscribers
+
+    def publish(self, location_id: int, event: Dict):
+        """Раздаёт событие всем подписчикам локации"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(location_id, ()))
+        for subscription in subscribers:
+            subscription.push(event)
+        self.published += 1
+
+    def stats(self) -> Dict:
+        """Счётчики хаба: локации, клиенты, опубликовано событий"""
+        with self._lock:
+            clients = sum(len(s) for s in self._subscribers.values())
+            locations = len(self._subscribers)
+        return {'locations': locations, 'clients': clients, 'published': self.published}
+
+
+def publish_measurement(sensor, value: float, timestamp: Optional[datetime] = None):
+    """
+    Публикует новое показание и, если значение вне нормы датчика
+    (comfort_ranges), событие превышения порога.
+
+    Args:
+        sensor: models.Sensor (с доступными location и sensor_type)
+        value: Значение измерения
+        timestamp: Время измерения
+    """
+    location_id = sensor.location_id
+    if not live_hub.has_subscribers(location_id):
+        return
+
+    timestamp = (timestamp or datetime.utcnow()).isoformat()
+    sensor_type = sensor.sensor_type.name if sensor.sensor_type else None
+    live_hub.publish(location_id, {
+        'type': 'reading',
+        'sensor_id': sensor.id,
+        'location_id': location_id,
+        'sensor_type': sensor_type,
+        'value': value,
+        'timestamp': timestamp
+    })
+
+    bounds = comfort_ranges.bounds(sensor.id)
+    if bounds and not bounds[0] <= value <= bounds[1]:
+        live_hub.publish(location_id, {
+            'type': 'threshold',
+            'sensor_id': sensor.id,
+            'location_id': location_id,
+            'sensor_type': sensor_type,
+            'value': value,
+            'min': bounds[0],
+            'max': bounds[1],
+            'timestamp': timestamp
+        })
+
+
+def publish_anomaly(location_id: int, sensor_id: int, analysis_id: int, score: float, recommendation_id: Optional[int] = None):
+    """Публикует результат анализа, в котором найдена аномалия"""
+    live_hub.publish(location_id, {
+        'type': 'anomaly',
+        'sensor_id': sensor_id,
+        'location_id': location_id,
+        'analysis_id': analysis_id,
+        'score': score,
+        'recommendation_id': recommendation_id,
+        'timestamp': datetime.utcnow().isoformat()
+    })
+
+
+def format_sse(event: Dict) -> str:
+    """Сериализует событие в формат text/event-stream"""
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+# Глобальный хаб для использования в приложении
+live_hub = LiveHub()
@@ -1,20 +1,65 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Body
+from fastapi import FastAPI, Depends, HTTPException, status, Body, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime, timedelta
 import random
 import os
+import tempfile
 
 import crud
 import models
 import schemas
-from database import SessionLocal, engine, Base
+from database import SessionLocal, engine, async_engine, Base, get_async_db
+from voice_notification_commands import NotificationCommand, voice_notification_manager
+from voice_event_writer import voice_event_writer
+from db_maintenance import sqlite_maintenance
+from measurement_storage import measurement_retention
+from series_cache import series_cache
+import measurement_export
+import report_engine
+import pagination
+import fast_json
+from fast_json import FastJSONResponse
+from report_jobs import report_jobs
+from recommendation_sink import RecommendationSink
+from recommendation_verifier import recommendation_verifier
+from response_model import response_models
+from comfort_ranges import comfort_ranges
+from response_cache import ResponseCacheMiddleware, response_cache
+from request_metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, RequestMetricsMiddleware, request_metrics
+from intelligent_recommendation_engine import RecommendationGenerator
+from live_stream import format_sse, live_hub, publish_anomaly, publish_measurement
 from sqlalchemy import func # Добавляем для расчета статистики
 
 # Создаем объект FastAPI
 app = FastAPI(title="Microclimate Monitoring API")
 
+# Кэш ответов для опрашиваемых дэшбордами эндпоинтов: ETag + 304, сброс по тегам от писателей
+app.add_middleware(ResponseCacheMiddleware, cache=response_cache)
+response_cache.route("/api/locations", ttl=300, tags=("locations",))
+response_cache.route("/api/users", ttl=60, tags=("users",))
+response_cache.route("/analytics/{sensor_id}", ttl=60, tags=("measurements", "sensor:{sensor_id}"))
+response_cache.route("/api/reports", ttl=300, tags=("reports",))
+
+# Метрики Prometheus (/metrics): задержка по маршрутам, SQL на запрос, N+1, очереди
+app.add_middleware(RequestMetricsMiddleware, metrics=request_metrics)
+request_metrics.instrument_engine(engine)
+if async_engine is not None:
+    request_metrics.instrument_engine(async_engine.sync_engine)
+request_metrics.define("detector_duration_seconds", "histogram", "Anomaly analysis stage latency")
+request_metrics.define("ingested_measurements_total", "counter", "Measurements accepted by source")
+request_metrics.register_collector("voice_writer", voice_event_writer.stats)
+request_metrics.register_collector("report_jobs", report_jobs.stats)
+request_metrics.register_collector("recommendation_verifier", recommendation_verifier.stats)
+request_metrics.register_collector("response_cache", response_cache.stats)
+request_metrics.register_collector("series_cache", series_cache.stats)
+request_metrics.register_collector("live_stream", live_hub.stats)
+request_metrics.register_collector("retention", measurement_retention.stats)
+
 
 @app.on_event("startup")
 def startup_event():
@@ -30,6 +75,41 @@ def startup_event():
     except Exception as e:
         print(f"⚠️ Warning: failed to create tables on startup: {e}")
 
+    # Фоновая пакетная запись голосовых команд
+    voice_event_writer.start()
+    # Периодический WAL checkpoint и PRAGMA optimize
+    sqlite_maintenance.start()
+    # Архивирование измерений по месяцам и прореживание старых данных
+    measurement_retention.start()
+    # Пул потоков генерации отчетов
+    report_jobs.start()
+    # Проверка достижения целевых значений рекомендаций по новым показаниям
+    try:
+        recommendation_verifier.load()
+    except Exception as e:
+        print(f"⚠️ Warning: failed to load open recommendations: {e}")
+    recommendation_verifier.start()
+    # Ночная подгонка моделей отклика датчиков на смену цели
+    response_models.start()
+    # Нормы датчиков: компиляция в массивы по sensor_id, проверка изменений в фоне
+    try:
+        comfort_ranges.refresh()
+    except Exception as e:
+        print(f"⚠️ Warning: failed to compile comfort ranges: {e}")
+    comfort_ranges.start()
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    """Дописывает накопленные в очереди голосовые команды."""
+    voice_event_writer.stop()
+    report_jobs.stop()
+    recommendation_verifier.stop()
+    response_models.stop()
+    comfort_ranges.stop()
+    measurement_retention.stop()
+    sqlite_maintenance.stop()
+
 # Подключаем статические файлы для скачивания отчётов
 app.mount("/reports", StaticFiles(directory="reports"), name="reports")
 
@@ -42,12 +122,50 @@ def get_db():
     finally:
         db.close()
 
+# --- Keyset-пагинация списков (pagination.py) ---
+def _page_key(cursor: Optional[str], types=pagination.TIME_KEY_TYPES) -> Optional[tuple]:
+    """Ключ из ?cursor= (400 для повреждённого курсора)"""
+    if not cursor:
+        return None
+    try:
+        return pagination.decode_cursor(cursor, types)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _page(response: Response, rows: list, limit: int, key_of) -> list:
+    """Отрезает лишнюю строку и ставит X-Next-Cursor, если есть следующая страница"""
+    page, next_cursor = pagination.split_page(rows, limit, key_of)
+    if next_cursor:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+    return page
+
+def _fast_page(rows: list, limit: int, key_of, fields, columns=None) -> FastJSONResponse:
+    """Как _page, но строки БД сразу сериализуются в JSON по полям схемы (fast_json)"""
+    page, next_cursor = pagination.split_page(rows, limit, key_of)
+    headers = {pagination.NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return FastJSONResponse(fast_json.rows_to_dicts(page, fields, columns), headers=headers)
+
 # Health check (без зависимостей БД)
 @app.get("/health")
 def health_check():
     """Простая проверка здоровья сервиса."""
     return {"status": "ok", "service": "Microclimate API"}
 
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Метрики в текстовом формате Prometheus."""
+    return Response(request_metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/api/metrics/slow")
+def get_slow_requests():
+    """Пороги и последние медленные запросы и запросы с признаками N+1."""
+    return request_metrics.stats()
+
+@app.get("/api/cache/stats")
+def get_response_cache_stats():
+    """Статистика кэша ответов: попадания, 304, сбросы."""
+    return response_cache.stats()
+
 # -------------------------------------------------------------------
 # 📍 1. ЛОКАЦИИ И ДАТЧИКИ
 # -------------------------------------------------------------------
@@ -57,52 +175,107 @@ def get_locations(db: Session = Depends(get_db)):
     """Получить список всех локаций (кабинетов) для выпадающего списка."""
     return crud.get_all_locations(db)
 
+@app.get("/api/comfort-ranges", response_model=List[schemas.ComfortRangeRead])
+def get_comfort_ranges(db: Session = Depends(get_db)):
+    """Нормы датчиков, заданные на локацию или тип помещения."""
+    return crud.get_comfort_ranges(db)
+
+@app.put("/api/comfort-ranges", response_model=schemas.ComfortRangeRead)
+def put_comfort_range(data: schemas.ComfortRangeBase, db: Session = Depends(get_db)):
+    """Создать или изменить норму; снимок норм перекомпилируется сразу."""
+    if (data.location_id is None) == (data.room_type is None):
+        raise HTTPException(status_code=400, detail="Specify exactly one of location_id or room_type")
+    if data.min_value >= data.max_value:
+        raise HTTPException(status_code=400, detail="min_value must be less than max_value")
+    if data.target_value is not None and not data.min_value <= data.target_value <= data.max_value:
+        raise HTTPException(status_code=400, detail="target_value must be within the range")
+    rule = crud.upsert_comfort_range(db, data)
+    comfort_ranges.invalidate(db)
+    return rule
+
+@app.delete("/api/comfort-ranges/{range_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_comfort_range(range_id: int, db: Session = Depends(get_db)):
+    """Удалить норму: датчики возвращаются к норме типа помещения."""
+    if not crud.delete_comfort_range(db, range_id):
+        raise HTTPException(status_code=404, detail="Comfort range not found")
+    comfort_ranges.invalidate(db)
+
+def _simulate_next_value(sensor: models.Sensor, last_measure: Optional[models.Measurement]) -> Optional[float]:
+    """
+    Шаг симуляции физики: значение датчика движется к целевому.
+
+    Returns:
+        Новое значение или None, если измерение не требуется
+    """
+    if not (sensor.is_active and sensor.target_value is not None and last_measure):
+        return None
+
+    current_val = last_measure.value
+    diff = sensor.target_value - current_val
+    if abs(diff) <= 0.1:
+        return None
+
+    time_since_last = datetime.utcnow() - last_measure.timestamp
+    if time_since_last.total_seconds() <= 5:
+        return None
+
+    step = diff * 0.1
+    if abs(step) < 0.1:
+        step = 0.1 if diff > 0 else -0.1
+
+    noise = random.uniform(-0.05, 0.05)
+    return current_val + step + noise
+
+# Поля ответов, собираемых без проверки Pydantic (fast_json)
+SENSOR_FIELDS = [name for name in fast_json.schema_fields(schemas.SensorRead) if name not in ("sensor_type", "last_value")]
+SENSOR_TYPE_FIELDS = fast_json.schema_fields(schemas.SensorTypeRead)
+MEASUREMENT_FIELDS = fast_json.schema_fields(schemas.MeasurementRead)
+ANALYSIS_FIELDS = fast_json.schema_fields(schemas.AnomalyAnalysisRead)
+RECOMMENDATION_FIELDS = fast_json.schema_fields(schemas.IntelligentRecommendationRead) + ["notification_id"]
+
 @app.get("/api/sensors/{location_id}", response_model=List[schemas.SensorRead])
-def get_sensors_by_location_id(location_id: int, db: Session = Depends(get_db)):
+async def get_sensors_by_location_id(location_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Получить датчики + СИМУЛЯЦИЯ ФИЗИКИ.
     """
     
-    sensors = crud.get_sensors_by_location(db, location_id)
+    sensors = await crud.get_sensors_by_location_async(db, location_id)
+    last_measures = await crud.get_last_measurements_async(db, [s.id for s in sensors])
     
-    result = []
-    for sensor in sensors:
-        last_measure = crud.get_last_measurement(db, sensor.id)
+    result = fast_json.objects_to_dicts(sensors, SENSOR_FIELDS)
+    sensor_types = fast_json.objects_to_dicts((s.sensor_type for s in sensors), SENSOR_TYPE_FIELDS)
+    new_measures = []
+    for sensor, sensor_data, sensor_type in zip(sensors, result, sensor_types):
+        last_measure = last_measures.get(sensor.id)
         current_val = last_measure.value if last_measure else 0.0
         
         # --- ЛОГИКА СИМУЛЯЦИИ (PHYSICS ENGINE) ---
-        if sensor.is_active and sensor.target_value is not None and last_measure:
-            diff = sensor.target_value - current_val
-            
-            if abs(diff) > 0.1:
-                time_since_last = datetime.utcnow() - last_measure.timestamp
-                
-                if time_since_last.total_seconds() > 5:
-                    step = diff * 0.1
-                    if abs(step) < 0.1:
-                        step = 0.1 if diff > 0 else -0.1
-                        
-                    noise = random.uniform(-0.05, 0.05)
-                    new_val = current_val + step + noise
-                    
-                    new_measure = models.Measurement(
-                        sensor_id=sensor.id,
-                        location_id=sensor.location_id,
-                        value=round(new_val, 2),
-                        timestamp=datetime.utcnow()
-                    )
-                    db.add(new_measure)
-                    db.commit()
-                    
-                    current_val = new_val
-
+        new_val = _simulate_next_value(sensor, last_measure)
+        if new_val is not None:
+            new_measure = models.Measurement(
+                sensor_id=sensor.id,
+                location_id=sensor.location_id,
+                value=round(new_val, 2),
+                timestamp=datetime.utcnow()
+            )
+            db.add(new_measure)
+            new_measures.append((sensor, new_measure))
+            current_val = new_val
         # -----------------------------------------
         
-        sensor_data = schemas.SensorRead.from_orm(sensor)
-        sensor_data.last_value = round(current_val, 1) 
-        result.append(sensor_data)
+        sensor_data['sensor_type'] = sensor_type
+        sensor_data['last_value'] = round(current_val, 1)
+
+    # Все шаги симуляции сохраняются одним commit
+    if new_measures:
+        await db.commit()
+        for sensor, new_measure in new_measures:
+            publish_measurement(sensor, new_measure.value, new_measure.timestamp)
+            recommendation_verifier.observe(sensor.id, new_measure.value, new_measure.timestamp)
+        response_cache.invalidate(*(f"sensor:{sensor.id}" for sensor, _ in new_measures))
+        request_metrics.inc("ingested_measurements_total", len(new_measures), source="simulation")
         
-    return result
+    return FastJSONResponse(result)
 
 @app.patch("/api/sensors/{sensor_id}", response_model=schemas.SensorRead)
 def update_sensor_settings(
@@ -119,6 +292,7 @@ def update_sensor_settings(
         raise HTTPException(status_code=404, detail="Sensor not found")
     
     action_text = []
+    target_change = None
     
     # 1. Логируем is_active только если новое значение отличается от старого
     if update_data.is_active is not None and update_data.is_active != sensor.is_active:
@@ -129,6 +303,13 @@ def update_sensor_settings(
     # 2. Логируем target_value только если оно было предоставлено и изменилось
     if update_data.target_value is not None:
         if update_data.target_value != sensor.target_value:
+            # Структурная запись изменения цели - для модели отклика датчика
+            target_change = models.SensorTargetChange(
+                sensor_id=sensor.id,
+                old_target=sensor.target_value,
+                new_target=update_data.target_value,
+                changed_at=datetime.utcnow()
+            )
             sensor.target_value = update_data.target_value 
             action_text.append(f"Изменил {sensor.name} на {update_data.target_value}")
 
@@ -143,10 +324,14 @@ def update_sensor_settings(
             timestamp=datetime.utcnow()
         )
         db.add(new_log)
+        if target_change is not None:
+            target_change.action_log = new_log
+            db.add(target_change)
         db.commit()
+        response_cache.invalidate(f"sensor:{sensor.id}")
 
     last_measure = crud.get_last_measurement(db, sensor.id)
-    updated_sensor = schemas.SensorRead.from_orm(sensor)
+    updated_sensor = schemas.SensorRead.model_validate(sensor)
     updated_sensor.last_value = last_measure.value if last_measure else 0.0
     
     return updated_sensor
@@ -172,12 +357,8 @@ def get_dashboard_stats(db: Session = Depends(get_db)):
     for sensor in sensors:
         last_measure = crud.get_last_measurement(db, sensor.id)
         
-        # Получаем значение, ближайшее к 24 часам назад
-        old_measure = db.query(models.Measurement)\
-            .filter(models.Measurement.sensor_id == sensor.id, 
-                    models.Measurement.timestamp <= time_24h_ago)\
-            .order_by(models.Measurement.timestamp.desc())\
-            .first()
+        # Получаем значение, ближайшее к 24 часам назад (строки или сжатые блоки)
+        old_measure = crud.get_measurement_at(db, sensor.id, time_24h_ago)
         
         if last_measure:
             if sensor.sensor_type.name == "Temperature":
@@ -206,18 +387,53 @@ def get_dashboard_stats(db: Session = Depends(get_db)):
         "hum_change": round(get_percent_change(avg_hum_now, avg_hum_old), 1)
     }
 
+@app.get("/api/stream/sensors/{location_id}")
+async def stream_sensors(location_id: int, request: Request):
+    """
+    Живой поток локации (Server-Sent Events) вместо опроса датчиков.
+    События: reading (последнее показание датчика), threshold (выход за норму
+    для типа помещения), anomaly (результат анализа с аномалией).
+    """
+    async def event_stream():
+        subscription = live_hub.subscribe(location_id)
+        try:
+            yield ": connected\n\n"
+            while not await request.is_disconnected():
+                batch = await subscription.next_batch(timeout=15)
+                if not batch:
+                    # Комментарий SSE держит соединение открытым через прокси
+                    yield ": keepalive\n\n"
+                    continue
+                for event in batch:
+                    yield format_sse(event)
+        finally:
+            live_hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/analytics/{sensor_id}", response_model=List[schemas.ChartPoint])
-def read_analytics(sensor_id: int, days: int = 7, db: Session = Depends(get_db)):
+async def read_analytics(sensor_id: int, days: int = 7, db: AsyncSession = Depends(get_async_db)):
     """Дандые для графика"""
-    return crud.get_analytics_daily(db=db, sensor_id=sensor_id, days=days)
+    return await crud.get_analytics_daily_async(db=db, sensor_id=sensor_id, days=days)
 
 @app.get("/api/history", response_model=List[schemas.MeasurementRead])
-def get_history(sensor_id: int = None, db: Session = Depends(get_db)):
-    """Сырые данные"""
-    query = db.query(models.Measurement)
-    if sensor_id:
-        query = query.filter(models.Measurement.sensor_id == sensor_id)
-    return query.order_by(models.Measurement.timestamp.desc()).limit(100).all()
+async def get_history(
+    sensor_id: int = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=pagination.MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Сырые данные, новые первыми; страницы - ?cursor= из X-Next-Cursor"""
+    rows = await crud.get_measurement_history_async(
+        db, sensor_id=sensor_id, limit=limit + 1, start=start, end=end, after=_page_key(cursor)
+    )
+    return _fast_page(rows, limit, lambda m: (m.timestamp, m.id), MEASUREMENT_FIELDS, crud.HISTORY_COLUMNS)
 
 # -------------------------------------------------------------------
 # 📄 3. ОТЧЕТЫ
@@ -228,59 +444,76 @@ def get_reports(db: Session = Depends(get_db)):
     """Список отчетов"""
     return db.query(models.Report).order_by(models.Report.report_date.desc()).all()
 
-@app.post("/api/reports/generate/{period}", status_code=status.HTTP_201_CREATED)
-def generate_report_endpoint(period: str, db: Session = Depends(get_db)):
+def _report_period(period: str):
+    """(start_time, end_time, title_prefix) для периода отчета"""
+    try:
+        return report_engine.report_period(period)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _check_report_format(fmt: str):
+    if fmt not in report_engine.REPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {sorted(report_engine.REPORT_FORMATS)}")
+    if fmt == "xlsx" and report_engine.xlsxwriter is None:
+        raise HTTPException(status_code=503, detail="xlsxwriter is not installed")
+
+@app.post("/api/reports/generate/{period}", status_code=status.HTTP_202_ACCEPTED)
+def generate_report_endpoint(
+    period: str,
+    fmt: str = Query("txt", alias="format"),
+    compress: bool = False,
+    wait: float = Query(0, ge=0, le=300, description="Сколько секунд ждать готовности отчета")
+):
     """
-    Инициирует генерацию отчета (недельный или месячный).
-    Эта функция вызывается Cloud Scheduler.
+    Ставит генерацию отчета (недельный или месячный) в фоновую очередь.
+    Эта функция вызывается Cloud Scheduler: повторные вызовы за то же окно
+    получают то же задание. Формат: txt, csv или xlsx; compress=true - gzip.
+    Статус: GET /api/reports/jobs/{job_id}.
     """
-    end_time = datetime.utcnow()
-    
-    if period == "week":
-        start_time = end_time - timedelta(days=7)
-        title_prefix = "Недельный отчет"
-    elif period == "month":
-        start_time = end_time - timedelta(days=30)
-        title_prefix = "Месячный отчет"
-    else:
-        raise HTTPException(status_code=400, detail="Invalid period. Use 'week' or 'month'.")
-
-    # 1. Сбор агрегированных данных
-    report_data = crud.calculate_report_data(db, start_time, end_time)
-    
-    if not report_data:
-        return {"message": f"Нет данных для создания {title_prefix.lower()} за период: {start_time.strftime('%Y-%m-%d')} - {end_time.strftime('%Y-%m-%d')}"}
-
-    # 2. Формирование содержания отчета 
-    report_file_content = f"{title_prefix} за период {start_time.strftime('%d.%m.%Y')} - {end_time.strftime('%d.%m.%Y')}\n"
-    report_file_content += "--------------------------------------------------\n"
-    for data in report_data:
-        report_file_content += (
-            f"Локация: {data['location']} | Датчик: {data['sensor']} ({data['type']})\n"
-            f"  Среднее: {data['avg']} | Мин: {data['min']} | Макс: {data['max']}\n"
-        )
-    
-    # 3. Сохранение файла локально (имитация GCS)
-    filename = f"{period}_{end_time.strftime('%Y%m%d_%H%M%S')}.txt"
-    # *** ИСПОЛЬЗУЕМ ФУНКЦИЮ CRUD, КОТОРАЯ СОХРАНЯЕТ ФАЙЛ ***
-    file_path = crud.save_report_locally(filename, report_file_content)
-    
-    # 4. Сохранение метаданных отчета в БД
-    report_title = f"{title_prefix} ({start_time.strftime('%d.%m')} - {end_time.strftime('%d.%m')})"
-    
-    new_report = models.Report(
-        title=report_title,
-        file_path=file_path,
-        report_date=end_time
+    _report_period(period)
+    _check_report_format(fmt)
+    job = report_jobs.submit(period, fmt, compress)
+    if wait:
+        job.wait(wait)
+    return job.to_dict()
+
+@app.get("/api/reports/jobs")
+def list_report_jobs(limit: int = Query(50, ge=1, le=500)):
+    """Последние задания генерации отчетов и статистика очереди"""
+    return {"jobs": [job.to_dict() for job in report_jobs.list_jobs(limit)], "stats": report_jobs.stats()}
+
+@app.get("/api/reports/jobs/{job_id}")
+def get_report_job(job_id: int):
+    """Статус задания генерации отчета"""
+    job = report_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return job.to_dict()
+
+@app.get("/api/reports/stream/{period}")
+def stream_report(period: str, fmt: str = Query("csv", alias="format"), compress: bool = False):
+    """
+    Отчет за период для прямого скачивания: строки агрегатов кодируются
+    и отправляются пачками, файл не сохраняется.
+    """
+    start_time, end_time, title_prefix = _report_period(period)
+    _check_report_format(fmt)
+    title = report_engine.report_title(title_prefix, start_time, end_time)
+
+    def stream():
+        # Своя сессия: строки читаются уже после выхода из обработчика
+        db = SessionLocal()
+        try:
+            yield from report_engine.render_report(crud.iter_report_rows(db, start_time, end_time), fmt, title, compress)
+        finally:
+            db.close()
+
+    filename = report_engine.report_filename(f"{period}_{end_time.strftime('%Y%m%d')}", fmt, compress)
+    return StreamingResponse(
+        stream(),
+        media_type=report_engine.media_type(fmt, compress),
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
     )
-    db.add(new_report)
-    db.commit()
-
-    return {
-        "message": "Отчет успешно сгенерирован и сохранен.", 
-        "title": report_title,
-        "file_path": file_path
-    }
 
 @app.get("/api/reports/{report_id}/download")
 def download_report(
@@ -315,20 +548,31 @@ def get_users(db: Session = Depends(get_db)):
     return crud.get_users_for_ui(db)
 
 @app.get("/api/logs", response_model=List[schemas.ActionLogDTO])
-def get_logs(limit: int = 20, db: Session = Depends(get_db)):
-    return crud.get_logs_for_ui(db, limit=limit)
+async def get_logs(
+    response: Response,
+    limit: int = Query(20, ge=1, le=pagination.MAX_PAGE_SIZE),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """История действий, новые первыми; страницы - ?cursor= из X-Next-Cursor"""
+    logs, next_cursor = await crud.get_logs_page_async(db, limit=limit, start=start, end=end, after=_page_key(cursor))
+    if next_cursor:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+    return logs
 
 # -------------------------------------------------------------------
 # 🔔 5. УВЕДОМЛЕНИЯ
 # -------------------------------------------------------------------
 
 @app.get("/api/notifications", response_model=List[schemas.NotificationRead])
-def get_notifications(db: Session = Depends(get_db)):
+async def get_notifications(db: AsyncSession = Depends(get_async_db)):
     """
     Получить список уведомлений.
     """
     # Здесь можно добавить crud.check_notification_completion(db) для авто-закрытия
-    return db.query(models.Notification).filter(models.Notification.is_completed == False).all()
+    return await crud.get_active_notifications_async(db)
 
 @app.post("/api/notifications/{notif_id}/complete")
 def complete_notification(notif_id: int, db: Session = Depends(get_db)):
@@ -351,15 +595,14 @@ def generate_recommendation_from_analysis(db: Session = Depends(get_db)):
     для всех датчиков. Должен вызываться по расписанию (Cloud Scheduler).
     """
     all_sensors = db.query(models.Sensor).all()
-    
-    results = []
-    
-    # Запускаем анализ для каждого датчика
-    for sensor in all_sensors:
-        result = run_anomaly_analysis(sensor.id, db)
-        results.append(result)
-        
-    return {"status": "analysis_completed", "details": results}
+
+    # Рекомендации всех датчиков пишутся одной транзакцией, повторы не дублируются
+    sink = RecommendationSink(db)
+    runs = [_analyze_sensor(sensor, db, sink) for sensor in all_sensors]
+    _flush_recommendations(sink)
+
+    return {"status": "analysis_completed", "details": [_analysis_result(*run) for run in runs],
+            "recommendations": sink.stats()}
 # *******************************************************************
 
 
@@ -376,20 +619,45 @@ def run_anomaly_analysis(
     if not sensor:
         raise HTTPException(status_code=404, detail="Sensor not found")
 
+    sink = RecommendationSink(db)
+    result, pending = _analyze_sensor(sensor, db, sink)
+    _flush_recommendations(sink)
+    return _analysis_result(result, pending)
+
+
+def _flush_recommendations(sink: RecommendationSink):
+    """Записывает рекомендации прогона; новые попадают под автоматическую проверку цели"""
+    for pending in sink.flush():
+        if pending.created:
+            recommendation_verifier.track(pending.id, pending.fields['sensor_id'], pending.fields['target_value'])
+
+
+def _analyze_sensor(sensor: models.Sensor, db: Session, sink: RecommendationSink):
+    """
+    Анализ одного датчика: сохраняет AnomalyAnalysis и ставит рекомендацию в sink.
+
+    Returns:
+        (ответ, PendingRecommendation или None) - id рекомендации появится после sink.flush()
+    """
+    sensor_id = sensor.id
+
     # 1. Получаем данные для анализа (последние 7 дней)
-    measurements = crud.get_sensor_measurements(db, sensor_id, days=7)
-    if not measurements:
-        return {"message": f"Недостаточно данных для анализа датчика {sensor_id}."}
+    with request_metrics.timer("detector_duration_seconds", stage="series"):
+        _, values = series_cache.get_series(db, sensor_id, start=datetime.utcnow() - timedelta(days=7))
+    if not len(values):
+        return {"message": f"Недостаточно данных для анализа датчика {sensor_id}."}, None
 
     # --- ИМИТАЦИЯ РЕЗУЛЬТАТОВ МОДЕЛЕЙ (Заглушки) ---
     
     # Классическая модель (Критерий 2, 3)
-    classical_score = round(random.uniform(0.1, 0.5), 3) # Low confidence
-    classical_is_anomaly = classical_score > 0.4 
+    with request_metrics.timer("detector_duration_seconds", stage="classical"):
+        classical_score = round(random.uniform(0.1, 0.5), 3) # Low confidence
+        classical_is_anomaly = classical_score > 0.4 
 
     # Transformer модель (Критерий 2, 3)
-    transformer_score = round(random.uniform(0.6, 0.9), 3) # High confidence
-    transformer_is_anomaly = transformer_score > 0.7 
+    with request_metrics.timer("detector_duration_seconds", stage="transformer"):
+        transformer_score = round(random.uniform(0.6, 0.9), 3) # High confidence
+        transformer_is_anomaly = transformer_score > 0.7 
     
     # Сравнение
     models_agreement = classical_is_anomaly == transformer_is_anomaly
@@ -414,26 +682,45 @@ def run_anomaly_analysis(
     if transformer_is_anomaly:
         
         # Пример логики для целевого значения
-        current_avg = sum(m.value for m in measurements) / len(measurements)
-        new_target = round(current_avg * (0.95 if sensor.sensor_type.name == "Humidity" else 1.05), 1)
-
-        recommendation = crud.create_intelligent_recommendation(
-            db,
+        current_avg = float(values.mean())
+        sensor_type_name = sensor.sensor_type.name
+        # Цель - из норм датчика (comfort_ranges), без нормы - сдвиг от среднего
+        comfort_target = comfort_ranges.get(db).target_value(sensor_id)
+        new_target = round(comfort_target if comfort_target is not None
+                           else current_avg * (0.95 if sensor_type_name == "Humidity" else 1.05), 1)
+        location_id, analysis_id = sensor.location_id, analysis.id
+        reasoning = "Трансформер-модель обнаружила высокий уровень отклонения от сезонного тренда."
+        with request_metrics.timer("detector_duration_seconds", stage="settle_estimate"):
+            settle_seconds = response_models.estimate_seconds(db, sensor_id, float(values[-1]), new_target)
+        if settle_seconds is not None:
+            estimate = RecommendationGenerator.format_duration(settle_seconds / 3600)
+            reasoning += f" Ожидаемое время выхода на цель: {estimate}."
+
+        pending = sink.add(
             sensor_id=sensor_id,
-            location_id=sensor.location_id,
-            problem_description=f"Обнаружена аномалия в {sensor.sensor_type.name} с уверенностью {transformer_score}",
-            recommended_action=f"Корректировка {sensor.sensor_type.name}",
+            location_id=location_id,
+            problem_description=f"Обнаружена аномалия в {sensor_type_name} с уверенностью {transformer_score}",
+            recommended_action=f"Корректировка {sensor_type_name}",
             target_value=new_target,
-            reasoning="Трансформер-модель обнаружила высокий уровень отклонения от сезонного тренда.",
+            reasoning=reasoning,
             confidence=confidence,
             severity='high' if transformer_score > 0.8 else 'medium',
             priority=5,
-            anomaly_analysis_id=analysis.id # Связываем с анализом
+            anomaly_analysis_id=analysis_id, # Связываем с анализом
+            on_saved=lambda saved: publish_anomaly(location_id, sensor_id, analysis_id, transformer_score, saved.id)
         )
-
-        return {"status": "success", "analysis_id": analysis.id, "recommendation_id": recommendation.id, "message": "Аномалия обнаружена и создана рекомендация."}
+        return {"status": "success", "analysis_id": analysis_id}, pending
         
-    return {"status": "success", "analysis_id": analysis.id, "message": "Анализ завершен, аномалий не обнаружено."}
+    return {"status": "success", "analysis_id": analysis.id, "message": "Анализ завершен, аномалий не обнаружено."}, None
+
+
+def _analysis_result(result: dict, pending) -> dict:
+    """Ответ анализа с id записанной рекомендации"""
+    if pending is None:
+        return result
+    message = ("Аномалия обнаружена и создана рекомендация." if pending.created
+               else "Аномалия обнаружена, открытая рекомендация обновлена.")
+    return {**result, "recommendation_id": pending.id, "recommendation_created": pending.created, "message": message}
 
 
 @app.post("/api/voice/command/{notification_id}", status_code=status.HTTP_201_CREATED)
@@ -441,7 +728,10 @@ def process_voice_command(
     notification_id: int, 
     db: Session = Depends(get_db),
     # Для демонстрации принимаем уже распознанный текст (транскрипт)
-    transcript: str = Body(..., embed=True, example="Подтвердить температуру в Кабинете 2") 
+    transcript: str = Body(..., embed=True, example="Подтвердить температуру в Кабинете 2"),
+    language: str = Body('ru', embed=True, example="ru"),
+    # Уверенность STT, если транскрипт получен от внешнего распознавателя
+    speech_confidence: Optional[float] = Body(None, embed=True, example=0.95)
 ):
     """
     КРИТЕРИЙ 4: Прием и обработка голосовой команды для уведомления.
@@ -452,36 +742,38 @@ def process_voice_command(
     if not notif:
         raise HTTPException(status_code=404, detail="Уведомление не найдено.")
 
-    # --- ИМИТАЦИЯ NLU (Понимание намерения) ---
-    
-    command_type = 'unknown'
+    # --- NLU (Понимание намерения) ---
+    # Парсер нормализует транскрипт и кэширует результат разбора,
+    # поэтому повторяющиеся команды ("да", "отклонить") почти бесплатны
+    parsed = voice_notification_manager.command_parser.parse_command(transcript, language)
+    command_type = parsed['command']
     execution_status = 'failed'
     
-    if "подтвердить" in transcript.lower() or "выполнить" in transcript.lower():
-        command_type = 'confirm'
-        notif.is_completed = True
-        db.commit()
-        execution_status = 'success'
-        
-    elif "отклонить" in transcript.lower() or "отмена" in transcript.lower():
-        command_type = 'reject'
-        execution_status = 'success'
-        
-    elif "отчёт" in transcript.lower() or "доклад" in transcript.lower():
-        command_type = 'request_report'
+    if command_type in (NotificationCommand.CONFIRM.value,
+                        NotificationCommand.REJECT.value,
+                        NotificationCommand.REQUEST_REPORT.value):
         execution_status = 'success'
+    
+    elif command_type != NotificationCommand.UNKNOWN.value:
+        execution_status = 'received'
+
+    voice_event = {
+        'notification_id': notification_id,
+        'transcript': transcript,
+        'command': command_type,
+        'execution_status': execution_status,
+        'detected_language': language,
+        'speech_confidence': speech_confidence,
+        'command_confidence': parsed['confidence'],
+    }
 
     # 1. Сохраняем команду в базу
-    command = crud.create_voice_notification_command(
-        db,
-        notification_id=notification_id,
-        transcript=transcript,
-        command=command_type,
-        # В реальной жизни эти поля заполняются после обработки STT/NLU
-        # speech_confidence и command_confidence должны быть добавлены в models.py
-        # для демонстрации я убираю их отсюда, чтобы не было ошибки.
-        execution_status=execution_status
-    )
+    if command_type == NotificationCommand.CONFIRM.value:
+        # Закрытие уведомления и запись команды - одна транзакция
+        crud.create_voice_notification_command(db, complete_notification=True, **voice_event)
+    else:
+        # Команды, не меняющие состояние, пишутся пачками в фоне
+        voice_event_writer.submit(voice_event)
     
     # 2. Выполняем действие (для подтверждения)
     if command_type == 'confirm':
@@ -493,35 +785,74 @@ def process_voice_command(
 
 
 @app.get("/api/voice/commands", response_model=List[schemas.VoiceNotificationCommandRead])
-def get_voice_commands(db: Session = Depends(get_db)):
-    """Получить список всех голосовых команд."""
-    return crud.get_voice_notification_commands(db)
+def get_voice_commands(
+    response: Response,
+    notification_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=pagination.MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
+    """Получить голосовые команды, новые первыми (страницы - ?cursor= из X-Next-Cursor)."""
+    commands = crud.get_voice_notification_commands(
+        db, notification_id=notification_id, limit=limit + 1, start=start, end=end, after=_page_key(cursor)
+    )
+    return _page(response, commands, limit, lambda command: (command.created_at, command.id))
+
+@app.get("/api/voice/stats")
+def get_voice_stats():
+    """Статистика голосовых команд, кэша разбора и фоновой записи в БД."""
+    stats = voice_notification_manager.get_stats()
+    stats['writer'] = voice_event_writer.stats()
+    return stats
 
 @app.get("/api/analysis/recommendations", response_model=List[schemas.RecommendationWithStatus])
-def get_recommendations(db: Session = Depends(get_db), location_id: Optional[int] = None):
-    """Получить список всех рекомендаций."""
-    
-    recommendations = crud.get_intelligent_recommendations(db, location_id=location_id)
-    
-    # Добавляем данные датчиков и локаций для удобства отображения на фронте
-    result = []
-    for rec in recommendations:
-        sensor = db.query(models.Sensor).filter(models.Sensor.id == rec.sensor_id).first()
-        location = db.query(models.Location).filter(models.Location.id == rec.location_id).first()
-        
-        dto = schemas.RecommendationWithStatus.from_orm(rec)
-        dto.sensor_name = sensor.name if sensor else "Неизвестный датчик"
-        dto.location_name = location.name if location else "Неизвестная локация"
-        
-        result.append(dto)
+def get_recommendations(
+    db: Session = Depends(get_db),
+    location_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=pagination.MAX_PAGE_SIZE)
+):
+    """
+    Получить список рекомендаций (по приоритету, новые первыми).
+
+    Имена датчика, типа и локации загружаются тем же запросом. Следующая
+    страница - ?cursor= из заголовка X-Next-Cursor (keyset, без OFFSET).
+    """
+    after = _page_key(cursor, crud.RECOMMENDATION_CURSOR_TYPES)
+    rows, next_cursor = crud.get_recommendations_page(db, location_id=location_id, after=after, limit=limit)
+
+    result = fast_json.objects_to_dicts((row[0] for row in rows), RECOMMENDATION_FIELDS)
+    for dto, (_, sensor_name, sensor_type, location_name) in zip(result, rows):
+        dto['sensor_name'] = sensor_name or "Неизвестный датчик"
+        dto['sensor_type'] = sensor_type
+        dto['location_name'] = location_name or "Неизвестная локация"
 
-    return result
+    headers = {pagination.NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return FastJSONResponse(result, headers=headers)
+
+
+@app.get("/api/analysis/recommendations/verification")
+def get_recommendation_verification_stats():
+    """Статистика автоматической проверки целевых значений рекомендаций."""
+    return recommendation_verifier.stats()
 
 
 @app.get("/api/analysis/results", response_model=List[schemas.AnomalyAnalysisRead])
-def get_anomaly_results(db: Session = Depends(get_db), location_id: Optional[int] = None):
-    """Получить список всех результатов анализа аномалий."""
-    return crud.get_anomaly_analyses(db, location_id=location_id)
+def get_anomaly_results(
+    db: Session = Depends(get_db),
+    location_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=pagination.MAX_PAGE_SIZE)
+):
+    """Получить результаты анализа аномалий, новые первыми (страницы - ?cursor= из X-Next-Cursor)."""
+    analyses = crud.get_anomaly_analyses(
+        db, location_id=location_id, limit=limit + 1, start=start, end=end, after=_page_key(cursor)
+    )
+    return _fast_page(analyses, limit, lambda analysis: (analysis.created_at, analysis.id), ANALYSIS_FIELDS)
 
 
 # -------------------------------------------------------------------
@@ -546,8 +877,118 @@ def record_measurement(
     
     db.add(db_measurement)
     db.commit()
+    response_cache.invalidate(f"sensor:{sensor.id}")
+    request_metrics.inc("ingested_measurements_total", source="api")
+    # Раздаём показание подписчикам живого потока локации
+    publish_measurement(sensor, db_measurement.value, db_measurement.timestamp)
+    recommendation_verifier.observe(sensor.id, db_measurement.value, db_measurement.timestamp)
     return {"status": "recorded", "value": measurement.value}
 
+@app.post("/api/measurements/batch", status_code=status.HTTP_201_CREATED)
+def record_measurements_batch(
+    measurements: List[schemas.MeasurementBatchItem],
+    db: Session = Depends(get_db)
+):
+    """
+    Пакетная запись измерений одной транзакцией (COPY на PostgreSQL).
+    Измерения неизвестных датчиков пропускаются.
+    """
+    sensor_ids = {m.sensor_id for m in measurements}
+    sensors = {
+        s.id: s for s in db.query(models.Sensor)
+        .options(joinedload(models.Sensor.sensor_type), joinedload(models.Sensor.location))
+        .filter(models.Sensor.id.in_(sensor_ids))
+        .all()
+    }
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            "sensor_id": m.sensor_id,
+            "location_id": sensors[m.sensor_id].location_id,
+            "value": m.value,
+            "timestamp": m.timestamp or now
+        }
+        for m in measurements if m.sensor_id in sensors
+    ]
+    recorded = crud.bulk_insert_measurements(db, rows)
+
+    earliest = {}
+    for row in rows:
+        earliest[row["sensor_id"]] = min(row["timestamp"], earliest.get(row["sensor_id"], row["timestamp"]))
+    for sensor_id, timestamp in earliest.items():
+        series_cache.note_write(sensor_id, timestamp)   # запись задним числом сбрасывает кэш ряда
+    response_cache.invalidate(*(f"sensor:{sensor_id}" for sensor_id in earliest))
+    request_metrics.inc("ingested_measurements_total", recorded, source="batch")
+    for row in sorted(rows, key=lambda r: r["timestamp"]):
+        publish_measurement(sensors[row["sensor_id"]], row["value"], row["timestamp"])
+        recommendation_verifier.observe(row["sensor_id"], row["value"], row["timestamp"])
+    return {"status": "recorded", "recorded": recorded, "skipped": len(measurements) - recorded}
+
+@app.get("/api/export/measurements")
+def export_measurements(
+    fmt: str = Query("parquet", alias="format"),
+    sensor_id: Optional[int] = None,
+    location_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
+    """
+    Потоковая выгрузка истории измерений в Parquet или Arrow IPC stream.
+    Файл отдаётся по row group, не собираясь в памяти целиком.
+    """
+    if fmt not in measurement_export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {measurement_export.FORMATS}")
+    if measurement_export.pa is None:
+        raise HTTPException(status_code=503, detail="pyarrow is not installed")
+
+    def stream():
+        # Своя сессия: ответ читается из БД уже после выхода из обработчика
+        db = SessionLocal()
+        try:
+            yield from measurement_export.iter_export_chunks(
+                db, fmt, sensor_id=sensor_id, location_id=location_id, start=start, end=end
+            )
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        stream(),
+        media_type=measurement_export.MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="measurements.{fmt}"'}
+    )
+
+@app.post("/api/import/measurements", status_code=status.HTTP_201_CREATED)
+async def import_measurements(request: Request, fmt: str = Query("parquet", alias="format")):
+    """
+    Пакетная загрузка измерений из файла Parquet или Arrow IPC (тело запроса).
+    Тело сбрасывается во временный файл, строки пишутся пачками (COPY на PostgreSQL).
+    """
+    if fmt not in measurement_export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {measurement_export.FORMATS}")
+    if measurement_export.pa is None:
+        raise HTTPException(status_code=503, detail="pyarrow is not installed")
+
+    with tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024) as upload:
+        async for chunk in request.stream():
+            upload.write(chunk)
+        upload.seek(0)
+
+        def load():
+            db = SessionLocal()
+            try:
+                return measurement_export.import_measurements(db, upload, fmt)
+            finally:
+                db.close()
+
+        try:
+            result = await run_in_threadpool(load)
+        except ValueError as e:   # в том числе pyarrow.ArrowInvalid
+            raise HTTPException(status_code=400, detail=f"Invalid {fmt} file: {e}")
+    response_cache.invalidate("measurements")
+    request_metrics.inc("ingested_measurements_total", result["imported"], source="import")
+    return {"status": "imported", **result}
+
 @app.post("/api/seed_data")
 def seed_database(db: Session = Depends(get_db)):
     """Генератор данных"""
@@ -613,5 +1054,8 @@ def seed_database(db: Session = Depends(get_db)):
         pass
         
     db.commit()
+    response_cache.clear()
+    # Новые датчики и локации - в снимок норм сразу, не дожидаясь фоновой проверки
+    comfort_ranges.invalidate(db)
     
     return {"message": f"Успешно создано {NEW_ROOMS_COUNT} новых кабинета!"}
\ No newline at end of file
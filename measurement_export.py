@@ -0,0 +1,310 @@
+"""
+Экспорт и импорт истории измерений в Parquet / Arrow IPC.
+
+Экспорт читает историю потоково (crud.iter_measurements: серверный курсор,
+партиции и сжатые блоки) и пишет её пачками по batch_size строк - каждая
+пачка становится row group Parquet или record batch Arrow, поэтому память
+не зависит от длины выгрузки. Импорт читает файл теми же пачками и пишет
+их через crud.bulk_insert_measurements (COPY на PostgreSQL).
+
+Колонки: sensor_id int32, location_id int32, value float64,
+timestamp timestamp[us] (UTC без часового пояса, как в БД).
+
+CLI:
+    python measurement_export.py export history.parquet [--sensor-id 1] [--start 2026-01-01] [--end ...]
+    python measurement_export.py import history.parquet
+Формат определяется по расширению: .parquet / .pq или .arrow / .arrows / .ipc / .feather.
+"""
+
+import argparse
+import os
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy.orm import Session
+
+import crud
+import models
+from database import SessionLocal
+from series_cache import series_cache
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+    print("[WARNING] pyarrow not installed. Parquet/Arrow export and import disabled")
+    print("   Install with: pip install pyarrow")
+
+FORMATS = ("parquet", "arrow")
+MEDIA_TYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+EXTENSIONS = {".parquet": "parquet", ".pq": "parquet",
+              ".arrow": "arrow", ".arrows": "arrow", ".ipc": "arrow", ".feather": "arrow"}
+
+BATCH_SIZE = 65536
+REQUIRED_COLUMNS = ("sensor_id", "value", "timestamp")
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("pyarrow is not installed")
+
+
+def measurement_schema():
+    """Схема выгрузки измерений"""
+    _require_pyarrow()
+    return pa.schema([
+        ("sensor_id", pa.int32()),
+        ("location_id", pa.int32()),
+        ("value", pa.float64()),
+        ("timestamp", pa.timestamp("us")),
+    ])
+
+
+def format_from_path(path: str) -> str:
+    """Формат файла по расширению"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in EXTENSIONS:
+        raise ValueError(f"Unknown file format '{path}', expected one of {sorted(EXTENSIONS)}")
+    return EXTENSIONS[extension]
+
+
+# --- ЭКСПОРТ ---
+
+def iter_record_batches(db: Session,
+                        sensor_id: Optional[int] = None,
+                        location_id: Optional[int] = None,
+                        start: Optional[datetime] = None,
+                        end: Optional[datetime] = None,
+                        batch_size: int = BATCH_SIZE) -> Iterator:
+    """История измерений пачками pyarrow.RecordBatch по batch_size строк"""
+    schema = measurement_schema()
+    rows = []
+    for row in crud.iter_measurements(db, sensor_id, location_id, start, end, chunk_size=batch_size):
+        rows.append(row)
+        if len(rows) == batch_size:
+            yield _to_record_batch(rows, schema)
+            rows = []
+    if rows:
+        yield _to_record_batch(rows, schema)
+
+
+def _to_record_batch(rows: list, schema):
+    _, sensor_ids, location_ids, values, timestamps = zip(*rows)
+    return pa.record_batch([
+        pa.array(sensor_ids, type=pa.int32()),
+        pa.array(location_ids, type=pa.int32()),
+        pa.array(values, type=pa.float64()),
+        pa.array(timestamps, type=pa.timestamp("us")),
+    ], schema=schema)
+
+
+def _open_writer(sink, fmt: str, schema):
+    if fmt == "parquet":
+        return pq.ParquetWriter(sink, schema, compression="zstd")
+    if fmt == "arrow":
+        return pa.ipc.new_stream(sink, schema)
+    raise ValueError(f"Unknown format '{fmt}', expected one of {FORMATS}")
+
+
+def write_measurements(db: Session, sink, fmt: str = "parquet", **filters) -> int:
+    """
+    Пишет историю измерений в файл.
+
+    Args:
+        db: Сессия БД
+        sink: Путь или бинарный файловый объект
+        fmt: 'parquet' или 'arrow' (Arrow IPC stream)
+        **filters: sensor_id, location_id, start, end, batch_size
+
+    Returns:
+        Количество выгруженных измерений
+    """
+    writer = _open_writer(sink, fmt, measurement_schema())
+    rows = 0
+    try:
+        for batch in iter_record_batches(db, **filters):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    finally:
+        writer.close()
+    return rows
+
+
+class _ChunkBuffer:
+    """Файловый объект для записи: байты копятся до выдачи клиенту"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_export_chunks(db: Session, fmt: str = "parquet", **filters) -> Iterator[bytes]:
+    """Байты файла выгрузки по мере готовности каждой пачки (для StreamingResponse)"""
+    buffer = _ChunkBuffer()
+    writer = _open_writer(buffer, fmt, measurement_schema())
+    try:
+        for batch in iter_record_batches(db, **filters):
+            writer.write_batch(batch)
+            yield buffer.drain()
+    finally:
+        writer.close()
+    yield buffer.drain()
+
+
+# --- ИМПОРТ ---
+
+def iter_file_batches(source, fmt: str = "parquet", batch_size: int = BATCH_SIZE) -> Iterator:
+    """Пачки pyarrow.RecordBatch из файла Parquet или Arrow IPC (stream или file)"""
+    _require_pyarrow()
+    if fmt == "parquet":
+        yield from pq.ParquetFile(source).iter_batches(batch_size=batch_size)
+        return
+    if fmt != "arrow":
+        raise ValueError(f"Unknown format '{fmt}', expected one of {FORMATS}")
+
+    stream = pa.OSFile(source) if isinstance(source, str) else pa.PythonFile(source, mode="r")
+    if stream.read(6) == b"ARROW1":   # формат файла (Feather v2)
+        stream.seek(0)
+        reader = pa.ipc.open_file(stream)
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i)
+        return
+    stream.seek(0)
+    yield from pa.ipc.open_stream(stream)
+
+
+def _normalize_batch(batch) -> Dict[str, list]:
+    """Колонки пачки в виде списков Python с приведением типов к схеме БД"""
+    missing = [name for name in REQUIRED_COLUMNS if name not in batch.schema.names]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+    timestamps = batch.column("timestamp")
+    if not pa.types.is_timestamp(timestamps.type):
+        raise ValueError(f"Column 'timestamp' must be a timestamp, got {timestamps.type}")
+    # С часовым поясом значения уже в UTC: снимаем пояс, приводим единицы к мкс
+    timestamps = timestamps.cast(pa.timestamp("us", tz=timestamps.type.tz), safe=False).cast(pa.timestamp("us"))
+
+    columns = {
+        "sensor_id": batch.column("sensor_id").cast(pa.int64()).to_pylist(),
+        "value": batch.column("value").cast(pa.float64()).to_pylist(),
+        "timestamp": timestamps.to_pylist(),
+    }
+    if "location_id" in batch.schema.names:
+        columns["location_id"] = batch.column("location_id").cast(pa.int64()).to_pylist()
+    return columns
+
+
+def import_measurements(db: Session, source, fmt: str = "parquet", batch_size: int = BATCH_SIZE) -> Dict:
+    """
+    Загружает измерения из файла пачками через bulk_insert_measurements.
+    Строки неизвестных датчиков и без значения пропускаются; пустой
+    location_id берётся из датчика.
+
+    Returns:
+        {'imported': int, 'skipped': int}
+    """
+    sensor_locations = dict(db.query(models.Sensor.id, models.Sensor.location_id).all())
+    imported = skipped = 0
+    earliest: Dict[int, datetime] = {}
+
+    for batch in iter_file_batches(source, fmt, batch_size):
+        columns = _normalize_batch(batch)
+        locations = columns.get("location_id") or [None] * batch.num_rows
+        rows = []
+        for sensor_id, location_id, value, timestamp in zip(
+                columns["sensor_id"], locations, columns["value"], columns["timestamp"]):
+            if sensor_id not in sensor_locations or value is None or timestamp is None:
+                skipped += 1
+                continue
+            rows.append({
+                "sensor_id": sensor_id,
+                "location_id": location_id if location_id is not None else sensor_locations[sensor_id],
+                "value": value,
+                "timestamp": timestamp,
+            })
+            if sensor_id not in earliest or timestamp < earliest[sensor_id]:
+                earliest[sensor_id] = timestamp
+        imported += crud.bulk_insert_measurements(db, rows)
+
+    # Импорт пишет историю задним числом
+    for sensor_id, timestamp in earliest.items():
+        series_cache.note_write(sensor_id, timestamp)
+    return {'imported': imported, 'skipped': skipped}
+
+
+# --- CLI ---
+
+def _parse_datetime(value: str) -> datetime:
+    return datetime.fromisoformat(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measurement history export/import (Parquet, Arrow IPC)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Write measurements to a file")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--sensor-id", type=int)
+    export_parser.add_argument("--location-id", type=int)
+    export_parser.add_argument("--start", type=_parse_datetime, help="ISO date/time (UTC)")
+    export_parser.add_argument("--end", type=_parse_datetime, help="ISO date/time (UTC), exclusive")
+    export_parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    import_parser = commands.add_parser("import", help="Load measurements from a file")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    args = parser.parse_args()
+    _require_pyarrow()
+
+    try:
+        fmt = format_from_path(args.path)
+    except ValueError as e:
+        parser.error(str(e))
+    started = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        if args.command == "export":
+            rows = write_measurements(
+                db, args.path, fmt,
+                sensor_id=args.sensor_id, location_id=args.location_id,
+                start=args.start, end=args.end, batch_size=args.batch_size
+            )
+            print(f"Exported {rows} measurements to {args.path}")
+        else:
+            result = import_measurements(db, args.path, fmt, batch_size=args.batch_size)
+            print(f"Imported {result['imported']} measurements from {args.path} (skipped {result['skipped']})")
+    finally:
+        db.close()
+    print(f"Done in {(datetime.utcnow() - started).total_seconds():.1f} s")
+
+
+if __name__ == "__main__":
+    main()
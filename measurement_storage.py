@@ -0,0 +1,317 @@
+"""
+Партиционирование измерений по времени и политика хранения.
+
+Таблица measurements остаётся "горячей" партицией: в неё пишутся все
+новые измерения, и её индексы покрывают только последние дни.
+Политика хранения периодически:
+1. сжимает: сутки старше block_days сворачиваются в колоночные блоки
+   measurement_blocks (block_store.py); block_days=0 отключает этот шаг
+2. архивирует: полные месяцы старше hot_days, оставшиеся строками,
+   переносятся в месячные таблицы measurements_YYYYMM (одинаково для
+   SQLite и PostgreSQL) и регистрируются в measurement_partitions
+3. прореживает: партиции и блоки, целиком старше raw_days, сворачиваются
+   в почасовые агрегаты measurement_rollups; партиции удаляются целиком
+   (DROP TABLE вместо DELETE по миллионам строк)
+
+Запросы в crud.py выбирают по реестру только партиции, пересекающие
+запрошенный интервал (partition pruning).
+"""
+
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import (Column, DateTime, Float, Index, Integer, MetaData, Table,
+                        delete, func, insert, select)
+from sqlalchemy.orm import Session
+
+import block_store
+import models
+from database import SessionLocal
+
+# Сжатие в блоки, горячее окно строк и полный срок хранения сырых данных (дни)
+BLOCK_DAYS = int(os.environ.get("MEASUREMENT_BLOCK_DAYS", 1))
+HOT_DAYS = int(os.environ.get("MEASUREMENT_HOT_DAYS", 31))
+RAW_DAYS = int(os.environ.get("MEASUREMENT_RAW_DAYS", 180))
+
+# Партиции не входят в Base.metadata: их создаёт политика хранения
+partition_metadata = MetaData()
+_partition_lock = threading.Lock()
+
+
+def day_floor(moment: datetime) -> datetime:
+    """Начало суток"""
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def month_floor(moment: datetime) -> datetime:
+    """Начало месяца"""
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(month_start: datetime) -> datetime:
+    """Начало следующего месяца"""
+    return (month_start + timedelta(days=32)).replace(day=1)
+
+
+def partition_name(month_start: datetime) -> str:
+    """measurements_YYYYMM"""
+    return f"{models.Measurement.__tablename__}_{month_start:%Y%m}"
+
+
+def partition_table(name: str) -> Table:
+    """Описание таблицы месячной партиции (структура как у measurements)"""
+    table = partition_metadata.tables.get(name)
+    if table is not None:
+        return table
+    with _partition_lock:
+        table = partition_metadata.tables.get(name)
+        if table is None:
+            table = Table(
+                name, partition_metadata,
+                Column("id", Integer, primary_key=True),
+                Column("sensor_id", Integer),
+                Column("location_id", Integer),
+                Column("value", Float, nullable=False),
+                Column("timestamp", DateTime),
+                Index(f"ix_{name}_sensor_timestamp", "sensor_id", "timestamp"),
+            )
+    return table
+
+
+def hour_bucket(column, dialect_name: str):
+    """Начало часа для timestamp в SQL"""
+    if dialect_name == "postgresql":
+        return func.date_trunc("hour", column)
+    # SQLite хранит DateTime строкой "YYYY-MM-DD HH:MM:SS.ffffff"
+    return func.strftime("%Y-%m-%d %H:00:00.000000", column)
+
+
+class MeasurementRetention:
+    """Движок политики хранения: сжатие в блоки, архивирование по месяцам и прореживание"""
+
+    def __init__(self,
+                 session_factory=SessionLocal,
+                 block_days: int = BLOCK_DAYS,
+                 hot_days: int = HOT_DAYS,
+                 raw_days: int = RAW_DAYS,
+                 interval: float = 3600.0):
+        """
+        Args:
+            session_factory: Фабрика сессий БД
+            block_days: Через сколько дней строки сжимаются в блоки (0 - не сжимать)
+            hot_days: Сколько дней сырые данные остаются в measurements
+            raw_days: Сколько дней хранятся сырые данные (дальше - почасовые агрегаты)
+            interval: Период запуска политики (секунды)
+        """
+        if raw_days < hot_days or raw_days < block_days:
+            raise ValueError("raw_days must be >= hot_days and block_days")
+        self.session_factory = session_factory
+        self.block_days = block_days
+        self.hot_days = hot_days
+        self.raw_days = raw_days
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._run_lock = threading.Lock()
+
+        self.compacted_rows = 0
+        self.archived_rows = 0
+        self.rolled_up_rows = 0
+        self.dropped_partitions = 0
+        self.failed = 0
+
+    def start(self):
+        """Запускает периодическое применение политики"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="measurement-retention", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Останавливает поток политики"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def run_once(self, now: Optional[datetime] = None) -> Dict:
+        """
+        Применяет политику: сжатие, архивирование, затем прореживание.
+
+        Returns:
+            {'compacted': int, 'archived': int, 'rolled_up': int, 'dropped': List[str]}
+        """
+        now = now or datetime.utcnow()
+        with self._run_lock:
+            db = self.session_factory()
+            try:
+                compacted = 0
+                if self.block_days > 0:
+                    compacted = self.compact(db, day_floor(now - timedelta(days=self.block_days)))
+                archived = self.archive(db, month_floor(now - timedelta(days=self.hot_days)))
+                raw_cutoff = now - timedelta(days=self.raw_days)
+                rolled_up, dropped = self.roll_up(db, raw_cutoff)
+                blocks_rolled_up = block_store.roll_up_blocks(db, raw_cutoff)
+                self.rolled_up_rows += blocks_rolled_up
+                rolled_up += blocks_rolled_up
+            except Exception as e:
+                db.rollback()
+                self.failed += 1
+                print(f"❌ ERROR: Measurement retention failed: {e}")
+                raise
+            finally:
+                db.close()
+        return {'compacted': compacted, 'archived': archived, 'rolled_up': rolled_up, 'dropped': dropped}
+
+    def compact(self, db: Session, cutoff: datetime) -> int:
+        """
+        Сжимает сырые строки старше cutoff (начало суток) в суточные блоки.
+        Каждые сутки - отдельная транзакция.
+
+        Returns:
+            Количество сжатых строк
+        """
+        hot = models.Measurement.__table__
+        older = hot.c.timestamp < cutoff
+        # Один GROUP BY по горячей таблице на прогон, а не на каждые сутки
+        newest_keys = block_store.newest_row_keys(db, hot, cutoff)
+        keep = block_store.except_rows(hot, newest_keys)
+        if keep is not None:
+            older = older & keep        # последние строки молчащих датчиков остаются
+        oldest = db.execute(select(func.min(hot.c.timestamp)).where(older)).scalar()
+        if oldest is None:
+            return 0
+
+        compacted = 0
+        day = day_floor(oldest)
+        while day < cutoff:
+            end = day + timedelta(days=1)
+            compacted += block_store.compact_range(db, day, end, newest_keys)
+            day = end
+
+        self.compacted_rows += compacted
+        return compacted
+
+    def archive(self, db: Session, cutoff: datetime) -> int:
+        """
+        Переносит сырые измерения старше cutoff (начало месяца) из
+        measurements в месячные партиции. Каждый месяц - отдельная транзакция.
+        Последняя строка каждого датчика остаётся в measurements
+        (block_store.newest_row_keys).
+
+        Returns:
+            Количество перенесённых строк
+        """
+        hot = models.Measurement.__table__
+        newest_keys = block_store.newest_row_keys(db, hot, cutoff)
+        keep = block_store.except_rows(hot, newest_keys)
+        older = hot.c.timestamp < cutoff
+        if keep is not None:
+            older = older & keep
+        oldest = db.execute(select(func.min(hot.c.timestamp)).where(older)).scalar()
+        if oldest is None:
+            return 0
+
+        moved = 0
+        month = month_floor(oldest)
+        while month < cutoff:
+            end = next_month(month)
+            in_month = (hot.c.timestamp >= month) & (hot.c.timestamp < end)
+            keep_month = block_store.except_rows(hot, newest_keys, month, end)
+            if keep_month is not None:
+                in_month = in_month & keep_month
+            columns = [hot.c.id, hot.c.sensor_id, hot.c.location_id, hot.c.value, hot.c.timestamp]
+
+            table = self._ensure_partition(db, month, end)
+            result = db.execute(
+                insert(table).from_select([c.name for c in columns], select(*columns).where(in_month))
+            )
+            db.execute(delete(hot).where(in_month))
+            count = result.rowcount or 0
+            db.query(models.MeasurementPartition).filter(
+                models.MeasurementPartition.table_name == table.name
+            ).update({models.MeasurementPartition.row_count: models.MeasurementPartition.row_count + count})
+            db.commit()
+
+            moved += count
+            month = end
+
+        self.archived_rows += moved
+        return moved
+
+    def roll_up(self, db: Session, cutoff: datetime):
+        """
+        Сворачивает партиции, целиком старше cutoff, в почасовые агрегаты
+        и удаляет их.
+
+        Returns:
+            (количество свёрнутых строк, список удалённых таблиц)
+        """
+        expired = db.query(models.MeasurementPartition).filter(
+            models.MeasurementPartition.range_end <= cutoff
+        ).order_by(models.MeasurementPartition.range_start).all()
+
+        rolled_up = 0
+        dropped = []
+        bind = db.get_bind()
+        for partition in expired:
+            table = partition_table(partition.table_name)
+            bucket = hour_bucket(table.c.timestamp, bind.dialect.name)
+            db.execute(
+                insert(models.MeasurementRollup).from_select(
+                    ["sensor_id", "location_id", "bucket_start",
+                     "sample_count", "value_sum", "value_min", "value_max"],
+                    select(
+                        table.c.sensor_id, table.c.location_id, bucket,
+                        func.count(), func.sum(table.c.value), func.min(table.c.value), func.max(table.c.value)
+                    ).group_by(table.c.sensor_id, table.c.location_id, bucket)
+                )
+            )
+            rolled_up += partition.row_count or 0
+            db.delete(partition)
+            table.drop(db.connection(), checkfirst=True)
+            db.commit()
+            dropped.append(partition.table_name)
+
+        self.rolled_up_rows += rolled_up
+        self.dropped_partitions += len(dropped)
+        return rolled_up, dropped
+
+    def stats(self) -> Dict:
+        """Счётчики политики хранения"""
+        return {
+            'block_days': self.block_days,
+            'hot_days': self.hot_days,
+            'raw_days': self.raw_days,
+            'compacted_rows': self.compacted_rows,
+            'archived_rows': self.archived_rows,
+            'rolled_up_rows': self.rolled_up_rows,
+            'dropped_partitions': self.dropped_partitions,
+            'failed': self.failed
+        }
+
+    def _ensure_partition(self, db: Session, month: datetime, end: datetime) -> Table:
+        """Создаёт таблицу партиции и запись в реестре, если их нет"""
+        table = partition_table(partition_name(month))
+        table.create(db.connection(), checkfirst=True)
+        exists = db.query(models.MeasurementPartition.id).filter(
+            models.MeasurementPartition.table_name == table.name
+        ).first()
+        if not exists:
+            db.add(models.MeasurementPartition(table_name=table.name, range_start=month, range_end=end, row_count=0))
+            db.flush()
+        return table
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                pass  # уже записано в run_once, следующая попытка через interval
+
+
+# Глобальная политика хранения для использования в приложении
+measurement_retention = MeasurementRetention()
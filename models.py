@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -28,6 +28,11 @@ class ActionLog(Base):
 
     user = relationship("User", back_populates="logs")
 
+    __table_args__ = (
+        # История действий, новые первыми: keyset-пагинация по (timestamp, id)
+        Index("ix_action_logs_timestamp_id", "timestamp", "id"),
+    )
+
 # --- 2. ЛОКАЦИИ И ТИПЫ ДАТЧИКОВ ---
 
 class Location(Base):
@@ -51,6 +56,29 @@ class SensorType(Base):
 
     sensors = relationship("Sensor", back_populates="sensor_type")
 
+class ComfortRange(Base):
+    """
+    Нормальный диапазон и цель для типа датчика - на локацию или на тип помещения.
+    Приоритет: локация -> тип помещения -> RecommendationGenerator.NORMAL_RANGES.
+    """
+    __tablename__ = "comfort_ranges"
+
+    id = Column(Integer, primary_key=True, index=True)
+    location_id = Column(Integer, ForeignKey("locations.id"), nullable=True)
+    room_type = Column(String, nullable=True)
+    sensor_type_id = Column(Integer, ForeignKey("sensor_types.id"), nullable=False)
+    min_value = Column(Float, nullable=False)
+    max_value = Column(Float, nullable=False)
+    target_value = Column(Float, nullable=True)   # None - середина диапазона
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    location = relationship("Location")
+    sensor_type = relationship("SensorType")
+
+    __table_args__ = (
+        Index("ix_comfort_ranges_scope", "location_id", "room_type", "sensor_type_id"),
+    )
+
 # --- 3. ДАТЧИКИ И ИЗМЕРЕНИЯ (Скрины 1 и 4) ---
 
 class Sensor(Base):
@@ -90,6 +118,113 @@ class Measurement(Base):
     sensor = relationship("Sensor", back_populates="measurements")
     location = relationship("Location", back_populates="measurements")
 
+    __table_args__ = (
+        # Как в партициях: история датчика и keyset-пагинация по (timestamp, id)
+        Index("ix_measurements_sensor_timestamp", "sensor_id", "timestamp"),
+    )
+
+# BRIN-индекс по времени (только PostgreSQL): измерения пишутся по порядку,
+# поэтому страницы таблицы упорядочены по timestamp и индекс занимает
+# килобайты вместо размера B-tree, оставаясь эффективным для диапазонов.
+Index(
+    "ix_measurements_timestamp_brin",
+    Measurement.timestamp,
+    postgresql_using="brin"
+).ddl_if(dialect="postgresql")
+
+
+class MeasurementPartition(Base):
+    """Реестр месячных партиций сырых измерений (measurements_YYYYMM)"""
+    __tablename__ = "measurement_partitions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    table_name = Column(String, unique=True, nullable=False)
+    range_start = Column(DateTime, nullable=False, index=True)  # включительно
+    range_end = Column(DateTime, nullable=False)                # не включительно
+    row_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class MeasurementRollup(Base):
+    """Почасовые агрегаты измерений, оставшиеся после удаления сырых партиций"""
+    __tablename__ = "measurement_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sensor_id = Column(Integer, ForeignKey("sensors.id"))
+    location_id = Column(Integer, ForeignKey("locations.id"))
+    bucket_start = Column(DateTime, nullable=False)
+    sample_count = Column(Integer, nullable=False)
+    value_sum = Column(Float, nullable=False)
+    value_min = Column(Float, nullable=False)
+    value_max = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index("ix_measurement_rollups_sensor_bucket", "sensor_id", "bucket_start"),
+    )
+
+
+class MeasurementBlock(Base):
+    """
+    Сжатый колоночный блок холодной истории одного датчика за сутки.
+    Агрегаты блока позволяют строить отчёты и графики без распаковки.
+    """
+    __tablename__ = "measurement_blocks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sensor_id = Column(Integer, ForeignKey("sensors.id"))
+    location_id = Column(Integer, ForeignKey("locations.id"))
+    start_ts = Column(DateTime, nullable=False)   # первое измерение блока
+    end_ts = Column(DateTime, nullable=False)     # последнее измерение блока
+    sample_count = Column(Integer, nullable=False)
+    value_sum = Column(Float, nullable=False)
+    value_min = Column(Float, nullable=False)
+    value_max = Column(Float, nullable=False)
+    codec = Column(String, nullable=False)
+    timestamps = Column(LargeBinary, nullable=False)
+    values = Column(LargeBinary, nullable=False)
+
+    __table_args__ = (
+        Index("ix_measurement_blocks_sensor_start", "sensor_id", "start_ts"),
+    )
+
+class SensorTargetChange(Base):
+    """
+    Изменение целевого значения датчика (слайдер). Структурная пара
+    к текстовой записи ActionLog - по ней подбирается модель отклика.
+    """
+    __tablename__ = "sensor_target_changes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sensor_id = Column(Integer, ForeignKey("sensors.id"), nullable=False)
+    action_log_id = Column(Integer, ForeignKey("action_logs.id"), nullable=True)
+    old_target = Column(Float, nullable=True)
+    new_target = Column(Float, nullable=False)
+    changed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    action_log = relationship("ActionLog")
+
+    __table_args__ = (
+        Index("ix_sensor_target_changes_sensor_changed", "sensor_id", "changed_at"),
+    )
+
+
+class SensorResponseModel(Base):
+    """
+    Модель отклика датчика на смену цели: экспоненциальный выход
+    y(t) = target + (y0 - target) * exp(-t / time_constant).
+    Хранит суммы МНК, чтобы подгонка дополнялась новыми событиями.
+    """
+    __tablename__ = "sensor_response_models"
+
+    sensor_id = Column(Integer, ForeignKey("sensors.id"), primary_key=True)
+    time_constant = Column(Float, nullable=True)   # секунды
+    sum_t_log = Column(Float, nullable=False, default=0.0)
+    sum_t2 = Column(Float, nullable=False, default=0.0)
+    samples = Column(Integer, nullable=False, default=0)
+    events = Column(Integer, nullable=False, default=0)
+    fitted_through = Column(DateTime, nullable=True)   # последнее учтённое изменение цели
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
 # --- 4. УВЕДОМЛЕНИЯ (Скрин 1) ---
 
 class Notification(Base):
@@ -155,6 +290,10 @@ class AnomalyAnalysis(Base):
     sensor = relationship("Sensor")
     location = relationship("Location")
 
+    __table_args__ = (
+        Index("ix_anomaly_analyses_created_id", "created_at", "id"),
+    )
+
 
 # --- 7. ИНТЕЛЛЕКТУАЛЬНЫЕ РЕКОМЕНДАЦИИ ---
 
@@ -181,13 +320,13 @@ class IntelligentRecommendation(Base):
     reasoning = Column(String)  # Объяснение почему эта рекомендация
     confidence = Column(Float)  # Уверенность в рекомендации 0-1
     severity = Column(String, default='low')  # low, medium, high, critical
-    priority = Column(Integer, default=1)  # 1-5, где 5 = критично
+    priority = Column(Integer, default=1, nullable=False)  # 1-5, где 5 = критично; ключ страниц списка
     
     # Статус выполнения (интеграция с уведомлением)
     notification_id = Column(Integer, ForeignKey("notifications.id"), nullable=True)
     is_implemented = Column(Boolean, default=False)
     
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     implemented_at = Column(DateTime, nullable=True)
     
     anomaly = relationship("AnomalyAnalysis")
@@ -195,6 +334,11 @@ class IntelligentRecommendation(Base):
     location = relationship("Location")
     notification = relationship("Notification")
 
+    __table_args__ = (
+        # Порядок списка рекомендаций и keyset-пагинация по нему
+        Index("ix_recommendations_priority_created", "priority", "created_at", "id"),
+    )
+
 
 # --- 8. ГОЛОСОВЫЕ КОМАНДЫ (Для управления уведомлениями) ---
 
@@ -224,4 +368,8 @@ class VoiceNotificationCommand(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     notification = relationship("Notification")
-    user = relationship("User")
\ No newline at end of file
+    user = relationship("User")
+
+    __table_args__ = (
+        Index("ix_voice_notification_commands_created_id", "created_at", "id"),
+    )
\ No newline at end of file
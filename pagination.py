@@ -0,0 +1,88 @@
+"""
+Keyset-пагинация списков API.
+
+Вместо OFFSET, который заставляет БД пролистать все предыдущие страницы,
+следующая страница начинается строго после ключа сортировки последней
+строки: WHERE (k1, k2, id) < (:k1, :k2, :id) ORDER BY k1 DESC, k2 DESC,
+id DESC - поиск по индексу, стоимость страницы не зависит от глубины.
+
+Курсор - непрозрачная строка (base64 от JSON ключа последней строки);
+клиент получает его в заголовке X-Next-Cursor и передаёт в ?cursor=.
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Optional, Sequence, Tuple
+
+from sqlalchemy import tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+MAX_PAGE_SIZE = 500
+# Типы частей курсора для списков "новые первыми": (время, id)
+TIME_KEY_TYPES = (datetime, int)
+
+
+def encode_cursor(*key) -> str:
+    """Курсор из ключа сортировки последней строки страницы"""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in key]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, types: Sequence[type]) -> Tuple:
+    """
+    Ключ из курсора; types - типы частей ключа (datetime, int, float, str).
+
+    Raises:
+        ValueError: курсор повреждён или не соответствует ключу
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if not isinstance(payload, list) or len(payload) != len(types):
+        raise ValueError("Invalid cursor: key length mismatch")
+    try:
+        return tuple(datetime.fromisoformat(value) if kind is datetime else kind(value)
+                     for kind, value in zip(types, payload))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def after(columns: Sequence, key: Optional[Tuple]):
+    """Условие "строго после key" для сортировки columns по убыванию (None - первая страница)"""
+    if key is None:
+        return None
+    return tuple_(*columns) < tuple_(*key)
+
+
+def page_query(query, columns: Sequence, key: Optional[Tuple], limit: int):
+    """Сортировка по columns по убыванию, строки после key, не больше limit"""
+    condition = after(columns, key)
+    if condition is not None:
+        query = query.where(condition)
+    return query.order_by(*(column.desc() for column in columns)).limit(limit)
+
+
+def time_window(query, column, start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """Фильтр [start, end) по колонке времени"""
+    if start is not None:
+        query = query.where(column >= start)
+    if end is not None:
+        query = query.where(column < end)
+    return query
+
+
+def split_page(rows: list, limit: int, key_of) -> Tuple[list, Optional[str]]:
+    """
+    Делит limit + 1 прочитанных строк (лишняя - признак следующей страницы)
+    на страницу и курсор следующей.
+
+    Returns:
+        (строки страницы, курсор или None, если страница последняя)
+    """
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(*key_of(page[-1]))
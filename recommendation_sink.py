@@ -0,0 +1,85 @@
+"""
+Пакетная запись рекомендаций движка с дедупликацией.
+
+Анализ всех датчиков раньше сохранял каждую рекомендацию отдельным
+commit + refresh, а повторные прогоны плодили одинаковые открытые
+рекомендации. Sink копит рекомендации прогона и пишет их одной
+транзакцией через crud.save_recommendations:
+- пока по ключу (датчик, действие, цель) есть невыполненная
+  рекомендация, новая не создаётся - обновляется существующая,
+  поэтому таблица растёт только на действительно новые проблемы;
+- новой рекомендации в той же транзакции создаётся уведомление.
+"""
+
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+import crud
+
+
+class PendingRecommendation:
+    """Рекомендация, ожидающая записи; id и created заполняются при flush"""
+
+    def __init__(self, fields: Dict, on_saved: Optional[Callable] = None):
+        self.fields = fields
+        self.on_saved = on_saved
+        self.id: Optional[int] = None
+        self.created: Optional[bool] = None
+
+    @property
+    def saved(self) -> bool:
+        return self.id is not None
+
+
+class RecommendationSink:
+    """Накопитель рекомендаций одного прогона анализа"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self._pending: List[PendingRecommendation] = []
+
+        self.created = 0
+        self.suppressed = 0
+        self.flushes = 0
+
+    def add(self, on_saved: Optional[Callable] = None, **fields) -> PendingRecommendation:
+        """
+        Добавляет рекомендацию (поля crud.RECOMMENDATION_FIELDS).
+
+        Args:
+            on_saved: Вызывается с PendingRecommendation после записи
+
+        Returns:
+            PendingRecommendation - id появится после flush()
+        """
+        pending = PendingRecommendation(fields, on_saved)
+        self._pending.append(pending)
+        return pending
+
+    def flush(self) -> List[PendingRecommendation]:
+        """Пишет накопленные рекомендации одной транзакцией"""
+        pending, self._pending = self._pending, []
+        if not pending:
+            return []
+        results = crud.save_recommendations(self.db, [p.fields for p in pending])
+        self.flushes += 1
+        for item, (recommendation_id, created) in zip(pending, results):
+            item.id, item.created = recommendation_id, created
+            if created:
+                self.created += 1
+            else:
+                self.suppressed += 1
+        for item in pending:
+            if item.on_saved:
+                item.on_saved(item)
+        return pending
+
+    def stats(self) -> Dict:
+        """Статистика записи"""
+        return {
+            'pending': len(self._pending),
+            'created': self.created,
+            'suppressed': self.suppressed,
+            'flushes': self.flushes
+        }
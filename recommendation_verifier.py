@@ -0,0 +1,186 @@
+"""
+Автоматическая проверка выполнения рекомендаций по потоку показаний.
+
+Рекомендация считается выполненной, когда датчик дошёл до target_value.
+Вместо периодического просмотра всей таблицы рекомендаций верификатор
+держит невыполненные рекомендации в памяти по sensor_id (загружаются
+один раз при старте, новые добавляются через track) и проверяет каждое
+новое показание - O(1) поиск по словарю на измерение.
+
+Гистерезис: цель достигнута после confirm_readings показаний подряд
+в пределах tolerance от цели; серия сбрасывается, только если значение
+ушло дальше 2 × tolerance, поэтому шум на границе допуска не
+перезапускает счёт.
+
+Выполненные рекомендации копятся и фоновым потоком раз в flush_interval
+записываются одной транзакцией (crud.complete_recommendations):
+is_implemented, implemented_at и закрытие связанного уведомления.
+"""
+
+import os
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import crud
+from database import SessionLocal
+
+VERIFY_TOLERANCE = float(os.environ.get("RECOMMENDATION_VERIFY_TOLERANCE", 0.5))
+VERIFY_READINGS = int(os.environ.get("RECOMMENDATION_VERIFY_READINGS", 3))
+
+
+class OpenRecommendation:
+    """Невыполненная рекомендация в индексе верификатора"""
+
+    __slots__ = ("id", "target", "created_at", "streak")
+
+    def __init__(self, recommendation_id: int, target: float, created_at: Optional[datetime]):
+        self.id = recommendation_id
+        self.target = target
+        self.created_at = created_at
+        self.streak = 0
+
+
+class RecommendationVerifier:
+    """Событийная проверка достижения target_value по новым показаниям"""
+
+    def __init__(self,
+                 session_factory: Callable = SessionLocal,
+                 tolerance: float = VERIFY_TOLERANCE,
+                 confirm_readings: int = VERIFY_READINGS,
+                 flush_interval: float = 1.0):
+        """
+        Args:
+            session_factory: Фабрика сессий БД
+            tolerance: Допуск вокруг целевого значения (в единицах датчика)
+            confirm_readings: Сколько показаний подряд в допуске подтверждают выполнение
+            flush_interval: Период записи выполненных рекомендаций (секунды)
+        """
+        self.session_factory = session_factory
+        self.tolerance = tolerance
+        self.confirm_readings = confirm_readings
+        self.flush_interval = flush_interval
+        self._open: Dict[int, Dict[int, OpenRecommendation]] = {}
+        self._completed: List[Tuple[int, datetime]] = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.observed = 0
+        self.verified = 0
+        self.written = 0
+        self.failed = 0
+
+    def load(self, db=None):
+        """Загружает невыполненные рекомендации из БД (один запрос при старте)"""
+        own_session = db is None
+        db = db or self.session_factory()
+        try:
+            rows = crud.get_open_recommendation_targets(db)
+        finally:
+            if own_session:
+                db.close()
+        with self._lock:
+            self._open = {}
+            for recommendation_id, sensor_id, target, created_at in rows:
+                self._open.setdefault(sensor_id, {})[recommendation_id] = \
+                    OpenRecommendation(recommendation_id, target, created_at)
+        return len(rows)
+
+    def track(self, recommendation_id: int, sensor_id: int, target: Optional[float],
+              created_at: Optional[datetime] = None):
+        """Добавляет новую рекомендацию в индекс"""
+        if target is None:
+            return
+        with self._lock:
+            self._open.setdefault(sensor_id, {})[recommendation_id] = \
+                OpenRecommendation(recommendation_id, target, created_at or datetime.utcnow())
+
+    def observe(self, sensor_id: int, value: float, timestamp: Optional[datetime] = None):
+        """Проверяет новое показание датчика против открытых рекомендаций"""
+        if sensor_id not in self._open:
+            return
+        timestamp = timestamp or datetime.utcnow()
+        with self._lock:
+            recommendations = self._open.get(sensor_id)
+            if not recommendations:
+                return
+            self.observed += 1
+            for recommendation in list(recommendations.values()):
+                # Показания до создания рекомендации (запись задним числом) не считаются
+                if recommendation.created_at is not None and timestamp < recommendation.created_at:
+                    continue
+                distance = abs(value - recommendation.target)
+                if distance <= self.tolerance:
+                    recommendation.streak += 1
+                elif distance > 2 * self.tolerance:
+                    recommendation.streak = 0
+                if recommendation.streak >= self.confirm_readings:
+                    del recommendations[recommendation.id]
+                    self._completed.append((recommendation.id, timestamp))
+                    self.verified += 1
+            if not recommendations:
+                del self._open[sensor_id]
+
+    def start(self):
+        """Запускает фоновый поток записи"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="recommendation-verifier", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Останавливает поток и записывает накопленное"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def flush(self) -> int:
+        """Записывает выполненные рекомендации одной транзакцией (при ошибке они остаются в очереди)"""
+        with self._write_lock:
+            with self._lock:
+                completed, self._completed = self._completed, []
+            if not completed:
+                return 0
+            db = self.session_factory()
+            try:
+                written = crud.complete_recommendations(db, completed)
+                self.written += written
+                return written
+            except Exception as e:
+                db.rollback()
+                self.failed += len(completed)
+                # Возвращаем в очередь перед новыми - следующий flush повторит запись
+                with self._lock:
+                    self._completed[:0] = completed
+                print(f"❌ ERROR: Failed to mark {len(completed)} recommendations implemented, will retry: {e}")
+                return 0
+            finally:
+                db.close()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def stats(self) -> Dict:
+        """Статистика верификатора"""
+        with self._lock:
+            open_count = sum(len(r) for r in self._open.values())
+            pending = len(self._completed)
+        return {
+            'open': open_count,
+            'sensors': len(self._open),
+            'observed': self.observed,
+            'verified': self.verified,
+            'pending': pending,
+            'written': self.written,
+            'failed': self.failed
+        }
+
+
+# Глобальный верификатор для использования в приложении
+recommendation_verifier = RecommendationVerifier()
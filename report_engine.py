@@ -0,0 +1,249 @@
+"""
+Потоковая генерация отчётов по микроклимату.
+
+Строки отчёта приходят итератором (crud.iter_report_rows - серверный
+курсор) и кодируются пачками по chunk_rows строк в выбранный формат:
+- txt: прежний текстовый вид отчёта
+- csv: таблица с заголовком (UTF-8 с BOM, открывается в Excel)
+- xlsx: лист Excel в режиме constant_memory (xlsxwriter пишет строки
+  во временный файл, а не держит книгу в памяти)
+
+Результат - генератор байтов: его можно сохранить в reports/
+(save_report) или отдать клиенту через StreamingResponse. При
+compress=True поток сжимается gzip на лету. Память не зависит от
+числа датчиков в отчёте.
+"""
+
+import csv
+import hashlib
+import io
+import os
+import tempfile
+import zlib
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+    print("[WARNING] xlsxwriter not installed. XLSX reports disabled")
+    print("   Install with: pip install xlsxwriter")
+
+REPORTS_DIR = "reports"     # каталог файлов
+REPORTS_URL = "/reports"    # путь StaticFiles в main.py
+CHUNK_ROWS = 500
+FILE_CHUNK_SIZE = 64 * 1024
+
+# Колонки отчёта: ключ строки crud.iter_report_rows -> заголовок
+REPORT_COLUMNS: List[Tuple[str, str]] = [
+    ("location", "Локация"),
+    ("sensor", "Датчик"),
+    ("type", "Тип"),
+    ("avg", "Среднее"),
+    ("min", "Мин"),
+    ("max", "Макс"),
+    ("std", "СКО"),
+    ("p5", "P5"),
+    ("p50", "Медиана"),
+    ("p95", "P95"),
+    ("minutes_out_of_range", "Минут вне нормы"),
+    ("anomalies", "Аномалий"),
+    ("recommendations", "Рекомендаций"),
+]
+
+REPORT_FORMATS: Dict[str, Dict[str, str]] = {
+    "txt": {"extension": ".txt", "media_type": "text/plain; charset=utf-8"},
+    "csv": {"extension": ".csv", "media_type": "text/csv; charset=utf-8"},
+    "xlsx": {"extension": ".xlsx",
+             "media_type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"},
+}
+GZIP_MEDIA_TYPE = "application/gzip"
+
+# Период отчёта: (дней, заголовок)
+REPORT_PERIODS: Dict[str, Tuple[int, str]] = {
+    "week": (7, "Недельный отчет"),
+    "month": (30, "Месячный отчет"),
+}
+
+
+def report_period(period: str, end_time: Optional[datetime] = None) -> Tuple[datetime, datetime, str]:
+    """(start_time, end_time, title_prefix) для периода отчёта; ValueError для неизвестного"""
+    if period not in REPORT_PERIODS:
+        raise ValueError("Invalid period. Use 'week' or 'month'.")
+    days, title_prefix = REPORT_PERIODS[period]
+    end_time = end_time or datetime.utcnow()
+    return end_time - timedelta(days=days), end_time, title_prefix
+
+
+def report_title(title_prefix: str, start_time: datetime, end_time: datetime) -> str:
+    """Заголовок внутри файла отчёта"""
+    return f"{title_prefix} за период {start_time.strftime('%d.%m.%Y')} - {end_time.strftime('%d.%m.%Y')}"
+
+
+def _batches(rows: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+# --- ФОРМАТЫ ---
+
+def render_text(rows: Iterable[Dict], title: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[bytes]:
+    """Текстовый отчёт (формат прежнего generate_report_endpoint)"""
+    yield f"{title}\n--------------------------------------------------\n".encode("utf-8")
+    for batch in _batches(rows, chunk_rows):
+        yield "".join(
+            f"Локация: {data['location']} | Датчик: {data['sensor']} ({data['type']})\n"
+            f"  Среднее: {data['avg']} | Мин: {data['min']} | Макс: {data['max']}\n"
+            f"  P5: {data['p5']} | Медиана: {data['p50']} | P95: {data['p95']} | СКО: {data['std']}\n"
+            f"  Вне нормы: {data['minutes_out_of_range']} мин | Аномалий: {data['anomalies']}"
+            f" | Рекомендаций: {data['recommendations']}\n"
+            for data in batch
+        ).encode("utf-8")
+
+
+def render_csv(rows: Iterable[Dict], title: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[bytes]:
+    """CSV: строка заголовков и по строке на датчик (заголовок отчёта не пишется)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for _, header in REPORT_COLUMNS])
+    yield "\ufeff".encode("utf-8") + buffer.getvalue().encode("utf-8")
+    for batch in _batches(rows, chunk_rows):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([data[key] for key, _ in REPORT_COLUMNS] for data in batch)
+        yield buffer.getvalue().encode("utf-8")
+
+
+def render_xlsx(rows: Iterable[Dict], title: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[bytes]:
+    """XLSX: заголовок отчёта, строка заголовков колонок и строки датчиков"""
+    if xlsxwriter is None:
+        raise RuntimeError("xlsxwriter is not installed")
+    # Архив xlsx собирается при закрытии книги, поэтому пишем во временный файл
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+        # Фиксированная дата создания (начало суток): одинаковые данные дают одинаковый файл
+        workbook.set_properties({"created": datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)})
+        sheet = workbook.add_worksheet("Отчёт")
+        bold = workbook.add_format({"bold": True})
+        sheet.write_string(0, 0, title, bold)
+        sheet.write_row(2, 0, [header for _, header in REPORT_COLUMNS], bold)
+        row_index = 3
+        for batch in _batches(rows, chunk_rows):
+            for data in batch:
+                sheet.write_row(row_index, 0, [data[key] for key, _ in REPORT_COLUMNS])
+                row_index += 1
+        workbook.close()
+
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(FILE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+_RENDERERS = {"txt": render_text, "csv": render_csv, "xlsx": render_xlsx}
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Сжимает поток байтов в gzip на лету"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def render_report(rows: Iterable[Dict], fmt: str = "txt", title: str = "",
+                  compress: bool = False, chunk_rows: int = CHUNK_ROWS) -> Iterator[bytes]:
+    """
+    Кодирует строки отчёта в формат fmt.
+
+    Args:
+        rows: Итератор строк (словари с ключами REPORT_COLUMNS)
+        fmt: 'txt', 'csv' или 'xlsx'
+        title: Заголовок отчёта
+        compress: Сжимать gzip
+        chunk_rows: Строк в одной пачке
+
+    Returns:
+        Генератор байтов файла
+    """
+    if fmt not in _RENDERERS:
+        raise ValueError(f"Unknown report format '{fmt}', expected one of {sorted(_RENDERERS)}")
+    chunks = _RENDERERS[fmt](rows, title, chunk_rows)
+    return gzip_chunks(chunks) if compress else chunks
+
+
+def report_filename(name: str, fmt: str, compress: bool = False) -> str:
+    """Имя файла с расширением формата (и .gz)"""
+    return name + REPORT_FORMATS[fmt]["extension"] + (".gz" if compress else "")
+
+
+def media_type(fmt: str, compress: bool = False) -> str:
+    return GZIP_MEDIA_TYPE if compress else REPORT_FORMATS[fmt]["media_type"]
+
+
+def save_report(filename: str, chunks: Iterable[bytes]) -> str:
+    """
+    Пишет поток отчёта в reports/ (через временный файл - без полузаписанных отчётов).
+
+    Returns:
+        Путь для скачивания (/reports/<filename>)
+    """
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    full_path = os.path.join(REPORTS_DIR, filename)
+    part_path = full_path + ".part"
+    try:
+        with open(part_path, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(part_path, full_path)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    print(f"✅ Report saved: {full_path}")
+    return f"{REPORTS_URL}/{filename}"
+
+
+def store_report(prefix: str, fmt: str, compress: bool, chunks: Iterable[bytes]) -> Tuple[str, str, bool]:
+    """
+    Сохраняет отчёт под именем по содержимому: <prefix>_<sha256[:16]><ext>.
+    Если такой файл уже есть (те же данные), новый не создаётся.
+
+    Returns:
+        (путь для скачивания, sha256 содержимого, True если файл уже был)
+    """
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, part_path = tempfile.mkstemp(suffix=".part", dir=REPORTS_DIR)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                digest.update(chunk)
+                f.write(chunk)
+        content_hash = digest.hexdigest()
+        filename = report_filename(f"{prefix}_{content_hash[:16]}", fmt, compress)
+        full_path = os.path.join(REPORTS_DIR, filename)
+        reused = os.path.exists(full_path)
+        if reused:
+            os.remove(part_path)
+        else:
+            os.replace(part_path, full_path)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    return f"{REPORTS_URL}/{filename}", content_hash, reused
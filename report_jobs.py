@@ -0,0 +1,274 @@
+"""
+Фоновая очередь генерации отчётов.
+
+POST /api/reports/generate/{period} больше не считает отчёт в запросе:
+задание ставится в очередь, пул потоков выполняет агрегацию
+(crud.iter_report_rows) и потоковую запись файла (report_engine).
+
+- Дедупликация: одинаковые запросы (период, формат, сжатие) в пределах
+  одного окна window_seconds получают одно и то же задание - второй
+  вызов планировщика не запускает второй полный проход по данным.
+- Кэш результата: файл называется по sha256 содержимого; если такой
+  отчёт уже есть (данные не изменились), новый файл и запись reports
+  не создаются, задание ссылается на существующие.
+- Статус заданий: queued, running, done, empty (нет данных), failed.
+"""
+
+import itertools
+import os
+import queue
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import crud
+import models
+import report_engine
+from database import SessionLocal
+from response_cache import response_cache
+
+REPORT_WORKERS = int(os.environ.get("REPORT_WORKERS", 2))
+REPORT_JOB_WINDOW = int(os.environ.get("REPORT_JOB_WINDOW_SECONDS", 3600))
+
+ACTIVE_STATUSES = ("queued", "running")
+# На такие задания новые запросы не склеиваются: данные могли появиться, ошибка - пройти
+RETRY_STATUSES = ("failed", "empty")
+
+
+class ReportJob:
+    """Задание на генерацию одного отчёта"""
+
+    def __init__(self, job_id: int, key: Tuple, period: str, fmt: str, compress: bool):
+        self.id = job_id
+        self.key = key
+        self.period = period
+        self.fmt = fmt
+        self.compress = compress
+        self.status = "queued"
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.requests = 1            # сколько запросов обслужено этим заданием
+        self.report_id: Optional[int] = None
+        self.title: Optional[str] = None
+        self.file_path: Optional[str] = None
+        self.content_hash: Optional[str] = None
+        self.reused = False
+        self.message: Optional[str] = None
+        self.error: Optional[str] = None
+        self._finished = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self._finished.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Ждёт завершения задания; False - если не успело за timeout"""
+        return self._finished.wait(timeout)
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "period": self.period,
+            "format": self.fmt,
+            "compress": self.compress,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "requests": self.requests,
+            "report_id": self.report_id,
+            "title": self.title,
+            "file_path": self.file_path,
+            "content_hash": self.content_hash,
+            "reused": self.reused,
+            "message": self.message,
+            "error": self.error,
+        }
+
+
+class ReportJobQueue:
+    """Очередь заданий отчётов с пулом потоков, дедупликацией и кэшем по содержимому"""
+
+    def __init__(self,
+                 session_factory: Callable = SessionLocal,
+                 workers: int = REPORT_WORKERS,
+                 window_seconds: int = REPORT_JOB_WINDOW,
+                 max_jobs: int = 500):
+        """
+        Args:
+            session_factory: Фабрика сессий БД
+            workers: Число потоков-исполнителей
+            window_seconds: Окно дедупликации одинаковых запросов (секунды)
+            max_jobs: Сколько заданий хранить для просмотра статуса
+        """
+        self.session_factory = session_factory
+        self.workers = workers
+        self.window_seconds = window_seconds
+        self.max_jobs = max_jobs
+        self._queue: queue.Queue = queue.Queue()
+        self._jobs: "OrderedDict[int, ReportJob]" = OrderedDict()
+        self._by_key: Dict[Tuple, ReportJob] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+        self.submitted = 0
+        self.coalesced = 0
+        self.completed = 0
+        self.reused = 0
+        self.failed = 0
+
+    def start(self):
+        """Запускает потоки-исполнители"""
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"report-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Останавливает потоки после выполнения уже поставленных заданий"""
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def submit(self, period: str, fmt: str = "txt", compress: bool = False,
+               now: Optional[datetime] = None) -> ReportJob:
+        """
+        Ставит отчёт в очередь или возвращает уже существующее задание
+        с тем же ключом в текущем окне.
+
+        Без запущенных потоков задание выполняется синхронно.
+        ValueError - неизвестный период или формат.
+        """
+        report_engine.report_period(period)
+        if fmt not in report_engine.REPORT_FORMATS:
+            raise ValueError(f"Unknown report format '{fmt}', expected one of {sorted(report_engine.REPORT_FORMATS)}")
+
+        now = now or datetime.utcnow()
+        key = (period, fmt, compress, int(now.timestamp()) // self.window_seconds)
+        with self._lock:
+            job = self._by_key.get(key)
+            if job is not None and job.status not in RETRY_STATUSES:
+                job.requests += 1
+                self.coalesced += 1
+                return job
+            job = ReportJob(next(self._ids), key, period, fmt, compress)
+            self._remember(job)
+            self.submitted += 1
+
+        if self._threads:
+            self._queue.put(job)
+        else:
+            self._execute(job)
+        return job
+
+    def get(self, job_id: int) -> Optional[ReportJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self, limit: int = 50) -> List[ReportJob]:
+        """Последние задания, новые первыми"""
+        with self._lock:
+            return list(reversed(self._jobs.values()))[:limit]
+
+    def stats(self) -> Dict:
+        """Статистика очереди"""
+        with self._lock:
+            return {
+                'workers': len(self._threads),
+                'queued': self._queue.qsize(),
+                'active': sum(1 for job in self._jobs.values() if job.status in ACTIVE_STATUSES),
+                'submitted': self.submitted,
+                'coalesced': self.coalesced,
+                'completed': self.completed,
+                'reused': self.reused,
+                'failed': self.failed
+            }
+
+    def _remember(self, job: ReportJob):
+        self._jobs[job.id] = job
+        self._by_key[job.key] = job
+        # Старые завершённые задания вытесняются, активные не трогаем
+        while len(self._jobs) > self.max_jobs:
+            oldest = next((j for j in self._jobs.values() if j.status not in ACTIVE_STATUSES), None)
+            if oldest is None:
+                break
+            del self._jobs[oldest.id]
+            if self._by_key.get(oldest.key) is oldest:
+                del self._by_key[oldest.key]
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            self._execute(job)
+
+    def _execute(self, job: ReportJob):
+        job.status = "running"
+        job.started_at = datetime.utcnow()
+        db = self.session_factory()
+        try:
+            self._build(db, job)
+            if job.status == "done":
+                with self._lock:
+                    self.completed += 1
+                    self.reused += job.reused
+        except Exception as e:
+            db.rollback()
+            job.status = "failed"
+            job.error = str(e)
+            with self._lock:
+                self.failed += 1
+            print(f"❌ ERROR: Report job {job.id} failed: {e}")
+        finally:
+            db.close()
+            job.finished_at = datetime.utcnow()
+            job._finished.set()
+
+    def _build(self, db, job: ReportJob):
+        start_time, end_time, title_prefix = report_engine.report_period(job.period, job.created_at)
+
+        rows = crud.iter_report_rows(db, start_time, end_time)
+        first = next(rows, None)
+        if first is None:
+            rows.close()
+            job.status = "empty"
+            job.message = (f"Нет данных для создания {title_prefix.lower()} за период: "
+                           f"{start_time.strftime('%Y-%m-%d')} - {end_time.strftime('%Y-%m-%d')}")
+            return
+
+        chunks = report_engine.render_report(
+            itertools.chain([first], rows), job.fmt,
+            report_engine.report_title(title_prefix, start_time, end_time), job.compress
+        )
+        file_path, job.content_hash, job.reused = report_engine.store_report(job.period, job.fmt, job.compress, chunks)
+
+        report = None
+        if job.reused:
+            report = db.query(models.Report).filter(models.Report.file_path == file_path).first()
+        if report is None:
+            report = models.Report(
+                title=f"{title_prefix} ({start_time.strftime('%d.%m')} - {end_time.strftime('%d.%m')})",
+                file_path=file_path,
+                report_date=end_time
+            )
+            db.add(report)
+            db.commit()
+            response_cache.invalidate("reports")
+
+        job.report_id = report.id
+        job.title = report.title
+        job.file_path = file_path
+        job.message = "Отчет успешно сгенерирован и сохранен."
+        job.status = "done"
+
+
+# Глобальная очередь отчётов для использования в приложении
+report_jobs = ReportJobQueue()
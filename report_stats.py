@@ -0,0 +1,53 @@
+"""
+Векторные агрегаты отчёта по ряду одного датчика.
+
+crud.iter_report_rows читает историю периода одним проходом (сырые
+строки + сжатые блоки, по датчикам) и для каждого ряда вызывает
+series_stats: count/sum/min/max, СКО, перцентили p5/p50/p95 и время
+вне нормального диапазона датчика (comfort_ranges) - всё за несколько
+проходов NumPy по массиву, без отдельных запросов на каждую метрику.
+
+Время вне нормы: каждое измерение "действует" до следующего, но не
+дольше двух медианных интервалов датчика (пропуски связи не считаются
+нарушением); последнему измерению приписывается медианный интервал.
+"""
+
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+PERCENTILES = (5, 50, 95)
+MAX_GAP_STEPS = 2
+
+
+def minutes_out_of_range(timestamps_us: np.ndarray, values: np.ndarray, bounds: Tuple[float, float]) -> float:
+    """Минуты, в течение которых значение было вне [low, high]"""
+    if len(values) < 2:
+        return 0.0
+    steps = np.diff(timestamps_us)
+    step = float(np.median(steps))
+    durations = np.minimum(np.append(steps, step), MAX_GAP_STEPS * step)
+    outside = (values < bounds[0]) | (values > bounds[1])
+    return float(durations[outside].sum()) / 60e6
+
+
+def series_stats(timestamps_us: np.ndarray, values: np.ndarray,
+                 bounds: Optional[Tuple[float, float]] = None) -> Dict:
+    """
+    Агрегаты ряда, отсортированного по времени.
+
+    Returns:
+        {'count', 'sum', 'min', 'max', 'std', 'p5', 'p50', 'p95', 'minutes_out_of_range'}
+    """
+    p5, p50, p95 = np.percentile(values, PERCENTILES)
+    return {
+        'count': len(values),
+        'sum': float(values.sum()),
+        'min': float(values.min()),
+        'max': float(values.max()),
+        'std': float(values.std()),
+        'p5': float(p5),
+        'p50': float(p50),
+        'p95': float(p95),
+        'minutes_out_of_range': minutes_out_of_range(timestamps_us, values, bounds) if bounds else None,
+    }
@@ -0,0 +1,333 @@
+"""
+Метрики запросов в формате Prometheus (/metrics).
+
+Без внешних зависимостей (prometheus_client не нужен):
+- гистограммы задержки по маршруту (шаблон пути, а не сам путь - число
+  рядов не растёт с числом датчиков)
+- число и время SQL-запросов на HTTP-запрос: события SQLAlchemy
+  before/after_cursor_execute складываются в статистику текущего
+  запроса (ContextVar - видна и в потоках пула sync-эндпоинтов)
+- признак N+1: один и тот же текст SQL повторился за запрос не меньше
+  N_PLUS_ONE_THRESHOLD раз; такие и медленные (SLOW_REQUEST_SECONDS)
+  запросы считаются счётчиками и попадают в журнал последних (stats)
+- произвольные гистограммы и счётчики (timer, observe, inc): время
+  стадий детектора аномалий, принятые измерения
+- сборщики: числовые поля stats() фоновых компонентов (очереди записи,
+  отчётов, верификатора) выводятся как gauge при каждом чтении /metrics
+"""
+
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from starlette.routing import Match
+
+PREFIX = "microclimate_"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("N_PLUS_ONE_THRESHOLD", 10))
+SLOW_REQUEST_SECONDS = float(os.environ.get("SLOW_REQUEST_SECONDS", 1.0))
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# Живой поток SSE открыт минутами - его длительность не задержка запроса
+SSE_MEDIA_TYPE = b"text/event-stream"
+
+# Путь, не совпавший ни с одним маршрутом (сканеры, опечатки) - одна метка на всех
+UNMATCHED = "unmatched"
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами (как у Prometheus: le включительно)"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, число наблюдений <= le) с завершающим +Inf"""
+        result, total = [], 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((_format_value(bound), total))
+        result.append(("+Inf", self.count))
+        return result
+
+
+class RequestStats:
+    """SQL текущего HTTP-запроса"""
+
+    __slots__ = ("queries", "query_seconds", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.statements: Counter = Counter()
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value))
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class RequestMetrics:
+    """Реестр метрик процесса"""
+
+    def __init__(self, n_plus_one_threshold: int = N_PLUS_ONE_THRESHOLD,
+                 slow_seconds: float = SLOW_REQUEST_SECONDS, recent: int = 50):
+        """
+        Args:
+            n_plus_one_threshold: Повторов одного SQL за запрос, начиная с которого это N+1
+            slow_seconds: Порог медленного запроса (секунды)
+            recent: Сколько последних медленных / N+1 запросов хранить для stats()
+        """
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.slow_seconds = slow_seconds
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._histograms: Dict[Tuple[str, Tuple], Histogram] = {}
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        self._collectors: Dict[str, Callable[[], Dict]] = {}
+        self._recent = deque(maxlen=recent)
+        self._lock = threading.Lock()
+        # Свой контекст у каждого реестра: два реестра на одном движке не считают SQL дважды
+        self._current: ContextVar[Optional[RequestStats]] = ContextVar(f"request_metrics_{id(self)}", default=None)
+
+        self.define("http_request_duration_seconds", "histogram", "HTTP request latency by route")
+        self.define("http_request_db_queries", "histogram", "SQL statements per HTTP request")
+        self.define("http_request_db_seconds", "histogram", "SQL time per HTTP request")
+        self.define("db_query_duration_seconds", "histogram", "SQL statement latency (requests and background)")
+        self.define("http_n_plus_one_total", "counter", "Requests repeating one SQL statement above the N+1 threshold")
+        self.define("http_slow_requests_total", "counter", "Requests slower than the slow threshold")
+
+    # --- Регистрация и запись ---
+
+    def define(self, name: str, kind: str, help_text: str):
+        """Описание метрики для # HELP / # TYPE (kind: histogram, counter)"""
+        self._help[name] = (kind, help_text)
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = LATENCY_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """with metrics.timer("detector_duration_seconds", stage="series"): ..."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def register_collector(self, name: str, stats: Callable[[], Dict]):
+        """Числовые поля stats() компонента будут gauge <PREFIX><name>_<поле>"""
+        self._collectors[name] = stats
+
+    # --- SQL ---
+
+    def instrument_engine(self, sync_engine):
+        """Подписывает движок (для async - engine.sync_engine) на события выполнения SQL"""
+        event.listen(sync_engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("request_metrics_started", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("request_metrics_started")
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        self.observe("db_query_duration_seconds", elapsed)
+        stats = self._current.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.query_seconds += elapsed
+            stats.statements[statement] += 1
+
+    # --- HTTP-запросы ---
+
+    def begin(self):
+        """Начало HTTP-запроса: токен для finish() или discard()"""
+        return self._current.set(RequestStats())
+
+    def discard(self, token):
+        """Запрос не записывается (долгие потоки SSE - не задержка)"""
+        self._current.reset(token)
+
+    def finish(self, token, method: str, route: str, status: int, seconds: float) -> RequestStats:
+        """Записывает метрики запроса и отмечает N+1 / медленные"""
+        stats = self._current.get()
+        self._current.reset(token)
+        self.observe("http_request_duration_seconds", seconds, method=method, route=route, status=str(status))
+        self.observe("http_request_db_queries", stats.queries, QUERY_COUNT_BUCKETS, method=method, route=route)
+        self.observe("http_request_db_seconds", stats.query_seconds, method=method, route=route)
+
+        statement, repeats = stats.statements.most_common(1)[0] if stats.statements else ("", 0)
+        n_plus_one = repeats >= self.n_plus_one_threshold
+        slow = seconds >= self.slow_seconds
+        if n_plus_one:
+            self.inc("http_n_plus_one_total", method=method, route=route)
+            print(f"⚠️ N+1: {method} {route} repeated one statement {repeats}x "
+                  f"({stats.queries} queries): {' '.join(statement.split())[:120]}")
+        if slow:
+            self.inc("http_slow_requests_total", method=method, route=route)
+            print(f"⚠️ Slow request: {method} {route} {seconds * 1000:.0f} ms, "
+                  f"{stats.queries} queries, {stats.query_seconds * 1000:.0f} ms in SQL")
+        if n_plus_one or slow:
+            with self._lock:
+                self._recent.append({
+                    'method': method,
+                    'route': route,
+                    'status': status,
+                    'ms': round(seconds * 1000, 1),
+                    'queries': stats.queries,
+                    'db_ms': round(stats.query_seconds * 1000, 1),
+                    'max_repeats': repeats,
+                    'statement': ' '.join(statement.split())[:200] if n_plus_one else None
+                })
+        return stats
+
+    # --- Вывод ---
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        with self._lock:
+            histograms = sorted((key, (h.cumulative(), h.sum, h.count)) for key, h in self._histograms.items())
+            counters = sorted(self._counters.items())
+        lines = []
+        described = set()
+
+        def header(name: str, kind: str):
+            if name in described:
+                return
+            described.add(name)
+            kind, help_text = self._help.get(name, (kind, name))
+            lines.append(f"# HELP {PREFIX}{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        for (name, labels), (buckets, total, count) in histograms:
+            header(name, "histogram")
+            for le, cumulative in buckets:
+                bucket = 'le="' + le + '"'
+                lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels, bucket)} {cumulative}")
+            lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {count}")
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{PREFIX}{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for collector, stats in sorted(self._collectors.items()):
+            try:
+                values = stats()
+            except Exception as e:
+                print(f"⚠️ Metrics collector {collector} failed: {e}")
+                continue
+            for field, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f"{PREFIX}{collector}_{field}"
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def stats(self) -> Dict:
+        """Сводка: пороги и последние медленные / N+1 запросы"""
+        with self._lock:
+            recent = list(self._recent)
+            series = len(self._histograms) + len(self._counters)
+        return {
+            'n_plus_one_threshold': self.n_plus_one_threshold,
+            'slow_seconds': self.slow_seconds,
+            'series': series,
+            'recent': recent
+        }
+
+
+def route_template(scope) -> str:
+    """Шаблон пути маршрута ("/api/sensors/{location_id}"), а не сам путь"""
+    route = scope.get("route")
+    if route is not None and hasattr(route, "path"):
+        return route.path
+    # Ответ пришёл до маршрутизации (например, из кэша ответов)
+    app = scope.get("app")
+    for candidate in getattr(getattr(app, "router", None), "routes", ()):
+        match, _ = candidate.matches(scope)
+        if match == Match.FULL and hasattr(candidate, "path"):
+            return candidate.path
+    return UNMATCHED
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware: задержка, SQL и N+1 для каждого HTTP-запроса"""
+
+    def __init__(self, app, metrics: Optional[RequestMetrics] = None):
+        self.app = app
+        self.metrics = metrics or request_metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        event_stream = False
+        token = self.metrics.begin()
+        started = time.perf_counter()
+
+        async def capture(message):
+            nonlocal status, event_stream
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                event_stream = any(name.lower() == b"content-type" and value.startswith(SSE_MEDIA_TYPE)
+                                   for name, value in message.get("headers", []))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            if event_stream:
+                self.metrics.discard(token)
+            else:
+                self.metrics.finish(token, scope["method"], route_template(scope), status,
+                                    time.perf_counter() - started)
+
+
+# Глобальный реестр метрик для использования в приложении
+request_metrics = RequestMetrics()
@@ -0,0 +1,229 @@
+"""
+Кэш ответов GET-эндпоинтов с ETag и условными запросами.
+
+Дэшборды опрашивают /api/locations, /api/users, /analytics/{sensor_id} и
+/api/reports, каждый раз получая тот же JSON, который сервер заново
+считает и сериализует. Middleware хранит готовое тело ответа по ключу
+(путь + отсортированные параметры запроса):
+- маршруты регистрируются явно (route) со своим TTL и тегами
+- у ответа сильный ETag (хэш тела); If-None-Match с совпадающим ETag
+  получает 304 без тела - и из кэша, и после пересчёта
+- писатели сбрасывают теги (invalidate): у каждого тега счётчик
+  поколений, запись кэша помнит поколения своих тегов на момент запроса,
+  поэтому запись, посчитанная во время изменения, сразу устаревает
+
+Кэш в памяти процесса (как live_stream): несколько воркеров
+инвалидируют только свой кэш, а TTL ограничивает устаревание остальных.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.routing import compile_path
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 1024))
+
+# Тег, который есть у каждой записи: его сброс (clear) устаревает весь кэш
+ALL = "*"
+
+# Ответ всегда перепроверяется (If-None-Match), но передаётся только при изменении
+CACHE_CONTROL = b"no-cache"
+
+
+class CachePolicy:
+    """Кэшируемый маршрут: шаблон пути, TTL и теги инвалидации"""
+
+    def __init__(self, path: str, ttl: float, tags: Sequence[str]):
+        self.path = path
+        self.regex, _, _ = compile_path(path)
+        self.ttl = ttl
+        self.tags = tuple(tags)
+
+    def match(self, path: str) -> Optional[Tuple[str, ...]]:
+        """Теги запроса ("sensor:{sensor_id}" -> "sensor:5") или None, если путь не совпал"""
+        found = self.regex.match(path)
+        if found is None:
+            return None
+        params = found.groupdict()
+        return tuple(tag.format(**params) for tag in self.tags)
+
+
+class CachedResponse:
+    __slots__ = ("status", "headers", "body", "etag", "expires", "generations")
+
+    def __init__(self, status: int, headers: List[Tuple[bytes, bytes]], body: bytes, etag: bytes,
+                 expires: float, generations: Tuple[Tuple[str, int], ...]):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.etag = etag
+        self.expires = expires
+        self.generations = generations
+
+
+class ResponseCache:
+    """Кэш тел ответов (LRU) с тегами инвалидации"""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._policies: List[CachePolicy] = []
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+
+    def route(self, path: str, ttl: float, tags: Sequence[str] = ()):
+        """Регистрирует кэшируемый GET-маршрут (шаблон пути как в FastAPI)"""
+        self._policies.append(CachePolicy(path, ttl, tags))
+
+    def policy_for(self, path: str) -> Optional[Tuple[CachePolicy, Tuple[str, ...]]]:
+        for policy in self._policies:
+            tags = policy.match(path)
+            if tags is not None:
+                return policy, tags
+        return None
+
+    def invalidate(self, *tags: str):
+        """Сбрасывает все ответы с этими тегами"""
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+            self.invalidations += len(tags)
+
+    def clear(self):
+        """Сбрасывает весь кэш (например, после заполнения БД)"""
+        self.invalidate(ALL)
+        with self._lock:
+            self._entries.clear()
+
+    def generations(self, tags: Sequence[str]) -> Tuple[Tuple[str, int], ...]:
+        """Текущие поколения тегов запроса (и общего тега ALL)"""
+        with self._lock:
+            return tuple((tag, self._generations.get(tag, 0)) for tag in (ALL,) + tuple(tags))
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            fresh = entry.expires > time.monotonic() and all(
+                self._generations.get(tag, 0) == generation for tag, generation in entry.generations
+            )
+            if not fresh:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry: CachedResponse):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = len(self._entries)
+        return {
+            'entries': entries,
+            'routes': [policy.path for policy in self._policies],
+            'hits': self.hits,
+            'misses': self.misses,
+            'not_modified': self.not_modified,
+            'invalidations': self.invalidations
+        }
+
+
+def make_etag(body: bytes) -> bytes:
+    """Сильный ETag по содержимому тела"""
+    return b'"' + hashlib.sha256(body).hexdigest()[:32].encode() + b'"'
+
+
+def etag_matches(if_none_match: Optional[bytes], etag: bytes) -> bool:
+    """If-None-Match (список ETag или *) совпадает с ETag ответа"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(b","):
+        candidate = candidate.strip()
+        if candidate.startswith(b"W/"):       # для If-None-Match сравнение слабое
+            candidate = candidate[2:]
+        if candidate == b"*" or candidate == etag:
+            return True
+    return False
+
+
+class ResponseCacheMiddleware:
+    """ASGI middleware: отдаёт зарегистрированные GET-маршруты из ResponseCache"""
+
+    def __init__(self, app, cache: Optional[ResponseCache] = None):
+        self.app = app
+        self.cache = cache or response_cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        found = self.cache.policy_for(scope["path"])
+        if found is None:
+            await self.app(scope, receive, send)
+            return
+        policy, tags = found
+
+        query = urlencode(sorted(parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True)))
+        key = f"{scope['path']}?{query}"
+        if_none_match = dict(scope["headers"]).get(b"if-none-match")
+
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.cache.hits += 1
+            await self._respond(send, entry, if_none_match, b"HIT")
+            return
+
+        # Поколения тегов - до вычисления: изменение во время запроса делает запись устаревшей
+        generations = self.cache.generations(tags)
+        start_message = None
+        chunks = []
+
+        async def capture(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+        self.cache.misses += 1
+
+        body = b"".join(chunks)
+        headers = [(name, value) for name, value in start_message.get("headers", [])
+                   if name.lower() not in (b"etag", b"cache-control")]
+        entry = CachedResponse(start_message["status"], headers, body, make_etag(body),
+                               time.monotonic() + policy.ttl, generations)
+        if entry.status == 200:
+            self.cache.put(key, entry)
+        await self._respond(send, entry, if_none_match if entry.status == 200 else None, b"MISS")
+
+    async def _respond(self, send, entry: CachedResponse, if_none_match: Optional[bytes], state: bytes):
+        cache_headers = [(b"etag", entry.etag), (b"cache-control", CACHE_CONTROL), (b"x-cache", state)]
+        if etag_matches(if_none_match, entry.etag):
+            self.cache.not_modified += 1
+            await send({"type": "http.response.start", "status": 304, "headers": cache_headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await send({"type": "http.response.start", "status": entry.status,
+                    "headers": entry.headers + cache_headers})
+        await send({"type": "http.response.body", "body": entry.body})
+
+
+# Глобальный кэш ответов для использования в приложении
+response_cache = ResponseCache()
@@ -0,0 +1,254 @@
+"""
+Модели отклика датчиков на смену целевого значения.
+
+Оценка времени выхода на цель по двум последним точкам истории
+неустойчива: один шумный отсчёт даёт "~0 minutes" или "days". Вместо
+неё для каждого датчика подбирается экспоненциальный отклик
+
+    y(t) = target + (y0 - target) * exp(-t / tau)
+
+по прошлым изменениям цели (sensor_target_changes, пишутся вместе с
+ActionLog при движении слайдера). Для точки отклика r = (y - target) /
+(y0 - target), ln r = -t / tau, и tau находится МНК через начало
+координат: tau = -Σt² / Σ(t·ln r). Суммы хранятся в
+sensor_response_models, поэтому ночной пересчёт обрабатывает только
+новые изменения цели и дополняет суммы, а сами суммы по всем датчикам
+считаются одним np.bincount.
+
+Оценка времени - одно вычисление: tau * ln(|y - target| / tolerance).
+"""
+
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import crud
+import models
+from block_store import to_epoch_us
+from database import SessionLocal
+from intelligent_recommendation_engine import RecommendationGenerator
+
+RESPONSE_WINDOW_HOURS = float(os.environ.get("RESPONSE_WINDOW_HOURS", 6))
+RESPONSE_FIT_INTERVAL = float(os.environ.get("RESPONSE_FIT_INTERVAL_SECONDS", 24 * 3600))
+
+# Точки отклика, по которым идёт подгонка: без начального участка и шума у цели
+MIN_RATIO = 0.05
+MAX_RATIO = 0.95
+# Показание "до изменения" ищется не раньше, чем за LOOKBACK до него
+LOOKBACK = timedelta(hours=1)
+
+
+class ResponseModelStore:
+    """Постоянные времени датчиков: кэш в памяти + ночная инкрементальная подгонка"""
+
+    def __init__(self,
+                 session_factory=SessionLocal,
+                 window_hours: float = RESPONSE_WINDOW_HOURS,
+                 interval: float = RESPONSE_FIT_INTERVAL):
+        """
+        Args:
+            session_factory: Фабрика сессий БД
+            window_hours: Сколько часов после смены цели учитывается отклик
+            interval: Период подгонки (секунды, по умолчанию сутки)
+        """
+        self.session_factory = session_factory
+        self.window = timedelta(hours=window_hours)
+        self.interval = interval
+        self._time_constants: Optional[Dict[int, float]] = None
+        self._lock = threading.Lock()
+        self._fit_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.fits = 0
+        self.events_fitted = 0
+        self.failed = 0
+
+    # --- ОЦЕНКА ---
+
+    def time_constant(self, db: Session, sensor_id: int) -> Optional[float]:
+        """Постоянная времени датчика (секунды) или None, если модели ещё нет"""
+        with self._lock:
+            if self._time_constants is None:
+                self._time_constants = dict(db.execute(
+                    select(models.SensorResponseModel.sensor_id, models.SensorResponseModel.time_constant)
+                    .where(models.SensorResponseModel.time_constant.isnot(None))
+                ).all())
+            return self._time_constants.get(sensor_id)
+
+    def estimate_seconds(self, db: Session, sensor_id: int, current: float, target: float,
+                         tolerance: float = RecommendationGenerator.SETTLE_TOLERANCE) -> Optional[float]:
+        """Время выхода датчика в допуск цели (секунды) или None без модели"""
+        tau = self.time_constant(db, sensor_id)
+        if tau is None:
+            return None
+        return RecommendationGenerator.settling_seconds(current, target, tau, tolerance)
+
+    # --- ПОДГОНКА ---
+
+    def fit(self, db: Session, now: Optional[datetime] = None) -> Dict:
+        """
+        Дополняет модели изменениями цели, отклик на которые уже завершился
+        (следующее изменение или окно window прошли).
+
+        Returns:
+            {'events': int, 'samples': int, 'sensors': int}
+        """
+        now = now or datetime.utcnow()
+        with self._fit_lock:
+            stored = {m.sensor_id: m for m in db.query(models.SensorResponseModel).all()}
+            changes = self._pending_changes(db)
+
+            sensor_ids: List[int] = []
+            times: List[np.ndarray] = []
+            logs: List[np.ndarray] = []
+            fitted_through: Dict[int, datetime] = {}
+            events: Dict[int, int] = {}
+
+            for sensor_id, sensor_changes in changes.items():
+                settled = []
+                for change, following in zip(sensor_changes, sensor_changes[1:] + [None]):
+                    end = change.changed_at + self.window
+                    if following is not None:
+                        end = min(end, following.changed_at)
+                    if end > now:
+                        break
+                    settled.append((change, end))
+                if not settled:
+                    continue
+
+                ts, values = crud.get_sensor_series(
+                    db, sensor_id, settled[0][0].changed_at - LOOKBACK, settled[-1][1]
+                )
+                for change, end in settled:
+                    t, log_ratio = _response_points(ts, values, change, end)
+                    if len(t):
+                        sensor_ids.append(sensor_id)
+                        times.append(t)
+                        logs.append(log_ratio)
+                        events[sensor_id] = events.get(sensor_id, 0) + 1
+                fitted_through[sensor_id] = settled[-1][0].changed_at
+
+            samples = self._accumulate(db, stored, sensor_ids, times, logs, events, fitted_through, now)
+            time_constants = {
+                sensor_id: model.time_constant for sensor_id, model in stored.items()
+                if model.time_constant is not None
+            }
+            db.commit()
+
+            with self._lock:
+                self._time_constants = time_constants
+            fitted_events = sum(events.values())
+            self.fits += 1
+            self.events_fitted += fitted_events
+        return {'events': fitted_events, 'samples': samples, 'sensors': len(fitted_through)}
+
+    def _pending_changes(self, db: Session) -> Dict[int, List]:
+        """Изменения цели новее fitted_through датчика, по датчикам в порядке времени"""
+        change = models.SensorTargetChange
+        model = models.SensorResponseModel
+        query = db.query(change).outerjoin(model, model.sensor_id == change.sensor_id).filter(
+            (model.fitted_through.is_(None)) | (change.changed_at > model.fitted_through)
+        ).order_by(change.sensor_id, change.changed_at)
+
+        changes: Dict[int, List] = {}
+        for row in query:
+            changes.setdefault(row.sensor_id, []).append(row)
+        return changes
+
+    def _accumulate(self, db: Session, stored: Dict, sensor_ids: List[int], times: List[np.ndarray],
+                    logs: List[np.ndarray], events: Dict[int, int], fitted_through: Dict[int, datetime],
+                    now: datetime) -> int:
+        """Суммы МНК по всем датчикам одним bincount и обновление моделей"""
+        sensor_order = sorted(fitted_through)
+        index = {sensor_id: i for i, sensor_id in enumerate(sensor_order)}
+        samples = 0
+        sum_t_log = sum_t2 = counts = np.zeros(len(sensor_order))
+        if times:
+            t = np.concatenate(times)
+            log_ratio = np.concatenate(logs)
+            group = np.repeat([index[s] for s in sensor_ids], [len(part) for part in times])
+            sum_t_log = np.bincount(group, weights=t * log_ratio, minlength=len(sensor_order))
+            sum_t2 = np.bincount(group, weights=t * t, minlength=len(sensor_order))
+            counts = np.bincount(group, minlength=len(sensor_order))
+            samples = len(t)
+
+        for sensor_id, i in index.items():
+            model = stored.get(sensor_id)
+            if model is None:
+                model = stored[sensor_id] = models.SensorResponseModel(
+                    sensor_id=sensor_id, sum_t_log=0.0, sum_t2=0.0, samples=0, events=0
+                )
+                db.add(model)
+            model.sum_t_log += float(sum_t_log[i])
+            model.sum_t2 += float(sum_t2[i])
+            model.samples += int(counts[i])
+            model.events += events.get(sensor_id, 0)
+            model.fitted_through = fitted_through[sensor_id]
+            model.updated_at = now
+            if model.sum_t_log < 0:
+                model.time_constant = -model.sum_t2 / model.sum_t_log
+        return samples
+
+    # --- ПЕРИОДИЧЕСКИЙ ЗАПУСК ---
+
+    def run_once(self, now: Optional[datetime] = None) -> Optional[Dict]:
+        db = self.session_factory()
+        try:
+            return self.fit(db, now)
+        except Exception as e:
+            db.rollback()
+            self.failed += 1
+            print(f"❌ ERROR: Response model fit failed: {e}")
+            return None
+        finally:
+            db.close()
+
+    def start(self):
+        """Запускает периодическую (ночную) подгонку"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="response-model-fit", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            sensors = len(self._time_constants) if self._time_constants is not None else None
+        return {'sensors': sensors, 'fits': self.fits, 'events_fitted': self.events_fitted, 'failed': self.failed}
+
+
+def _response_points(ts: np.ndarray, values: np.ndarray, change, end: datetime):
+    """(t секунд после смены цели, ln r) для точек отклика на одно изменение"""
+    start_us, end_us = to_epoch_us([change.changed_at, end])
+    i = int(np.searchsorted(ts, start_us, side="right"))
+    j = int(np.searchsorted(ts, end_us, side="right"))
+    if i == 0 or i >= j:
+        return np.empty(0), np.empty(0)
+    y0 = values[i - 1]                      # последнее показание до смены цели
+    step = y0 - change.new_target
+    if abs(step) <= RecommendationGenerator.SETTLE_TOLERANCE:
+        return np.empty(0), np.empty(0)
+    ratio = (values[i:j] - change.new_target) / step
+    keep = (ratio > MIN_RATIO) & (ratio < MAX_RATIO)
+    t = (ts[i:j][keep] - start_us) / 1e6
+    return t, np.log(ratio[keep])
+
+
+# Глобальное хранилище моделей отклика для использования в приложении
+response_models = ResponseModelStore()
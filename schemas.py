@@ -85,6 +85,9 @@ class MeasurementCreate(BaseModel):
     value: float
     sensor_id: int
 
+class MeasurementBatchItem(MeasurementCreate):
+    timestamp: Optional[datetime] = None  # По умолчанию - время приёма
+
 class MeasurementRead(BaseModel):
     id: int
     value: float
@@ -132,6 +135,21 @@ class LocationRead(BaseModel):
     class Config:
         from_attributes = True
 
+class ComfortRangeBase(BaseModel):
+    """Норма типа датчика: на локацию (location_id) или на тип помещения (room_type)"""
+    location_id: Optional[int] = None
+    room_type: Optional[str] = None
+    sensor_type_id: int
+    min_value: float
+    max_value: float
+    target_value: Optional[float] = None  # None - середина диапазона
+
+class ComfortRangeRead(ComfortRangeBase):
+    id: int
+    updated_at: Optional[datetime] = None
+    class Config:
+        from_attributes = True
+
 
 # --- 6. АНАЛИЗ АНОМАЛИЙ ---
 
@@ -190,9 +208,9 @@ class RecommendationWithStatus(IntelligentRecommendationRead):
 class VoiceNotificationCommandBase(BaseModel):
     transcript: str
     detected_language: str = 'en'
-    speech_confidence: float
+    speech_confidence: Optional[float] = None  # None, если транскрипт пришёл без STT
     command: str
-    command_confidence: float
+    command_confidence: Optional[float] = None
 
 class VoiceNotificationCommandCreate(VoiceNotificationCommandBase):
     notification_id: int
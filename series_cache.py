@@ -0,0 +1,245 @@
+"""
+Кэш истории датчиков в memory-mapped файлах NumPy.
+
+Детекторы аномалий (_analyze_sensor) многократно читают одно и то же
+скользящее окно истории датчика. Кэш хранит ряд каждого датчика в двух
+append-only файлах (sensor_<id>.ts - int64 мкс эпохи, sensor_<id>.val -
+float64) и отдаёт срезы np.memmap без копирования. Из БД дочитывается
+только хвост новее уже закэшированного (crud.get_sensor_series). Когда
+начало окна уходит далеко вперёд, ряд переписывается с начала окна
+(rebase) - файлы не растут со всей историей датчика.
+
+Чтение и дозапись идут под блокировкой датчика: общий замок охраняет
+только словарь рядов, поэтому запросы к разным датчикам не ждут друг друга.
+
+Кэшируются только точки старше settle_seconds: самые свежие данные ещё
+могут дописываться, поэтому хвост окна всегда читается из БД.
+Опоздавшие записи задним числом сбрасывают кэш датчика (note_write).
+
+Кэш включается переменной SERIES_CACHE_DIR; без неё get_series просто
+читает БД. Файлы общие для процессов только на чтение - писать в один
+каталог должен один процесс.
+"""
+
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+import crud
+from block_store import from_epoch_us, to_epoch_us
+
+SERIES_CACHE_DIR = os.environ.get("SERIES_CACHE_DIR")
+SETTLE_SECONDS = int(os.environ.get("SERIES_CACHE_SETTLE_SECONDS", 300))
+
+# Ряд переписывается с начала окна, когда точек до него накопилось
+# не меньше половины файла и не меньше REBASE_MIN_POINTS
+REBASE_MIN_POINTS = int(os.environ.get("SERIES_CACHE_REBASE_MIN_POINTS", 4096))
+
+# meta: [floor_us, covered_us, count] - кэш содержит все точки из [floor, covered)
+_META_FIELDS = 3
+
+
+class SensorSeries:
+    """Файлы одного датчика и их отображение в память"""
+
+    def __init__(self, cache_dir: str, sensor_id: int):
+        base = os.path.join(cache_dir, f"sensor_{sensor_id}")
+        self.ts_path = base + ".ts"
+        self.values_path = base + ".val"
+        self.meta_path = base + ".meta"
+        self.floor_us, self.covered_us, self.count = self._read_meta()
+        self._ts: Optional[np.ndarray] = None
+        self._values: Optional[np.ndarray] = None
+
+    def _read_meta(self) -> Tuple[int, int, int]:
+        try:
+            meta = np.fromfile(self.meta_path, dtype=np.int64)
+        except FileNotFoundError:
+            return 0, 0, 0
+        if len(meta) != _META_FIELDS:
+            return 0, 0, 0
+        return int(meta[0]), int(meta[1]), int(meta[2])
+
+    def _write_meta(self):
+        # meta пишется последней: при сбое лишние байты в хвосте файлов игнорируются
+        tmp_path = self.meta_path + ".tmp"
+        np.array([self.floor_us, self.covered_us, self.count], dtype=np.int64).tofile(tmp_path)
+        os.replace(tmp_path, self.meta_path)
+
+    @property
+    def empty(self) -> bool:
+        return self.covered_us == 0
+
+    def reset(self, floor_us: int = 0):
+        """Начинает ряд заново с floor_us (0 - пустой ряд)"""
+        # Новые файлы вместо усечения: уже выданные срезы memmap остаются валидными
+        for path in (self.ts_path, self.values_path):
+            open(path + ".tmp", "wb").close()
+            os.replace(path + ".tmp", path)
+        self.floor_us, self.covered_us, self.count = floor_us, floor_us, 0
+        self._ts = self._values = None
+        self._write_meta()
+
+    def rebase(self, floor_us: int, offset: int):
+        """Переписывает ряд без первых offset точек (все они раньше floor_us)"""
+        ts, values = self.arrays()
+        # Новые файлы вместо сдвига: уже выданные срезы memmap остаются валидными
+        for path, data in ((self.ts_path, ts[offset:]), (self.values_path, values[offset:])):
+            np.asarray(data).tofile(path + ".tmp")
+            os.replace(path + ".tmp", path)
+        self.floor_us, self.count = floor_us, self.count - offset
+        self._ts = self._values = None
+        self._write_meta()
+
+    def append(self, ts: np.ndarray, values: np.ndarray, covered_us: int):
+        """Дописывает точки [covered, covered_us) в конец файлов"""
+        if len(ts):
+            for path, data in ((self.ts_path, ts.astype(np.int64)), (self.values_path, values.astype(np.float64))):
+                with open(path, "r+b") as f:
+                    f.seek(self.count * 8)
+                    f.write(data.tobytes())
+                    f.truncate()
+            self.count += len(ts)
+            self._ts = self._values = None
+        self.covered_us = covered_us
+        self._write_meta()
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """np.memmap всего ряда (только чтение)"""
+        if self.count == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        if self._ts is None:
+            self._ts = np.memmap(self.ts_path, dtype=np.int64, mode="r", shape=(self.count,))
+            self._values = np.memmap(self.values_path, dtype=np.float64, mode="r", shape=(self.count,))
+        return self._ts, self._values
+
+
+class SeriesCache:
+    """Append-only memmap-кэш рядов датчиков поверх crud.get_sensor_series"""
+
+    def __init__(self, cache_dir: Optional[str] = SERIES_CACHE_DIR, settle_seconds: int = SETTLE_SECONDS,
+                 rebase_min_points: int = REBASE_MIN_POINTS):
+        """
+        Args:
+            cache_dir: Каталог файлов кэша (None - кэш выключен)
+            settle_seconds: Точки новее now - settle_seconds не кэшируются
+            rebase_min_points: Сколько точек до начала окна (и не меньше половины ряда)
+                               запускают перезапись ряда с начала окна
+        """
+        self.cache_dir = cache_dir
+        self.settle = timedelta(seconds=settle_seconds)
+        self.rebase_min_points = rebase_min_points
+        self._series: Dict[int, SensorSeries] = {}
+        self._sensor_locks: Dict[int, threading.Lock] = {}
+        self._lock = threading.Lock()          # только словари рядов и счётчики
+
+        self.hits = 0
+        self.misses = 0
+        self.rows_loaded = 0
+        self.invalidations = 0
+        self.rebases = 0
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.cache_dir)
+
+    def get_series(self, db: Session, sensor_id: int,
+                   start: datetime,
+                   end: Optional[datetime] = None,
+                   now: Optional[datetime] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        История датчика за [start, end) - (timestamps int64 мкс, values float64).
+
+        Если окно целиком в кэше, возвращаются срезы memmap без копирования
+        (только чтение); иначе закэшированная часть склеивается со свежим
+        хвостом из БД.
+        """
+        if not self.enabled:
+            return crud.get_sensor_series(db, sensor_id, start, end)
+
+        now = now or datetime.utcnow()
+        settled = min(now - self.settle, end) if end is not None else now - self.settle
+        start_us = int(to_epoch_us([start])[0])
+        settled_us = int(to_epoch_us([settled])[0])
+
+        series, sensor_lock = self._sensor(sensor_id)
+        with sensor_lock:
+            miss = series.empty or start_us < series.floor_us
+            if miss:
+                series.reset(start_us)
+            loaded = 0
+            if settled_us > series.covered_us:
+                ts, values = crud.get_sensor_series(db, sensor_id, from_epoch_us(series.covered_us), settled)
+                series.append(ts, values, settled_us)
+                loaded = len(ts)
+            cached_ts, cached_values = series.arrays()
+            lo = int(np.searchsorted(cached_ts, start_us, side="left"))
+            rebased = lo >= max(self.rebase_min_points, series.count // 2)
+            if rebased:
+                series.rebase(start_us, lo)
+                cached_ts, cached_values = series.arrays()
+                lo = 0
+            covered = from_epoch_us(series.covered_us)
+        with self._lock:
+            self.misses += miss
+            self.hits += not miss
+            self.rows_loaded += loaded
+            self.rebases += rebased
+
+        if end is not None and end <= covered:
+            hi = int(np.searchsorted(cached_ts, to_epoch_us([end])[0], side="left"))
+            return cached_ts[lo:hi], cached_values[lo:hi]
+
+        tail_ts, tail_values = crud.get_sensor_series(db, sensor_id, max(start, covered), end)
+        if not len(tail_ts):
+            return cached_ts[lo:], cached_values[lo:]
+        return np.concatenate([cached_ts[lo:], tail_ts]), np.concatenate([cached_values[lo:], tail_values])
+
+    def note_write(self, sensor_id: int, timestamp: datetime):
+        """Сбрасывает ряд датчика, если записано измерение внутри закэшированного интервала"""
+        if not self.enabled:
+            return
+        with self._lock:
+            known = sensor_id in self._series
+        if not known and not os.path.exists(os.path.join(self.cache_dir, f"sensor_{sensor_id}.meta")):
+            return
+        series, sensor_lock = self._sensor(sensor_id)
+        with sensor_lock:
+            invalidated = not series.empty and to_epoch_us([timestamp])[0] < series.covered_us
+            if invalidated:
+                series.reset()
+        if invalidated:
+            with self._lock:
+                self.invalidations += 1
+
+    def stats(self) -> Dict:
+        """Статистика кэша"""
+        return {
+            'enabled': self.enabled,
+            'sensors': len(self._series),
+            'hits': self.hits,
+            'misses': self.misses,
+            'rows_loaded': self.rows_loaded,
+            'invalidations': self.invalidations,
+            'rebases': self.rebases
+        }
+
+    def _sensor(self, sensor_id: int) -> Tuple[SensorSeries, threading.Lock]:
+        """Ряд датчика и его блокировка (создаются при первом обращении)"""
+        with self._lock:
+            series = self._series.get(sensor_id)
+            if series is None:
+                series = self._series[sensor_id] = SensorSeries(self.cache_dir, sensor_id)
+                self._sensor_locks[sensor_id] = threading.Lock()
+            return series, self._sensor_locks[sensor_id]
+
+
+# Глобальный кэш рядов для использования в приложении
+series_cache = SeriesCache()
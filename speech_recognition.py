@@ -7,6 +7,10 @@ import os
 from typing import Dict, Optional
 import json
 from datetime import datetime
+from functools import lru_cache
+
+from command_matcher import KeywordMatcher, INTEGER_PATTERN, cache_stats, normalize_transcript
+from interaction_history import InteractionHistory
 
 
 class SpeechRecognizer:
@@ -120,7 +124,11 @@ class VoiceCommandParser:
     Преобразует распознанный текст в команды.
     """
     
-    def __init__(self):
+    def __init__(self, cache_size: int = 1024):
+        """
+        Args:
+            cache_size: Размер LRU-кэша результатов разбора
+        """
         # Словари команд на разных языках
         self.commands = {
             'temperature_up': {
@@ -152,6 +160,10 @@ class VoiceCommandParser:
                 'en': ['what is temperature', 'how are conditions', 'give status']
             }
         }
+        # Фразы выбранного языка + английские, скомпилированные один раз
+        self.matcher = KeywordMatcher(self.commands, merge_fallback=True)
+        # Кэш разбора по нормализованному тексту и языку
+        self._cached_match = lru_cache(maxsize=cache_size)(self._match_command)
     
     def parse_command(self, text: str, detected_language: str = 'en') -> Dict:
         """
@@ -169,37 +181,40 @@ class VoiceCommandParser:
                 'raw_text': str
             }
         """
-        text_lower = text.lower()
-        best_command = None
-        best_confidence = 0
+        command, confidence, parameters = self._cached_match(
+            normalize_transcript(text), detected_language
+        )
         
-        for command, lang_dict in self.commands.items():
-            phrases = lang_dict.get(detected_language, []) + lang_dict.get('en', [])
-            
-            for phrase in phrases:
-                if phrase in text_lower:
-                    confidence = len(phrase) / len(text_lower)  # Простая эвристика
-                    if confidence > best_confidence:
-                        best_command = command
-                        best_confidence = confidence
+        return {
+            'command': command,
+            'confidence': confidence,
+            'parameters': dict(parameters),
+            'raw_text': text
+        }
+    
+    def _match_command(self, normalized: str, detected_language: str) -> tuple:
+        """
+        Ищет команду в нормализованном тексте (результат кэшируется).
         
-        if not best_command:
-            return {
-                'command': 'unknown',
-                'confidence': 0.0,
-                'parameters': {},
-                'raw_text': text
-            }
+        Returns:
+            (команда, уверенность, параметры)
+        """
+        match = self.matcher.match(normalized, detected_language)
+        
+        if not match:
+            return 'unknown', 0.0, {}
+        
+        best_command, phrase = match
+        best_confidence = len(phrase) / len(normalized)  # Простая эвристика
         
         # Извлекаем параметры из команды
-        parameters = self._extract_parameters(best_command, text_lower)
+        parameters = self._extract_parameters(best_command, normalized)
         
-        return {
-            'command': best_command,
-            'confidence': round(min(best_confidence, 1.0), 3),
-            'parameters': parameters,
-            'raw_text': text
-        }
+        return best_command, round(min(best_confidence, 1.0), 3), parameters
+    
+    def cache_stats(self) -> Dict:
+        """Метрики кэша разбора: попадания, промахи, размер, hit rate"""
+        return cache_stats(self._cached_match)
     
     def _extract_parameters(self, command: str, text: str) -> Dict:
         """
@@ -209,10 +224,9 @@ class VoiceCommandParser:
         parameters = {}
         
         # Ищем числа в тексте
-        import re
-        numbers = re.findall(r'\d+', text)
-        if numbers:
-            parameters['value'] = int(numbers[0])
+        number = INTEGER_PATTERN.search(text)
+        if number:
+            parameters['value'] = int(number.group(0))
         
         # Базовые параметры для каждой команды
         if 'temperature' in command:
@@ -244,10 +258,14 @@ class VoiceInteractionManager:
     - Логирование
     """
     
-    def __init__(self):
+    def __init__(self, history_size: int = 1000):
+        """
+        Args:
+            history_size: Ёмкость кольцевого буфера истории взаимодействий
+        """
         self.recognizer = SpeechRecognizer()
         self.command_parser = VoiceCommandParser()
-        self.interaction_history = []
+        self.interaction_history = InteractionHistory(capacity=history_size)
     
     def process_voice_input(self, audio_file_path: str) -> Dict:
         """
@@ -297,11 +315,15 @@ class VoiceInteractionManager:
     
     def get_history(self, limit: int = 10) -> list:
         """Получает историю последних взаимодействий"""
-        return self.interaction_history[-limit:]
+        return self.interaction_history.recent(limit)
+    
+    def get_stats(self) -> Dict:
+        """Статистика команд (O(1), без сканирования истории)"""
+        return self.interaction_history.stats()
     
     def clear_history(self):
         """Очищает историю взаимодействий"""
-        self.interaction_history = []
+        self.interaction_history.clear()
 
 
 # Инициализация глобального менеджера
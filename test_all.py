@@ -9,7 +9,9 @@ import sys
 test_files = [
     'test_anomaly_detection.py',
     'test_recommendations.py',
-    'test_voice_commands.py'
+    'test_voice_commands.py',
+    'test_crud.py',
+    'test_postgres.py'
 ]
 
 print("=" * 80)
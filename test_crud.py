@@ -0,0 +1,1026 @@
+"""
+Tests for the database layer (crud.py and background writers).
+Runs against a temporary SQLite database.
+"""
+
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+
+# База создаётся во временной папке до импорта database.py
+_tmp_dir = tempfile.mkdtemp()
+os.environ["DATABASE_FILE"] = os.path.join(_tmp_dir, "test.db")
+
+import crud
+import models
+import schemas
+from database import AsyncSessionLocal, Base, SessionLocal, create_sqlite_engine, engine
+from voice_event_writer import VoiceEventWriter
+from db_maintenance import SQLiteMaintenance
+from measurement_storage import MeasurementRetention
+from series_cache import SeriesCache
+import measurement_export
+import report_engine
+import pagination
+import fast_json
+from report_jobs import ReportJobQueue
+from recommendation_sink import RecommendationSink
+from response_cache import ResponseCache, ResponseCacheMiddleware
+from request_metrics import RequestMetrics, RequestMetricsMiddleware
+from recommendation_verifier import RecommendationVerifier
+from response_model import ResponseModelStore
+from comfort_ranges import ComfortRangeTable, comfort_ranges
+from live_stream import LiveHub, format_sse, live_hub, publish_measurement
+from intelligent_recommendation_engine import RecommendationGenerator
+from datetime import datetime, timedelta
+from sqlalchemy import event, text
+from sqlalchemy.orm import sessionmaker
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import TypeAdapter
+from typing import List
+import numpy as np
+
+import block_store
+
+Base.metadata.create_all(bind=engine)
+
+print("=" * 80)
+print("TEST: DATABASE LAYER")
+print("=" * 80)
+
+db = SessionLocal()
+notification = models.Notification(title="Temperature too high")
+db.add(notification)
+db.commit()
+
+# Test 1: Voice command with full metadata in one transaction
+print("\n" + "-" * 80)
+print("TEST 1: VOICE COMMAND WITH METADATA")
+print("-" * 80)
+
+command = crud.create_voice_notification_command(
+    db,
+    notification_id=notification.id,
+    transcript="да",
+    command="confirm",
+    execution_status="success",
+    speech_confidence=0.93,
+    command_confidence=1.0,
+    detected_language="ru",
+    complete_notification=True
+)
+db.refresh(notification)
+
+print(f"  Command: {command.command}, language: {command.detected_language}, "
+      f"speech: {command.speech_confidence}, command: {command.command_confidence}")
+assert command.speech_confidence == 0.93
+assert command.command_confidence == 1.0
+assert command.detected_language == "ru"
+assert command.executed_at is not None
+assert notification.is_completed, "Notification must be closed in the same transaction"
+print("  ✓ PASS")
+
+# Test 2: Background batch writer
+print("\n" + "-" * 80)
+print("TEST 2: BACKGROUND VOICE EVENT WRITER")
+print("-" * 80)
+
+writer = VoiceEventWriter(batch_size=50, flush_interval=0.05)
+writer.start()
+for i in range(120):
+    writer.submit({
+        'notification_id': notification.id,
+        'transcript': f"нет {i}",
+        'command': "reject",
+        'execution_status': "success",
+        'detected_language': "ru",
+        'command_confidence': 0.5,
+    })
+writer.stop()
+
+stats = writer.stats()
+stored = db.query(models.VoiceNotificationCommand).filter(
+    models.VoiceNotificationCommand.command == "reject"
+).count()
+print(f"  Writer stats: {stats}, stored: {stored}")
+assert stored == 120
+assert stats['written'] == 120 and stats['failed'] == 0
+assert stats['batches'] < 120, "Events must be written in batches"
+print("  ✓ PASS")
+
+# Test 3: SQLite pragma profile and WAL maintenance
+print("\n" + "-" * 80)
+print("TEST 3: SQLITE PRAGMA PROFILE AND CHECKPOINT")
+print("-" * 80)
+
+with engine.connect() as conn:
+    journal_mode = conn.execute(text("PRAGMA journal_mode")).scalar()
+    busy_timeout = conn.execute(text("PRAGMA busy_timeout")).scalar()
+print(f"  journal_mode: {journal_mode}, busy_timeout: {busy_timeout}")
+assert journal_mode == "wal"
+assert busy_timeout == 5000
+try:
+    create_sqlite_engine(f"sqlite:///{os.path.join(_tmp_dir, 'profile.db')}", profile="fast")
+    raise AssertionError("Unknown SQLITE_PROFILE must be rejected")
+except ValueError as e:
+    assert "default, production" in str(e)
+
+checkpoint = SQLiteMaintenance(engine).run_once()
+print(f"  Checkpoint: {checkpoint}")
+assert checkpoint is not None and checkpoint['busy'] == 0
+print("  ✓ PASS")
+
+# Test 4: Monthly partitions, retention and pruned reads
+print("\n" + "-" * 80)
+print("TEST 4: PARTITIONS AND RETENTION POLICY")
+print("-" * 80)
+
+location = models.Location(name="Lab", room_type="laboratory")
+sensor_type = models.SensorType(name="Temperature", unit="°C")
+db.add_all([location, sensor_type])
+db.commit()
+sensor = models.Sensor(name="Lab T", location_id=location.id, sensor_type_id=sensor_type.id)
+db.add(sensor)
+db.commit()
+
+now = datetime(2026, 6, 15, 12, 0)
+rows = [
+    {"sensor_id": sensor.id, "location_id": location.id, "value": 20 + (i % 10),
+     "timestamp": now - timedelta(hours=i)}
+    for i in range(24 * 150)  # ~5 месяцев почасовых данных
+]
+crud.bulk_insert_measurements(db, rows)
+period = (now - timedelta(days=200), now + timedelta(days=1))
+before = crud.calculate_report_data(db, *period)
+
+retention = MeasurementRetention(SessionLocal, block_days=0, hot_days=31, raw_days=90)
+result = retention.run_once(now=now)
+partitions = [p.table_name for p in db.query(models.MeasurementPartition).order_by(models.MeasurementPartition.range_start)]
+hot_rows = db.query(models.Measurement).filter(models.Measurement.sensor_id == sensor.id).count()
+print(f"  Archived: {result['archived']}, dropped: {result['dropped']}, partitions: {partitions}, hot rows: {hot_rows}")
+assert result['archived'] > 0 and result['dropped'], "Old months must be archived and rolled up"
+assert all(name not in partitions for name in result['dropped'])
+
+# Сырые данные, оставшиеся в партициях и горячей таблице, читаются целиком
+raw_start = datetime(2026, 3, 1)
+streamed = sum(1 for _ in crud.iter_measurements(db, sensor_id=sensor.id, start=raw_start))
+expected = sum(1 for r in rows if r["timestamp"] >= raw_start)
+print(f"  Streamed since {raw_start:%Y-%m-%d}: {streamed} (expected {expected})")
+assert streamed == expected
+assert len(crud.measurement_sources(db, now - timedelta(days=7))) == 1, "Recent reads must touch the hot table only"
+
+# Среднее/мин/макс по всей истории совпадают: сырые партиции + почасовые агрегаты
+# (перцентили и время вне нормы считаются только по сохранённым точкам)
+after = crud.calculate_report_data(db, *period)
+print(f"  Report before: {before}")
+print(f"  Report after:  {after}")
+core = lambda report: [{k: r[k] for k in ("location", "sensor", "type", "avg", "min", "max")} for r in report]
+assert core(before) == core(after)
+print("  ✓ PASS")
+
+# Test 5: Compressed columnar blocks
+print("\n" + "-" * 80)
+print("TEST 5: COLUMNAR BLOCK STORE")
+print("-" * 80)
+
+ts = block_store.to_epoch_us([now - timedelta(minutes=90 - i, seconds=i % 7) for i in range(90)])
+for values in ([round(21 + i * 0.01, 2) for i in range(90)], [21 + i / 3 for i in range(90)]):
+    block = block_store.encode_block(ts, block_store.np.array(values))
+    decoded_ts, decoded_values = block_store.decode_block(models.MeasurementBlock(**block))
+    print(f"  Codec {block['codec']}: {len(block['timestamps'])} + {len(block['values'])} bytes for 90 points")
+    assert (decoded_ts == ts).all() and decoded_values.tolist() == values, "Codec must be lossless"
+
+block_sensor = models.Sensor(name="Lab T2", location_id=location.id, sensor_type_id=sensor_type.id)
+db.add(block_sensor)
+db.commit()
+block_rows = [
+    {"sensor_id": block_sensor.id, "location_id": location.id, "value": round(20 + (i % 37) * 0.1, 1),
+     "timestamp": now - timedelta(minutes=5 * i)}
+    for i in range(12 * 24 * 5)  # 5 суток с шагом 5 минут
+]
+crud.bulk_insert_measurements(db, block_rows)
+block_period = (now - timedelta(days=10), now + timedelta(days=1))
+report_before = crud.calculate_report_data(db, *block_period)
+analytics_before = crud.get_analytics_daily(db, block_sensor.id, days=10, now=now)
+
+def exact_daily(start):
+    """Средние по дням без округления (_format_daily округляет до 0.1)"""
+    names = db.execute(crud._partition_names_query(start)).scalars().all()
+    return db.execute(crud._analytics_daily_query(block_sensor.id, start, names)).all()
+
+partial_start = now - timedelta(days=3)                  # окно начинается внутри сжимаемых суток
+partial_before = exact_daily(partial_start)
+
+result = MeasurementRetention(SessionLocal, block_days=1, hot_days=31, raw_days=90).run_once(now=now)
+blocks = db.query(models.MeasurementBlock).filter(models.MeasurementBlock.sensor_id == block_sensor.id).all()
+hot_rows = db.query(models.Measurement).filter(models.Measurement.sensor_id == block_sensor.id).count()
+print(f"  Compacted: {result['compacted']} rows, sensor blocks: {len(blocks)}, hot rows left: {hot_rows}")
+assert result['compacted'] > 0 and blocks
+
+ts, values = block_store.read_blocks(db, block_sensor.id)
+assert len(ts) == sum(b.sample_count for b in blocks) == len(block_rows) - hot_rows
+assert (block_store.np.diff(ts) > 0).all()
+streamed = list(crud.iter_measurements(db, sensor_id=block_sensor.id))
+assert len(streamed) == len(block_rows)
+assert [p.timestamp for p in streamed] == sorted(r["timestamp"] for r in block_rows)
+report_after = crud.calculate_report_data(db, *block_period)
+analytics_after = crud.get_analytics_daily(db, block_sensor.id, days=10, now=now)
+print(f"  Report before: {report_before}")
+print(f"  Report after:  {report_after}")
+assert report_before == report_after
+assert analytics_before == analytics_after
+partial_after = exact_daily(partial_start)
+assert [r.date for r in partial_before] == [r.date for r in partial_after]
+assert np.allclose([r.avg_value for r in partial_before], [r.avg_value for r in partial_after]), \
+    "The first day must not depend on whether it is compacted"
+assert analytics_after and partial_after[0].date == partial_start.date()
+
+# Последние точки блоков: данные блоков приходят тем же запросом, пачками от новых к старым
+block_selects = []
+count_selects = lambda conn, cursor, statement, *args: block_selects.append(statement)
+event.listen(engine, "before_cursor_execute", count_selects)
+page = block_store.latest_block_points(db, sensor_id=block_sensor.id, limit=10)
+page_selects = len(block_selects)
+walk = block_store.latest_block_points(db, sensor_id=block_sensor.id, limit=len(ts))  # все блоки
+event.remove(engine, "before_cursor_execute", count_selects)
+assert page_selects == 1
+assert len(block_selects) - page_selects == len(blocks) // block_store.LATEST_BLOCKS_BATCH + 1
+assert block_store.to_epoch_us([p.timestamp for p in walk]).tolist() == ts[::-1].tolist()
+assert page == walk[:10]
+
+# Датчик замолчал три дня назад: история сжимается, последнее показание остаётся строкой
+quiet_sensor = models.Sensor(name="Lab T quiet", location_id=location.id, sensor_type_id=sensor_type.id)
+db.add(quiet_sensor)
+db.commit()
+quiet_last = now - timedelta(days=3)
+crud.bulk_insert_measurements(db, [
+    {"sensor_id": quiet_sensor.id, "location_id": location.id, "value": 18.0 + i * 0.5,
+     "timestamp": quiet_last - timedelta(hours=i)}
+    for i in range(24)
+])
+newest_key_reads = []
+count_newest_keys = lambda conn, cursor, statement, *args: newest_key_reads.append(statement) if "HAVING" in statement else None
+event.listen(engine, "before_cursor_execute", count_newest_keys)
+MeasurementRetention(SessionLocal, block_days=1, hot_days=31, raw_days=90).run_once(now=now)
+event.remove(engine, "before_cursor_execute", count_newest_keys)
+assert len(newest_key_reads) == 2, "Newest rows are read once per compact and once per archive run"
+MeasurementRetention(SessionLocal, block_days=1, hot_days=31, raw_days=90).run_once(now=now)  # повтор не трогает её
+quiet_hot = db.query(models.Measurement).filter(models.Measurement.sensor_id == quiet_sensor.id).all()
+quiet_ts, quiet_values = block_store.read_blocks(db, quiet_sensor.id)
+last = crud.get_last_measurement(db, quiet_sensor.id)
+print(f"  Quiet sensor: {len(quiet_ts)} points in blocks, hot rows: {len(quiet_hot)}, last value: {last.value}")
+assert len(quiet_hot) == 1 and len(quiet_ts) == 23
+assert last.value == 18.0 and last.timestamp == quiet_last
+past = crud.get_measurement_at(db, quiet_sensor.id, quiet_last - timedelta(minutes=30))
+assert past.value == 18.5 and past.timestamp == quiet_last - timedelta(hours=1), "Older values come from blocks"
+assert crud.get_measurement_at(db, quiet_sensor.id, now).value == 18.0
+print("  ✓ PASS")
+
+# Test 6: NumPy series read path and memory-mapped cache
+print("\n" + "-" * 80)
+print("TEST 6: NUMPY SERIES AND MEMMAP CACHE")
+print("-" * 80)
+
+for sid in (sensor.id, block_sensor.id):   # партиции + горячая таблица; блоки + горячая таблица
+    ts, values = crud.get_sensor_series(db, sid, start=raw_start)
+    points = list(crud.iter_measurements(db, sensor_id=sid, start=raw_start))
+    assert ts.dtype == block_store.np.int64 and values.dtype == block_store.np.float64
+    assert (ts == block_store.to_epoch_us([p.timestamp for p in points])).all()
+    assert values.tolist() == [p.value for p in points]
+
+cache = SeriesCache(os.path.join(_tmp_dir, "series"), settle_seconds=300)
+window = (now - timedelta(days=3), now - timedelta(hours=1))
+first = cache.get_series(db, block_sensor.id, *window, now=now)
+second = cache.get_series(db, block_sensor.id, *window, now=now)
+expected_ts, expected_values = crud.get_sensor_series(db, block_sensor.id, *window)
+print(f"  Window points: {len(second[0])}, cache: {cache.stats()}")
+assert (second[0] == expected_ts).all() and (second[1] == expected_values).all()
+assert block_store.np.shares_memory(first[1], second[1]), "Cached window must be served from the memmap"
+assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+# Запись задним числом внутри закэшированного интервала сбрасывает ряд
+late = {"sensor_id": block_sensor.id, "location_id": location.id, "value": 99.0, "timestamp": now - timedelta(days=2)}
+crud.bulk_insert_measurements(db, [late])
+cache.note_write(block_sensor.id, late["timestamp"])
+refreshed = cache.get_series(db, block_sensor.id, *window, now=now)
+assert len(refreshed[0]) == len(expected_ts) + 1 and 99.0 in refreshed[1]
+
+# Чтение одного датчика не держит общий замок: пока занят ряд block_sensor, другой датчик читается
+_, block_sensor_lock = cache._sensor(block_sensor.id)
+with block_sensor_lock:
+    other = cache.get_series(db, sensor.id, *window, now=now)
+assert (other[0] == crud.get_sensor_series(db, sensor.id, *window)[0]).all()
+
+# Окно ушло вперёд: ряд переписывается с его начала, файл не растёт со всей историей
+sliding = SeriesCache(os.path.join(_tmp_dir, "series_sliding"), settle_seconds=300, rebase_min_points=10)
+sliding.get_series(db, block_sensor.id, now - timedelta(days=4), now=now)
+full_count = sliding._sensor(block_sensor.id)[0].count
+moved_start = now - timedelta(days=1)
+moved = sliding.get_series(db, block_sensor.id, moved_start, now=now)
+series_file = sliding._sensor(block_sensor.id)[0]
+print(f"  Rebased: {full_count} -> {series_file.count} cached points, cache: {sliding.stats()}")
+assert sliding.stats()['rebases'] == 1 and series_file.count < full_count
+assert os.path.getsize(series_file.ts_path) == series_file.count * 8
+assert (moved[0] == crud.get_sensor_series(db, block_sensor.id, moved_start)[0]).all()
+assert sliding.get_series(db, block_sensor.id, moved_start, now=now)[0].tolist() == moved[0].tolist()
+print("  ✓ PASS")
+
+# Test 7: Parquet / Arrow export and import
+print("\n" + "-" * 80)
+print("TEST 7: PARQUET AND ARROW EXPORT/IMPORT")
+print("-" * 80)
+
+if measurement_export.pa is None:
+    print("  SKIP: pyarrow not installed")
+else:
+    pa = measurement_export.pa
+    history = [(p.sensor_id, p.location_id, p.value, p.timestamp)
+               for p in crud.iter_measurements(db, sensor_id=block_sensor.id)]
+    path = os.path.join(_tmp_dir, "history.parquet")
+    exported = measurement_export.write_measurements(db, path, "parquet", sensor_id=block_sensor.id, batch_size=500)
+    table = measurement_export.pq.read_table(path)
+    print(f"  Parquet: {exported} rows, {measurement_export.pq.ParquetFile(path).num_row_groups} row groups")
+    assert exported == len(history) == table.num_rows
+    assert list(zip(*[table.column(c).to_pylist() for c in ("sensor_id", "location_id", "value", "timestamp")])) == history
+
+    streamed = b"".join(measurement_export.iter_export_chunks(db, "arrow", sensor_id=block_sensor.id, batch_size=500))
+    assert pa.ipc.open_stream(streamed).read_all().equals(table)
+
+    # Импорт: location_id берётся из датчика, строки неизвестного датчика пропускаются
+    upload = pa.table({
+        "sensor_id": [block_sensor.id, block_sensor.id, 9999],
+        "value": [1.5, 2.5, 3.5],
+        "timestamp": pa.array([now + timedelta(days=30, minutes=i) for i in range(3)], type=pa.timestamp("ms")),
+    })
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, upload.schema) as writer:
+        writer.write_table(upload)
+    result = measurement_export.import_measurements(db, io.BytesIO(sink.getvalue().to_pybytes()), "arrow")
+    imported = db.query(models.Measurement).filter(models.Measurement.timestamp > now + timedelta(days=29)).all()
+    print(f"  Import: {result}")
+    assert result == {'imported': 2, 'skipped': 1}
+    assert {m.location_id for m in imported} == {location.id}
+print("  ✓ PASS")
+
+# Test 8: Streaming report engine
+print("\n" + "-" * 80)
+print("TEST 8: STREAMING REPORT ENGINE")
+print("-" * 80)
+
+report_rows = crud.calculate_report_data(db, *period)
+text_report = b"".join(report_engine.render_report(crud.iter_report_rows(db, *period), "txt", "Отчет", chunk_rows=1))
+expected_text = "Отчет\n" + "-" * 50 + "\n" + "".join(
+    f"Локация: {d['location']} | Датчик: {d['sensor']} ({d['type']})\n"
+    f"  Среднее: {d['avg']} | Мин: {d['min']} | Макс: {d['max']}\n"
+    f"  P5: {d['p5']} | Медиана: {d['p50']} | P95: {d['p95']} | СКО: {d['std']}\n"
+    f"  Вне нормы: {d['minutes_out_of_range']} мин | Аномалий: {d['anomalies']} | Рекомендаций: {d['recommendations']}\n"
+    for d in report_rows
+)
+assert text_report.decode("utf-8") == expected_text
+
+csv_report = gzip.decompress(b"".join(report_engine.render_report(iter(report_rows), "csv", compress=True)))
+parsed = list(csv.reader(io.StringIO(csv_report.decode("utf-8-sig"))))
+print(f"  CSV rows: {len(parsed) - 1}, header: {parsed[0]}")
+assert len(parsed) == len(report_rows) + 1 and parsed[1][1] == report_rows[0]["sensor"]
+
+if report_engine.xlsxwriter is not None:
+    report_engine.REPORTS_DIR = os.path.join(_tmp_dir, "reports")
+    saved = report_engine.save_report("test.xlsx", report_engine.render_report(iter(report_rows), "xlsx", "Отчет"))
+    assert saved == "/reports/test.xlsx"
+    with open(os.path.join(report_engine.REPORTS_DIR, "test.xlsx"), "rb") as f:
+        assert f.read(2) == b"PK"
+print("  ✓ PASS")
+
+# Test 9: Report job queue with deduplication and content-hash cache
+print("\n" + "-" * 80)
+print("TEST 9: REPORT JOB QUEUE")
+print("-" * 80)
+
+crud.bulk_insert_measurements(db, [{"sensor_id": sensor.id, "location_id": location.id, "value": 21.5,
+                                    "timestamp": datetime.utcnow() - timedelta(hours=1)}])
+jobs = ReportJobQueue(SessionLocal, workers=2, window_seconds=3600)
+jobs.start()
+window_start = datetime(2026, 10, 1, 10, 0)
+first = jobs.submit("week", "csv", now=window_start)
+second = jobs.submit("week", "csv", now=window_start + timedelta(minutes=30))
+assert first is second and first.requests == 2, "Same window must be coalesced onto one job"
+assert first.wait(30) and first.status == "done", first.error
+
+# Следующее окно с теми же данными: файл и запись reports переиспользуются
+third = jobs.submit("week", "csv", now=window_start + timedelta(hours=1))
+assert third is not first and third.wait(30)
+jobs.stop()
+print(f"  Jobs: {first.status} -> {first.file_path}, next window reused: {third.reused}, stats: {jobs.stats()}")
+assert third.reused and third.report_id == first.report_id and third.content_hash == first.content_hash
+assert db.query(models.Report).filter(models.Report.file_path == first.file_path).count() == 1
+
+# Пустой отчёт не поглощает запросы до конца окна: после появления данных задание строится заново
+empty_engine = create_sqlite_engine(f"sqlite:///{os.path.join(_tmp_dir, 'empty_reports.db')}")
+Base.metadata.create_all(bind=empty_engine)
+empty_sessions = sessionmaker(bind=empty_engine)
+empty_jobs = ReportJobQueue(empty_sessions, window_seconds=3600)     # без потоков - синхронно
+empty = empty_jobs.submit("week", "csv", now=window_start)
+assert empty.status == "empty"
+with empty_sessions() as empty_db:
+    empty_location = models.Location(name="Lab E", room_type="laboratory")
+    empty_type = models.SensorType(name="Temperature", unit="°C")
+    empty_db.add_all([empty_location, empty_type])
+    empty_db.flush()
+    empty_sensor = models.Sensor(name="Lab E T", location_id=empty_location.id, sensor_type_id=empty_type.id)
+    empty_db.add(empty_sensor)
+    empty_db.flush()
+    empty_db.add(models.Measurement(sensor_id=empty_sensor.id, location_id=empty_location.id, value=21.0,
+                                    timestamp=datetime.utcnow() - timedelta(hours=1)))
+    empty_db.commit()
+retried = empty_jobs.submit("week", "csv", now=window_start + timedelta(minutes=5))
+assert retried is not empty and retried.status == "done", retried.error
+assert empty_jobs.stats()['coalesced'] == 0 and empty_jobs.stats()['completed'] == 1
+empty_engine.dispose()
+print("  ✓ PASS")
+
+# Test 10: Rich report aggregates (percentiles, time out of range, event counts)
+print("\n" + "-" * 80)
+print("TEST 10: REPORT AGGREGATES")
+print("-" * 80)
+
+stats_location = models.Location(name="Lab B", room_type="laboratory")   # норма 20-24 °C
+db.add(stats_location)
+db.commit()
+stats_sensor = models.Sensor(name="Lab B T", location_id=stats_location.id, sensor_type_id=sensor_type.id)
+db.add(stats_sensor)
+db.commit()
+t0 = now - timedelta(days=3)
+# Шаг 10 минут, затем пропуск связи 3 часа: он учитывается как два шага (20 минут)
+offsets = [0, 10, 20, 30, 40, 50, 240]
+values = [19.0, 21.0, 22.0, 23.0, 25.0, 22.0, 26.0]
+crud.bulk_insert_measurements(db, [
+    {"sensor_id": stats_sensor.id, "location_id": stats_location.id, "value": v, "timestamp": t0 + timedelta(minutes=m)}
+    for m, v in zip(offsets, values)
+])
+db.add_all([
+    models.AnomalyAnalysis(sensor_id=stats_sensor.id, location_id=stats_location.id,
+                           classical_is_anomaly=True, created_at=t0),
+    models.AnomalyAnalysis(sensor_id=stats_sensor.id, location_id=stats_location.id,
+                           classical_is_anomaly=False, created_at=t0),
+    models.IntelligentRecommendation(sensor_id=stats_sensor.id, location_id=stats_location.id, created_at=t0),
+])
+db.commit()
+
+row = next(r for r in crud.iter_report_rows(db, t0 - timedelta(days=1), now + timedelta(days=1)) if r["sensor"] == "Lab B T")
+print(f"  Row: {row}")
+p5, p50, p95 = np.percentile(values, [5, 50, 95])
+assert row["avg"] == round(sum(values) / len(values), 2) and (row["min"], row["max"]) == (19.0, 26.0)
+assert (row["p5"], row["p50"], row["p95"]) == (round(p5, 2), round(p50, 2), round(p95, 2))
+assert row["std"] == round(float(np.std(values)), 2)
+assert row["minutes_out_of_range"] == 30.0      # 19 и 25 по 10 минут, последнее 26 - медианный шаг
+assert (row["anomalies"], row["recommendations"]) == (1, 1)
+print("  ✓ PASS")
+
+# Test 11: Deduplicated recommendation sink
+print("\n" + "-" * 80)
+print("TEST 11: RECOMMENDATION SINK")
+print("-" * 80)
+
+def recommendation(target, confidence=0.8):
+    return {"sensor_id": stats_sensor.id, "location_id": stats_location.id,
+            "problem_description": "Аномалия", "recommended_action": "Корректировка Temperature",
+            "target_value": target, "reasoning": "test", "confidence": confidence,
+            "severity": "high", "priority": 5}
+
+sink = RecommendationSink(db)
+first_run = [sink.add(**recommendation(23.1)), sink.add(**recommendation(23.1, 0.9)), sink.add(**recommendation(24.0))]
+sink.flush()
+assert [p.created for p in first_run] == [True, False, True] and first_run[0].id == first_run[1].id
+
+# Повторный прогон: открытые рекомендации обновляются, новых строк и уведомлений нет
+second_run = RecommendationSink(db)
+again = second_run.add(**recommendation(23.1, 0.95))
+second_run.flush()
+print(f"  First run: {sink.stats()}, second run: {second_run.stats()}")
+assert again.id == first_run[0].id and not again.created
+rec_query = db.query(models.IntelligentRecommendation).filter(
+    models.IntelligentRecommendation.recommended_action == "Корректировка Temperature")
+assert rec_query.count() == 2
+saved = db.get(models.IntelligentRecommendation, again.id)
+assert saved.confidence == 0.95 and saved.notification.required_target_value == 23.1
+
+# Выполненная рекомендация больше не подавляет новую
+saved.is_implemented = True
+db.commit()
+(new_id, created), = crud.save_recommendations(db, [recommendation(23.1)])
+assert created and new_id != again.id and rec_query.count() == 3
+
+# Без нормы датчика цель - сдвиг от скользящего среднего: два анализа на чуть
+# сдвинутых данных дают разные цели, но одну открытую рекомендацию
+_cwd = os.getcwd()
+os.chdir(_tmp_dir)                          # main монтирует reports/ относительно рабочего каталога
+os.makedirs("reports", exist_ok=True)
+try:
+    import main
+finally:
+    os.chdir(_cwd)
+
+co2_type = models.SensorType(name="CO2", unit="ppm")
+db.add(co2_type)
+db.commit()
+co2_sensor = models.Sensor(name="Lab CO2", location_id=location.id, sensor_type_id=co2_type.id)
+db.add(co2_sensor)
+db.commit()
+comfort_ranges.invalidate(db)
+
+def analyze_co2(readings):
+    crud.bulk_insert_measurements(db, [
+        {"sensor_id": co2_sensor.id, "location_id": location.id, "value": value,
+         "timestamp": datetime.utcnow() - timedelta(hours=len(readings) - i)}
+        for i, value in enumerate(readings)
+    ])
+    for _ in range(50):                     # детектор - имитация со случайной оценкой
+        analysis_sink = RecommendationSink(db)
+        _, pending = main._analyze_sensor(co2_sensor, db, analysis_sink)
+        if pending is not None:
+            analysis_sink.flush()
+            return pending, db.get(models.IntelligentRecommendation, pending.id)
+    raise AssertionError("Detector did not report an anomaly")
+
+first_co2, first_rec = analyze_co2([800.0 + i % 5 for i in range(24)])
+first_target = first_rec.target_value
+second_co2, second_rec = analyze_co2([806.0, 808.0])       # среднее и цель сдвинулись
+moved_target = round(float(crud.get_sensor_series(db, co2_sensor.id,
+                                                  datetime.utcnow() - timedelta(days=7))[1].mean()) * 1.05, 1)
+co2_open = db.query(models.IntelligentRecommendation).filter(
+    models.IntelligentRecommendation.sensor_id == co2_sensor.id,
+    models.IntelligentRecommendation.is_implemented.isnot(True)).count()
+print(f"  CO2 targets: {first_target} -> {moved_target}, open recommendations: {co2_open}")
+assert moved_target != first_target
+assert first_co2.created and not second_co2.created and second_co2.id == first_co2.id
+assert co2_open == 1 and second_rec.target_value == first_target
+print("  ✓ PASS")
+
+# Test 12: Event-driven recommendation verification
+print("\n" + "-" * 80)
+print("TEST 12: RECOMMENDATION VERIFIER")
+print("-" * 80)
+
+(open_id, _), = crud.save_recommendations(db, [recommendation(22.0)])
+verifier = RecommendationVerifier(SessionLocal, tolerance=0.5, confirm_readings=3)
+loaded = verifier.load()
+assert loaded == len(crud.get_open_recommendation_targets(db)) and loaded >= 1
+reading_time = datetime.utcnow() + timedelta(minutes=1)
+# 22.8 - внутри полосы гистерезиса: серию не продолжает и не сбрасывает
+for minute, value in enumerate([25.0, 22.3, 21.8, 22.8, 23.5, 22.1, 22.4, 21.9]):
+    verifier.observe(stats_sensor.id, value, reading_time + timedelta(minutes=minute))
+    if minute == 3:
+        assert verifier.stats()['verified'] == 0, "Streak must survive the hysteresis band"
+verifier.observe(stats_sensor.id, 22.0, reading_time - timedelta(days=1))   # старое показание не считается
+
+# Ошибка записи не теряет выполненные рекомендации: следующий flush их повторяет
+pending = verifier.stats()['pending']
+complete_recommendations = crud.complete_recommendations
+crud.complete_recommendations = lambda session, completed: session.execute(text("SELECT * FROM missing_table"))
+try:
+    assert verifier.flush() == 0
+finally:
+    crud.complete_recommendations = complete_recommendations
+assert pending >= 1 and verifier.stats()['pending'] == pending and verifier.failed == pending
+assert verifier.flush() >= 1 and verifier.stats()['pending'] == 0
+print(f"  Verifier: {verifier.stats()}")
+verified = db.get(models.IntelligentRecommendation, open_id)
+db.refresh(verified)
+assert verified.is_implemented and verified.implemented_at == reading_time + timedelta(minutes=7)
+assert verified.notification.is_completed
+assert stats_sensor.id not in verifier._open or open_id not in verifier._open[stats_sensor.id]
+print("  ✓ PASS")
+
+# Test 13: Response model fitted from target changes
+print("\n" + "-" * 80)
+print("TEST 13: SENSOR RESPONSE MODEL")
+print("-" * 80)
+
+response_sensor = models.Sensor(name="Lab T3", location_id=location.id, sensor_type_id=sensor_type.id)
+db.add(response_sensor)
+db.commit()
+
+def response_readings(changed_at, y0, target, tau):
+    # Показание до смены цели и экспоненциальный выход раз в минуту в течение двух часов
+    readings = [(changed_at - timedelta(minutes=1), y0)]
+    readings += [(changed_at + timedelta(minutes=m), target + (y0 - target) * np.exp(-m * 60 / tau))
+                 for m in range(1, 121)]
+    return [{"sensor_id": response_sensor.id, "location_id": location.id, "value": round(float(v), 3),
+             "timestamp": ts} for ts, v in readings]
+
+change_time = now - timedelta(days=5)
+crud.bulk_insert_measurements(db, response_readings(change_time, 20.0, 25.0, 600))
+db.add(models.SensorTargetChange(sensor_id=response_sensor.id, old_target=20.0, new_target=25.0,
+                                 changed_at=change_time))
+db.commit()
+
+store = ResponseModelStore(SessionLocal, window_hours=2)
+first_fit = store.fit(db, now=now)
+tau = store.time_constant(db, response_sensor.id)
+print(f"  Fit: {first_fit}, tau: {tau:.1f} s")
+assert first_fit['events'] == 1 and abs(tau - 600) < 6
+
+# Повторный запуск не учитывает то же изменение; новое дополняет суммы
+assert store.fit(db, now=now)['events'] == 0
+second_change = change_time + timedelta(days=1)
+crud.bulk_insert_measurements(db, response_readings(second_change, 25.0, 21.0, 600))
+db.add(models.SensorTargetChange(sensor_id=response_sensor.id, old_target=25.0, new_target=21.0,
+                                 changed_at=second_change))
+db.commit()
+assert store.fit(db, now=now)['events'] == 1
+stored_model = db.get(models.SensorResponseModel, response_sensor.id)
+assert stored_model.events == 2 and abs(stored_model.time_constant - 600) < 6
+
+# Оценка: 5 градусов до допуска 0.5 - tau * ln(10)
+estimate = store.estimate_seconds(db, response_sensor.id, 20.0, 25.0, tolerance=0.5)
+assert abs(estimate - 600 * np.log(10)) < 20
+generated = RecommendationGenerator('laboratory').generate_recommendation(
+    "Lab T3", "Temperature", 30.0, {'score': 0.9}, time_constant=stored_model.time_constant)
+print(f"  Estimate: {estimate:.0f} s, recommendation: {generated['estimated_time_to_normal']}")
+assert generated["estimated_time_to_normal"] == "~27 minutes"   # 600 * ln(8 / 0.5) с
+assert store.estimate_seconds(db, sensor.id, 20.0, 25.0) is None
+print("  ✓ PASS")
+
+# Test 14: Configurable comfort ranges compiled by sensor id
+print("\n" + "-" * 80)
+print("TEST 14: COMFORT RANGES")
+print("-" * 80)
+
+pressure_type = models.SensorType(name="Pressure", unit="hPa")
+db.add(pressure_type)
+db.commit()
+pressure_sensor = models.Sensor(name="Lab P", location_id=location.id, sensor_type_id=pressure_type.id)
+db.add(pressure_sensor)
+db.commit()
+
+table = ComfortRangeTable(SessionLocal, check_interval=0)
+assert table.bounds(sensor.id) is None                       # без снимка bounds не читает БД
+compiled = table.get(db)
+assert compiled.bounds(sensor.id) == (20.0, 24.0)            # константы для laboratory
+assert compiled.bounds(pressure_sensor.id) is None           # для давления констант нет
+
+# Тип помещения задаёт норму всем лабораториям, локация переопределяет её для "Lab B"
+crud.upsert_comfort_range(db, schemas.ComfortRangeBase(room_type="laboratory", sensor_type_id=sensor_type.id,
+                                                       min_value=19.0, max_value=23.0))
+crud.upsert_comfort_range(db, schemas.ComfortRangeBase(location_id=stats_location.id, sensor_type_id=sensor_type.id,
+                                                       min_value=18.0, max_value=25.0, target_value=21.0))
+crud.upsert_comfort_range(db, schemas.ComfortRangeBase(room_type="laboratory", sensor_type_id=pressure_type.id,
+                                                       min_value=990.0, max_value=1030.0))
+assert table.get(db) is compiled                             # чтение снимка не проверяет БД
+compiled = table.refresh(db)                                 # изменение подхвачено по сигнатуре
+print(f"  Compiled: {len(compiled)} slots, stats: {table.stats()}")
+assert compiled.bounds(sensor.id) == (19.0, 23.0)
+assert compiled.bounds(stats_sensor.id) == (18.0, 25.0) and compiled.target_value(stats_sensor.id) == 21.0
+assert compiled.bounds(pressure_sensor.id) == (990.0, 1030.0) and compiled.target_value(pressure_sensor.id) == 1010.0
+assert table.bounds(pressure_sensor.id) == (990.0, 1030.0)
+
+# Перенос датчика и смена типа помещения меняют сигнатуру, хотя число датчиков прежнее
+office = models.Location(name="Office P", room_type="office")
+db.add(office)
+db.commit()
+pressure_sensor.location_id = office.id
+db.commit()
+assert table.refresh(db).bounds(pressure_sensor.id) is None  # для office норм давления нет
+office.room_type = "laboratory"
+db.commit()
+assert table.refresh(db).bounds(pressure_sensor.id) == (990.0, 1030.0)
+pressure_sensor.location_id = location.id
+db.commit()
+table.refresh(db)
+
+ids = np.array([sensor.id, stats_sensor.id, pressure_sensor.id, 10 ** 6])
+assert compiled.out_of_range(ids, [23.5, 23.5, 1040.0, 50.0]).tolist() == [True, False, True, False]
+recommendations = compiled.recommend(ids, np.array([23.5, 23.5, 1040.0, 50.0]), scores=np.full(4, 0.9),
+                                     sensor_names=["Lab T", "Lab B T", "Lab P", "Ghost"])
+by_name = {r['sensor_name']: r for r in recommendations}
+assert by_name["Lab T"]["target_value"] == 21.0 and by_name["Lab P"]["target_value"] == 1010.0
+assert "Lab B T" not in by_name
+assert by_name["Ghost"]["recommended_action"] == RecommendationGenerator()._generate_generic_recommendation(
+    "Ghost", "", 50.0, {"score": 0.9})["recommended_action"]
+
+# Отчёт считает время вне нормы по диапазону локации: только последнее 26 °C
+row = next(r for r in crud.iter_report_rows(db, t0 - timedelta(days=1), now + timedelta(days=1)) if r["sensor"] == "Lab B T")
+assert row["minutes_out_of_range"] == 10.0
+
+# Удаление нормы локации возвращает датчик к норме типа помещения
+stats_rule = next(r for r in crud.get_comfort_ranges(db) if r.location_id == stats_location.id)
+assert crud.delete_comfort_range(db, stats_rule.id)
+table.invalidate(db)
+assert table.bounds(stats_sensor.id) == (19.0, 23.0)
+
+# Фоновая проверка подхватывает изменения без обращений к таблице
+table.check_interval = 0.05
+table.start()
+stats_rule = crud.upsert_comfort_range(db, schemas.ComfortRangeBase(
+    location_id=stats_location.id, sensor_type_id=sensor_type.id, min_value=17.0, max_value=26.0))
+for _ in range(100):
+    if table.bounds(stats_sensor.id) == (17.0, 26.0):
+        break
+    time.sleep(0.05)
+table.stop()
+assert table.bounds(stats_sensor.id) == (17.0, 26.0) and table.failed == 0
+assert crud.delete_comfort_range(db, stats_rule.id)
+print("  ✓ PASS")
+
+# Test 15: Recommendation list in one query with keyset pagination
+print("\n" + "-" * 80)
+print("TEST 15: RECOMMENDATION PAGES")
+print("-" * 80)
+
+db.add_all([
+    models.IntelligentRecommendation(sensor_id=sensor.id, location_id=location.id, priority=i % 3 + 1,
+                                     created_at=now - timedelta(minutes=i % 4))   # повторяющиеся ключи
+    for i in range(11)
+])
+db.commit()
+expected = [r.id for r in db.query(models.IntelligentRecommendation).filter(
+    models.IntelligentRecommendation.location_id == location.id).order_by(
+    models.IntelligentRecommendation.priority.desc(), models.IntelligentRecommendation.created_at.desc(),
+    models.IntelligentRecommendation.id.desc())]
+
+statements = []
+count_statements = lambda *args: statements.append(args[2])
+event.listen(engine, "before_cursor_execute", count_statements)
+paged, cursor, pages = [], None, 0
+while True:
+    after = pagination.decode_cursor(cursor, crud.RECOMMENDATION_CURSOR_TYPES) if cursor else None
+    rows, cursor = crud.get_recommendations_page(db, location_id=location.id, after=after, limit=4)
+    paged += [rec.id for rec, *_ in rows]
+    pages += 1
+    if cursor is None:
+        break
+event.remove(engine, "before_cursor_execute", count_statements)
+print(f"  Pages: {pages}, rows: {len(paged)}, statements: {len(statements)}")
+assert paged == expected and pages == 3 and len(statements) == pages
+assert rows[0][1:] == ("Lab T", "Temperature", "Lab")
+try:
+    pagination.decode_cursor("not-a-cursor", crud.RECOMMENDATION_CURSOR_TYPES)
+    assert False, "Broken cursor must be rejected"
+except ValueError:
+    pass
+
+# Ключ страниц без NULL: рекомендация без приоритета получает приоритет по умолчанию
+unprioritized = {**recommendation(30.0), "recommended_action": "Проветривание"}
+del unprioritized["priority"]
+(unprioritized_id, _), = crud.save_recommendations(db, [unprioritized])
+saved = db.get(models.IntelligentRecommendation, unprioritized_id)
+assert saved.priority == 1 and saved.created_at is not None
+stats_pages, cursor = [], None
+while True:
+    after = pagination.decode_cursor(cursor, crud.RECOMMENDATION_CURSOR_TYPES) if cursor else None
+    rows, cursor = crud.get_recommendations_page(db, location_id=stats_location.id, after=after, limit=1)
+    stats_pages += [rec.id for rec, *_ in rows]
+    if cursor is None:
+        break
+assert unprioritized_id in stats_pages and len(stats_pages) == db.query(models.IntelligentRecommendation).filter(
+    models.IntelligentRecommendation.location_id == stats_location.id).count()
+print("  ✓ PASS")
+
+# Test 16: Keyset pages over history (partitions + hot table), analyses and voice commands
+print("\n" + "-" * 80)
+print("TEST 16: KEYSET PAGES AND TIME FILTERS")
+print("-" * 80)
+
+def walk(fetch, limit, key_of):
+    """Все страницы: fetch(limit + 1, after) -> строки; проверяет, что страниц больше одной"""
+    collected, key, pages = [], None, 0
+    while True:
+        page, cursor = pagination.split_page(fetch(limit + 1, key), limit, key_of)
+        collected += page
+        pages += 1
+        if cursor is None:
+            return collected, pages
+        key = pagination.decode_cursor(cursor, pagination.TIME_KEY_TYPES)
+
+# История датчика: апрель в партиции, май - в сжатых блоках, страницы проходят оба источника
+history_start, history_end = datetime(2026, 4, 20), datetime(2026, 6, 1)
+expected = sorted((r.timestamp for r in crud.iter_measurements(db, sensor_id=sensor.id, start=history_start,
+                                                                end=history_end)), reverse=True)
+
+async def read_history_pages():
+    async with AsyncSessionLocal() as session:
+        async def fetch(limit, key):
+            return await crud.get_measurement_history_async(session, sensor_id=sensor.id, limit=limit,
+                                                            start=history_start, end=history_end, after=key)
+        collected, key, pages = [], None, 0
+        while True:
+            page, cursor = pagination.split_page(await fetch(101, key), 100, lambda m: (m.timestamp, m.id))
+            collected += page
+            pages += 1
+            if cursor is None:
+                return collected, pages
+            key = pagination.decode_cursor(cursor, pagination.TIME_KEY_TYPES)
+
+history, history_pages = asyncio.run(read_history_pages())
+print(f"  History: {len(history)} rows in {history_pages} pages, partitions: {len(crud.measurement_sources(db, history_start, history_end)) - 1}")
+assert [m.timestamp for m in history] == expected and history_pages > 1
+assert len({m.id for m in history}) == len(history) and any(m.id < 0 for m in history)   # точки блоков - id < 0
+
+# Анализы с одинаковым created_at: страницы не теряют и не повторяют строки
+tied = now - timedelta(days=40)
+db.add_all([models.AnomalyAnalysis(sensor_id=sensor.id, location_id=location.id, created_at=tied - timedelta(hours=i // 3))
+            for i in range(10)])
+db.commit()
+window = (tied - timedelta(days=1), tied + timedelta(seconds=1))
+analyses, analysis_pages = walk(lambda limit, key: crud.get_anomaly_analyses(
+    db, location_id=location.id, limit=limit, start=window[0], end=window[1], after=key
+), 4, lambda a: (a.created_at, a.id))
+assert len({a.id for a in analyses}) == 10 and analysis_pages == 3
+assert [(a.created_at, a.id) for a in analyses] == sorted(((a.created_at, a.id) for a in analyses), reverse=True)
+
+commands, command_pages = walk(lambda limit, key: crud.get_voice_notification_commands(
+    db, limit=limit, after=key
+), 2, lambda c: (c.created_at, c.id))
+assert len(commands) == db.query(models.VoiceNotificationCommand).count() and len({c.id for c in commands}) == len(commands)
+print(f"  Analyses: {analysis_pages} pages, voice commands: {len(commands)} in {command_pages} pages")
+print("  ✓ PASS")
+
+# Test 17: Response cache with ETags and tag invalidation
+print("\n" + "-" * 80)
+print("TEST 17: RESPONSE CACHE")
+print("-" * 80)
+
+cache = ResponseCache(max_entries=8)
+cache.route("/items/{item_id}", ttl=60, tags=("items", "item:{item_id}"))
+cached_app = FastAPI()
+cached_app.add_middleware(ResponseCacheMiddleware, cache=cache)
+computed = []
+
+@cached_app.get("/items/{item_id}")
+def read_item(item_id: int, verbose: bool = False, change: bool = False):
+    computed.append(item_id)
+    if change:
+        cache.invalidate(f"item:{item_id}")     # запись во время вычисления
+    return {"item": item_id, "verbose": verbose, "version": len(computed)}
+
+client = TestClient(cached_app)
+first = client.get("/items/1?verbose=1&change=0")
+etag = first.headers["etag"]
+same = client.get("/items/1?change=0&verbose=1")       # порядок параметров не важен
+assert same.headers["x-cache"] == "HIT" and same.json() == first.json() and computed == [1]
+assert client.get("/items/1?verbose=1&change=0", headers={"If-None-Match": etag}).status_code == 304
+
+cache.invalidate("item:2")                             # чужой тег не сбрасывает запись
+assert client.get("/items/1?verbose=1&change=0").headers["x-cache"] == "HIT"
+cache.invalidate("item:1")
+refreshed = client.get("/items/1?verbose=1&change=0", headers={"If-None-Match": etag})
+assert refreshed.status_code == 200 and refreshed.headers["etag"] != etag and computed == [1, 1]
+
+client.get("/items/3?change=1")
+assert client.get("/items/3?change=1").headers["x-cache"] == "MISS", "Entry computed during a write must be stale"
+print(f"  Stats: {cache.stats()}")
+print("  ✓ PASS")
+
+print("\n" + "=" * 80)
+print("TEST 18: FAST JSON SERIALIZATION")
+print("=" * 80)
+
+def pydantic_json(schema, rows):
+    adapter = TypeAdapter(List[schema])
+    return json.loads(adapter.dump_json(adapter.validate_python(rows, from_attributes=True)))
+
+# Core-строки анализов идут в порядке полей схемы; JSON совпадает с response_model
+crud.create_anomaly_analysis(db, sensor.id, location.id, "STD_DEV", 0.42, False,
+                             "BERT-TS", 0.91, True, False, 0.665)
+analysis_rows = crud.get_anomaly_analyses(db, limit=1)
+assert len(analysis_rows) == 1 and list(analysis_rows[0]._fields) == fast_json.schema_fields(schemas.AnomalyAnalysisRead)
+fast = fast_json.rows_to_dicts(analysis_rows, fast_json.schema_fields(schemas.AnomalyAnalysisRead))
+assert json.loads(fast_json.dumps(fast)) == pydantic_json(schemas.AnomalyAnalysisRead, analysis_rows)
+
+# Строки истории: лишняя колонка location_id отбрасывается, порядок - как в схеме
+points = [block_store.MeasurementPoint(-5, sensor.id, location.id, 21.5, now),
+          block_store.MeasurementPoint(7, sensor.id, location.id, 22.25, now - timedelta(microseconds=1500))]
+history = fast_json.rows_to_dicts(points, fast_json.schema_fields(schemas.MeasurementRead), crud.HISTORY_COLUMNS)
+assert history[0] == {"id": -5, "value": 21.5, "timestamp": now, "sensor_id": sensor.id}
+encoded = fast_json.dumps(history)
+assert json.loads(encoded) == pydantic_json(schemas.MeasurementRead, points)
+
+# Без orjson - тот же JSON через json
+saved_orjson, fast_json.orjson = fast_json.orjson, None
+try:
+    assert json.loads(fast_json.dumps(history)) == json.loads(encoded)
+finally:
+    fast_json.orjson = saved_orjson
+print(f"  Encoded {len(analysis_rows)} analyses and {len(history)} history rows "
+      f"({'orjson' if fast_json.orjson is not None else 'json'})")
+print("  ✓ PASS")
+
+print("\n" + "=" * 80)
+print("TEST 19: REQUEST METRICS")
+print("=" * 80)
+
+metrics = RequestMetrics(n_plus_one_threshold=5, slow_seconds=60)
+metrics.instrument_engine(engine)
+metered_app = FastAPI()
+metered_app.add_middleware(RequestMetricsMiddleware, metrics=metrics)
+
+@metered_app.get("/sensors/{sensor_id}/name")
+def sensor_name(sensor_id: int, repeat: int = 1):
+    session = SessionLocal()
+    try:
+        # repeat одинаковых запросов - имитация ленивой загрузки в цикле
+        for _ in range(repeat):
+            name = session.execute(text("SELECT name FROM sensors WHERE id = :id"), {"id": sensor_id}).scalar()
+        return {"name": name}
+    finally:
+        session.close()
+
+client = TestClient(metered_app)
+assert client.get(f"/sensors/{sensor.id}/name").json() == {"name": sensor.name}
+client.get(f"/sensors/{sensor.id}/name?repeat=6")
+client.get("/missing")
+with metrics.timer("detector_duration_seconds", stage="classical"):
+    pass
+
+exposition = metrics.render()
+route = '{method="GET",route="/sensors/{sensor_id}/name"}'
+assert f'microclimate_http_request_db_queries_count{route} 2' in exposition
+assert f'microclimate_http_request_db_queries_sum{route} 7.0' in exposition     # 1 + 6 запросов
+assert f'microclimate_http_request_db_queries_bucket{route[:-1]},le="5.0"}} 1' in exposition
+assert f'microclimate_http_n_plus_one_total{route} 1.0' in exposition
+assert 'route="unmatched",status="404"' in exposition
+assert 'microclimate_detector_duration_seconds_count{stage="classical"} 1' in exposition
+recent = metrics.stats()['recent']
+assert len(recent) == 1 and recent[0]['max_repeats'] == 6 and "FROM sensors" in recent[0]['statement']
+print(f"  Series: {metrics.stats()['series']}, N+1 flagged: {recent[0]['route']}")
+print("  ✓ PASS")
+
+# Test 20: Live stream hub (coalescing, bounded events, thresholds, SSE)
+print("\n" + "-" * 80)
+print("TEST 20: LIVE STREAM")
+print("-" * 80)
+
+async def live_stream_batches():
+    hub = LiveHub(max_events_per_client=3)
+    subscription = hub.subscribe(location.id)
+    assert hub.has_subscribers(location.id) and hub.stats()['clients'] == 1
+
+    # Показания схлопываются по датчику: остаётся последнее значение каждого
+    for value in (20.0, 21.0, 22.0):
+        hub.publish(location.id, {'type': 'reading', 'sensor_id': sensor.id, 'value': value})
+    hub.publish(location.id, {'type': 'reading', 'sensor_id': stats_sensor.id, 'value': 30.0})
+    # Несхлопываемые события: deque на 3, два самых старых вытеснены
+    for analysis_id in range(5):
+        hub.publish(location.id, {'type': 'anomaly', 'sensor_id': sensor.id, 'analysis_id': analysis_id})
+    hub.publish(location.id + 1000, {'type': 'anomaly', 'sensor_id': 0, 'analysis_id': -1})   # чужая локация
+    coalesced = await subscription.next_batch(timeout=1)
+    empty = await subscription.next_batch(timeout=0.01)
+
+    # Пробуждение без событий не обрывает ожидание: ждём до события или таймаута
+    subscription._ready.set()
+    asyncio.get_running_loop().call_later(0.05, subscription.push, {'type': 'anomaly', 'sensor_id': 0, 'analysis_id': 99})
+    late = await subscription.next_batch(timeout=1)
+    assert [e['analysis_id'] for e in late] == [99]
+    subscription._ready.set()
+    started = time.perf_counter()
+    assert await subscription.next_batch(timeout=0.1) == [] and time.perf_counter() - started >= 0.09
+
+    # Отписка убирает клиента и локацию; события больше не доставляются
+    hub.unsubscribe(subscription)
+    hub.publish(location.id, {'type': 'reading', 'sensor_id': sensor.id, 'value': 23.0})
+    hub.unsubscribe(subscription)                                   # повторная отписка безопасна
+    after_unsubscribe = (hub.has_subscribers(location.id), hub.stats(), await subscription.next_batch(timeout=0.01))
+
+    # publish_measurement: показание и событие порога для значения вне нормы
+    comfort_ranges.invalidate(db)
+    low, high = comfort_ranges.bounds(sensor.id)
+    live = live_hub.subscribe(location.id)
+    publish_measurement(sensor, (low + high) / 2)
+    in_range = await live.next_batch(timeout=1)
+    publish_measurement(sensor, high + 5.0)
+    out_of_range = await live.next_batch(timeout=1)
+    live_hub.unsubscribe(live)
+    return subscription, coalesced, empty, after_unsubscribe, (low, high), in_range, out_of_range
+
+subscription, coalesced, empty, after_unsubscribe, (low, high), in_range, out_of_range = asyncio.run(live_stream_batches())
+events = [e for e in coalesced if e['type'] == 'anomaly']
+readings = {e['sensor_id']: e['value'] for e in coalesced if e['type'] == 'reading'}
+print(f"  Batch: {len(events)} events + {len(readings)} readings, dropped: {subscription.dropped}")
+assert [e['analysis_id'] for e in events] == [2, 3, 4] and subscription.dropped == 2
+assert readings == {sensor.id: 22.0, stats_sensor.id: 30.0}
+assert empty == []
+assert after_unsubscribe == (False, {'locations': 0, 'clients': 0, 'published': 11}, [])
+
+assert [e['type'] for e in in_range] == ['reading'] and in_range[0]['sensor_type'] == sensor_type.name
+threshold = next(e for e in out_of_range if e['type'] == 'threshold')
+assert [e['type'] for e in out_of_range] == ['threshold', 'reading']
+assert (threshold['value'], threshold['min'], threshold['max']) == (high + 5.0, low, high)
+assert not live_hub.has_subscribers(location.id)
+
+# SSE: строка event, JSON без экранирования кириллицы, пустая строка-разделитель
+sse = format_sse({'type': 'threshold', 'sensor_id': 1, 'sensor_type': 'Температура', 'value': 26.5})
+assert sse == 'event: threshold\ndata: {"type": "threshold", "sensor_id": 1, "sensor_type": "Температура", "value": 26.5}\n\n'
+assert json.loads(sse.split("data: ", 1)[1]) == {'type': 'threshold', 'sensor_id': 1, 'sensor_type': 'Температура', 'value': 26.5}
+print("  ✓ PASS")
+
+db.close()
+
+print("\n" + "=" * 80)
+print("✅ ALL DATABASE TESTS COMPLETED")
+print("=" * 80)
@@ -148,6 +148,47 @@ try:
 except Exception as e:
     print(f"❌ BULK GENERATION FAILED: {str(e)}")
 
+# Test vectorized bulk generation: same recommendations as the per-sensor path
+print("\n" + "=" * 80)
+print("TEST: VECTORIZED BULK GENERATION")
+print("=" * 80)
+
+try:
+    import random
+    random.seed(7)
+    room_types = [random.choice(list(RecommendationGenerator.NORMAL_RANGES) + ['unknown']) for _ in range(2000)]
+    sensor_types = [random.choice(['Temperature', 'Humidity', 'CO2']) for _ in range(2000)]
+    values = [round(random.uniform(10, 35) if t == 'Temperature' else random.uniform(15, 95), 1) for t in sensor_types]
+    scores = [round(random.random(), 3) for _ in range(2000)]
+
+    generator = RecommendationGenerator()
+    vectorized = generator.bulk_generate_from_arrays(
+        values,
+        RecommendationGenerator.sensor_type_codes(sensor_types),
+        RecommendationGenerator.room_type_codes(room_types),
+        scores,
+        sensor_names=[f"s{i}" for i in range(2000)],
+        sensor_types=sensor_types
+    )
+
+    expected = []
+    for i in range(2000):
+        rec = RecommendationGenerator(room_types[i]).generate_recommendation(
+            f"s{i}", sensor_types[i], values[i], {'score': scores[i]}
+        )
+        if rec['recommended_action'] != "No action required":
+            rec.pop('estimated_time_to_normal', None)
+            expected.append({**rec, 'index': i})
+    expected.sort(key=lambda rec: rec['priority'], reverse=True)
+
+    print(f"Vectorized: {len(vectorized)} recommendations of 2000 sensors")
+    assert vectorized == expected, "Vectorized output must match generate_recommendation"
+    print("\n✓ VECTORIZED GENERATION PASS")
+
+except Exception as e:
+    print(f"❌ VECTORIZED GENERATION FAILED: {str(e)}")
+    raise
+
 print("\n" + "=" * 80)
 print("✅ ALL TESTS COMPLETED")
 print("=" * 80)
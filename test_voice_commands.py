@@ -162,6 +162,109 @@ try:
 except Exception as e:
     print(f"\n❌ MANAGER TEST FAILED: {str(e)}")
 
+# Test 5: Compiled keyword matcher
+print("\n" + "-" * 80)
+print("TEST 5: COMPILED KEYWORD MATCHER")
+print("-" * 80)
+
+parser = NotificationVoiceCommandParser()
+
+matcher_test_cases = [
+    # (transcript, language, expected_command, expected_keyword)
+    ("да", "ru", "confirm", "да"),
+    ("покажи данные", "ru", "request_report", "покажи"),  # "да" не внутри "данные"
+    ("notify me later", "en", "unknown", None),           # "no" не внутри "notify"
+    ("no, not now", "en", "reject", "not now"),           # самая длинная фраза
+    ("tell me more information", "en", "request_info", "more information"),
+    ("нет, не нужно", "ru", "reject", "не нужно"),
+]
+
+for transcript, language, expected_cmd, expected_keyword in matcher_test_cases:
+    result = parser.parse_command(transcript, language=language)
+    keywords = result['matched_keywords']
+
+    print(f"\n  Input: '{transcript}' ({language})")
+    print(f"  Command: {result['command']}, matched: {keywords}")
+
+    assert result['command'] == expected_cmd, f"Expected {expected_cmd}, got {result['command']}"
+    if expected_keyword:
+        assert keywords == [expected_keyword], f"Expected '{expected_keyword}', got {keywords}"
+    print(f"  ✓ PASS")
+
+assert parser.extract_numeric_value("измени на 23,5 градуса") == 23.5
+assert parser.extract_numeric_value("set to 22") == 22.0
+assert parser.extract_numeric_value("без числа") is None
+print("\n  ✓ Numeric extraction PASS")
+
+# Test 6: Normalization and parse cache
+print("\n" + "-" * 80)
+print("TEST 6: TRANSCRIPT NORMALIZATION AND PARSE CACHE")
+print("-" * 80)
+
+from command_matcher import normalize_transcript
+
+normalization_cases = [
+    ("Да!", "да"),
+    ("  Отчёт, пожалуйста... ", "отчет пожалуйста"),
+    ("Измени на двадцать три", "измени на 23"),
+    ("set to twenty-two", "set to 22"),
+    ("set to 22,5", "set to 22,5"),
+]
+
+for raw, expected in normalization_cases:
+    normalized = normalize_transcript(raw)
+    print(f"  '{raw}' -> '{normalized}'")
+    assert normalized == expected, f"Expected '{expected}', got '{normalized}'"
+print("  ✓ Normalization PASS")
+
+parser = NotificationVoiceCommandParser(cache_size=16)
+for transcript in ["Да", "да!", "ДА.", "Отчёт", "отчет"]:
+    parser.parse_command(transcript, language='ru')
+
+stats = parser.cache_stats()
+print(f"\n  Cache stats: {stats}")
+assert stats['misses'] == 2, "Only distinct normalized transcripts should be parsed"
+assert stats['hits'] == 3
+assert stats['hit_rate'] == 0.6
+assert parser.parse_command("Отчёт", language='ru')['command'] == "request_report"
+assert parser.extract_numeric_value("измени на двадцать три") == 23.0
+print("  ✓ Parse cache PASS")
+
+# Test 7: Bounded interaction history
+print("\n" + "-" * 80)
+print("TEST 7: BOUNDED INTERACTION HISTORY")
+print("-" * 80)
+
+from interaction_history import InteractionHistory
+
+history = InteractionHistory(capacity=3)
+for i in range(5):
+    history.append({
+        'success': True,
+        'command': 'confirm' if i % 2 == 0 else 'reject',
+        'confidence_speech': 0.9,
+        'confidence_command': 0.5,
+        'notification_id': 1 if i < 4 else 2,
+    })
+
+stats = history.stats()
+print(f"  Stored: {len(history)}, stats: {stats}")
+assert len(history) == 3, "Ring buffer must keep only the last 3 interactions"
+assert stats['total_interactions'] == 5
+assert stats['commands_distribution'] == {'confirm': 3, 'reject': 2}
+assert stats['avg_speech_confidence'] == 0.9
+assert len(history.recent(10, notification_id=1)) == 2, "Evicted entries must leave the index"
+assert len(history.recent(10, notification_id=2)) == 1
+assert history.recent(1)[0]['notification_id'] == 2
+history.append({'command': 'confirm', 'confidence_speech': 0.1, 'confidence_command': 0.1})
+stats = history.stats()
+assert stats['total_interactions'] == 6 and stats['successful_interactions'] == 5, \
+    "Interaction without 'success' counts as unsuccessful"
+assert stats['avg_speech_confidence'] == 0.9
+history.clear()
+assert len(history) == 0 and history.stats()['total_interactions'] == 0
+print("  ✓ Interaction history PASS")
+
 print("\n" + "=" * 80)
 print("✅ ALL VOICE COMMAND TESTS COMPLETED")
 print("=" * 80)
@@ -0,0 +1,138 @@
+"""
+Асинхронная пакетная запись голосовых команд в БД.
+
+Команды, которые не меняют состояние уведомления (reject, request_report,
+unknown и т.д.), не обязаны попадать в БД до ответа клиенту. Они ставятся
+в ограниченную очередь, а фоновый поток сохраняет их пачками одним
+INSERT на пачку - запрос не ждёт commit, а поток команд любой плотности
+стоит одну транзакцию на batch_size записей.
+"""
+
+import queue
+import threading
+from typing import Callable, Dict, List, Optional
+
+import crud
+from database import SessionLocal
+
+
+class VoiceEventWriter:
+    """
+    Фоновый писатель событий голосовых команд.
+
+    Событие - словарь с полями crud.VOICE_COMMAND_FIELDS и необязательным
+    флагом complete_notification.
+    """
+
+    def __init__(self,
+                 session_factory: Callable = SessionLocal,
+                 batch_size: int = 200,
+                 flush_interval: float = 0.5,
+                 max_queue: int = 10000):
+        """
+        Args:
+            session_factory: Фабрика сессий БД
+            batch_size: Максимум событий в одной транзакции
+            flush_interval: Максимальная задержка записи (секунды)
+            max_queue: Ёмкость очереди; при переполнении запись идёт синхронно
+        """
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._write_lock = threading.Lock()
+
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+    def start(self):
+        """Запускает фоновый поток записи"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="voice-event-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Останавливает поток и дописывает всё, что осталось в очереди"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def submit(self, event: Dict) -> bool:
+        """
+        Ставит событие в очередь на запись.
+
+        Returns:
+            True, если событие поставлено в очередь; False, если очередь
+            переполнена или поток не запущен и событие записано синхронно
+        """
+        if self._thread is not None:
+            try:
+                self._queue.put_nowait(event)
+                return True
+            except queue.Full:
+                pass
+        self._write([event])
+        return False
+
+    def flush(self):
+        """Синхронно записывает все события из очереди"""
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                return
+            self._write(batch)
+
+    def stats(self) -> Dict:
+        """Счётчики писателя: записано, ошибок, транзакций, в очереди"""
+        return {
+            'written': self.written,
+            'failed': self.failed,
+            'batches': self.batches,
+            'queued': self._queue.qsize()
+        }
+
+    def _drain(self, limit: int) -> List[Dict]:
+        """Забирает из очереди до limit событий без ожидания"""
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        """Цикл потока: ждёт первое событие, добирает пачку и пишет её"""
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = [first] + self._drain(self.batch_size - 1)
+            self._write(batch)
+
+    def _write(self, batch: List[Dict]):
+        """Записывает пачку одной транзакцией"""
+        with self._write_lock:
+            db = self.session_factory()
+            try:
+                crud.bulk_create_voice_notification_commands(db, batch)
+                self.written += len(batch)
+                self.batches += 1
+            except Exception as e:
+                db.rollback()
+                self.failed += len(batch)
+                print(f"❌ ERROR: Failed to persist {len(batch)} voice commands: {e}")
+            finally:
+                db.close()
+
+
+# Глобальный писатель для использования в приложении
+voice_event_writer = VoiceEventWriter()
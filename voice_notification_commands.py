@@ -13,6 +13,10 @@ from typing import Dict, Optional, List
 import json
 from datetime import datetime
 from enum import Enum
+from functools import lru_cache
+
+from command_matcher import KeywordMatcher, cache_stats, extract_number, normalize_transcript
+from interaction_history import InteractionHistory
 
 
 class NotificationCommand(str, Enum):
@@ -31,16 +35,23 @@ class NotificationVoiceCommandParser:
     Распознаёт команды подтверждения/отклонения/модификации рекомендаций.
     """
     
-    def __init__(self):
-        """Инициализация парсера с мультиязычной поддержкой"""
+    def __init__(self, cache_size: int = 1024):
+        """
+        Инициализация парсера с мультиязычной поддержкой
+        
+        Args:
+            cache_size: Размер LRU-кэша результатов разбора
+                        (ключ - нормализованный текст и язык)
+        """
         # Команды для подтверждения действия
         self.confirmation_commands = {
             NotificationCommand.CONFIRM: {
-                'ru': ['да', 'согласен', 'согласна', 'подтверждаю', 'нормально', 'ладно', 'окей', 'ok'],
+                'ru': ['да', 'согласен', 'согласна', 'подтверждаю', 'подтвердить', 'выполнить',
+                       'нормально', 'ладно', 'окей', 'ok'],
                 'en': ['yes', 'ok', 'confirm', 'approved', 'go ahead', 'alright', 'sure']
             },
             NotificationCommand.REJECT: {
-                'ru': ['нет', 'отклоняю', 'не нужно', 'отменить', 'отмена', 'no', 'cancel'],
+                'ru': ['нет', 'отклоняю', 'отклонить', 'не нужно', 'отменить', 'отмена', 'no', 'cancel'],
                 'en': ['no', 'reject', 'cancel', 'skip', 'decline', 'not now', 'ignore']
             },
             NotificationCommand.MODIFY: {
@@ -52,10 +63,16 @@ class NotificationVoiceCommandParser:
                 'en': ['info', 'explain', 'why', 'details', 'more information', 'tell me more']
             },
             NotificationCommand.REQUEST_REPORT: {
-                'ru': ['отчет', 'история', 'график', 'статистика', 'покажи', 'data', 'report'],
+                'ru': ['отчет', 'доклад', 'история', 'график', 'статистика', 'покажи', 'data', 'report'],
                 'en': ['report', 'history', 'graph', 'statistics', 'show data', 'data']
             }
         }
+        # Словари компилируются один раз: один проход по транскрипту вместо
+        # перебора команда × фраза
+        self.matcher = KeywordMatcher(self.confirmation_commands)
+        # Транскрипты часто повторяются ("да", "yes", "отклонить") -
+        # результаты разбора кэшируются по нормализованному тексту
+        self._cached_match = lru_cache(maxsize=cache_size)(self._match_command)
     
     def parse_command(self, transcript: str, language: str = 'en') -> Dict:
         """
@@ -74,9 +91,9 @@ class NotificationVoiceCommandParser:
                 'language_detected': str
             }
         """
-        transcript_lower = transcript.lower().strip()
+        normalized = normalize_transcript(transcript)
         
-        if not transcript_lower:
+        if not normalized:
             return {
                 'command': NotificationCommand.UNKNOWN.value,
                 'confidence': 0.0,
@@ -85,44 +102,39 @@ class NotificationVoiceCommandParser:
                 'language_detected': language
             }
         
-        best_command = None
-        best_confidence = 0.0
-        matched_keywords = []
-        
-        # Проходим по всем командам и ищем совпадения
-        for command, lang_dict in self.confirmation_commands.items():
-            # Собираем фразы для данного языка (приоритет - выбранный язык)
-            phrases = lang_dict.get(language, [])
-            if not phrases:
-                phrases = lang_dict.get('en', [])
-            
-            for phrase in phrases:
-                if phrase in transcript_lower:
-                    # Confidence = доля совпадающей фразы в общем тексте
-                    confidence = len(phrase) / len(transcript_lower)
-                    
-                    if confidence > best_confidence:
-                        best_command = command
-                        best_confidence = confidence
-                        matched_keywords = [phrase]
-        
-        if not best_command:
-            return {
-                'command': NotificationCommand.UNKNOWN.value,
-                'confidence': 0.0,
-                'matched_keywords': [],
-                'raw_transcript': transcript,
-                'language_detected': language
-            }
+        command, confidence, matched_keywords = self._cached_match(normalized, language)
         
         return {
-            'command': best_command.value,
-            'confidence': min(best_confidence, 1.0),
-            'matched_keywords': matched_keywords,
+            'command': command,
+            'confidence': confidence,
+            'matched_keywords': list(matched_keywords),
             'raw_transcript': transcript,
             'language_detected': language
         }
     
+    def _match_command(self, normalized: str, language: str) -> tuple:
+        """
+        Ищет команду в нормализованном тексте (результат кэшируется).
+        
+        Returns:
+            (команда, уверенность, совпавшие фразы)
+        """
+        # Ищем лучшее совпадение (приоритет - выбранный язык)
+        match = self.matcher.match(normalized, language)
+        
+        if not match:
+            return NotificationCommand.UNKNOWN.value, 0.0, ()
+        
+        best_command, phrase = match
+        # Confidence = доля совпадающей фразы в общем тексте
+        best_confidence = len(phrase) / len(normalized)
+        
+        return best_command.value, min(best_confidence, 1.0), (phrase,)
+    
+    def cache_stats(self) -> Dict:
+        """Метрики кэша разбора: попадания, промахи, размер, hit rate"""
+        return cache_stats(self._cached_match)
+    
     def extract_numeric_value(self, transcript: str) -> Optional[float]:
         """
         Извлекает числовое значение из команды изменения.
@@ -134,16 +146,8 @@ class NotificationVoiceCommandParser:
         Returns:
             float (или None если не найдено)
         """
-        import re
-        # Ищем числа (включая с точкой/запятой)
-        numbers = re.findall(r'\d+[.,]?\d*', transcript)
-        if numbers:
-            value_str = numbers[0].replace(',', '.')
-            try:
-                return float(value_str)
-            except ValueError:
-                return None
-        return None
+        # Ищем числа (включая с точкой/запятой и числительные словами)
+        return extract_number(normalize_transcript(transcript))
 
 
 class SpeechRecognizerNotifications:
@@ -274,11 +278,16 @@ class VoiceNotificationManager:
     3. Логирование взаимодействия
     """
     
-    def __init__(self):
-        """Инициализация менеджера"""
+    def __init__(self, history_size: int = 1000):
+        """
+        Инициализация менеджера
+        
+        Args:
+            history_size: Ёмкость кольцевого буфера истории взаимодействий
+        """
         self.recognizer = SpeechRecognizerNotifications()
         self.command_parser = NotificationVoiceCommandParser()
-        self.interaction_history: List[Dict] = []
+        self.interaction_history = InteractionHistory(capacity=history_size)
     
     def process_notification_voice_input(self, 
                                         audio_file_path: str, 
@@ -393,60 +402,30 @@ class VoiceNotificationManager:
         Returns:
             List[Dict] с последними взаимодействиями
         """
-        history = self.interaction_history[-limit:]
-        
-        if notification_id:
-            history = [h for h in history if h.get('notification_id') == notification_id]
-        
-        return history
+        return self.interaction_history.recent(limit, notification_id=notification_id)
     
     def clear_history(self):
         """Очищает историю взаимодействий"""
-        self.interaction_history = []
+        self.interaction_history.clear()
     
     def get_stats(self) -> Dict:
         """
         Получает статистику по голосовым командам.
+        Счётчики обновляются при добавлении, поэтому вызов не сканирует историю.
         
         Returns:
             {
                 'total_interactions': int,
+                'successful_interactions': int,
                 'commands_distribution': Dict[str, int],
                 'avg_speech_confidence': float,
-                'avg_command_confidence': float
+                'avg_command_confidence': float,
+                'parser_cache': Dict  # hits, misses, size, maxsize, hit_rate
             }
         """
-        if not self.interaction_history:
-            return {
-                'total_interactions': 0,
-                'commands_distribution': {},
-                'avg_speech_confidence': 0.0,
-                'avg_command_confidence': 0.0
-            }
-        
-        commands = {}
-        total_speech_conf = 0.0
-        total_cmd_conf = 0.0
-        successful = 0
-        
-        for interaction in self.interaction_history:
-            if interaction.get('success'):
-                cmd = interaction.get('command', 'unknown')
-                commands[cmd] = commands.get(cmd, 0) + 1
-                total_speech_conf += interaction.get('confidence_speech', 0)
-                total_cmd_conf += interaction.get('confidence_command', 0)
-                successful += 1
-        
-        avg_speech = total_speech_conf / successful if successful > 0 else 0
-        avg_cmd = total_cmd_conf / successful if successful > 0 else 0
-        
-        return {
-            'total_interactions': len(self.interaction_history),
-            'successful_interactions': successful,
-            'commands_distribution': commands,
-            'avg_speech_confidence': round(avg_speech, 3),
-            'avg_command_confidence': round(avg_cmd, 3)
-        }
+        stats = self.interaction_history.stats()
+        stats['parser_cache'] = self.command_parser.cache_stats()
+        return stats
 
 
 # Глобальный инстанс для использования в приложении